@@ -0,0 +1,48 @@
+import time
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from analytics.rollups import ROLLUPS, day_of, rebuild, source_model
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the daily analytics rollups from their source tables, a month at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rollups', nargs='*',
+                            help=f"Rollups to rebuild: {', '.join(sorted(ROLLUPS))} (default: all)")
+        parser.add_argument('--start', help='First day, YYYY-MM-DD (default: earliest source row)')
+        parser.add_argument('--end', help='Last day, YYYY-MM-DD (default: latest source row or today)')
+
+    def _date(self, value):
+        try:
+            return date.fromisoformat(value) if value else None
+        except ValueError:
+            raise CommandError(f'Invalid date {value!r}, expected YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        start, end = self._date(options['start']), self._date(options['end'])
+        unknown = set(options['rollups']) - set(ROLLUPS)
+        if unknown:
+            raise CommandError(f"Unknown rollups: {', '.join(sorted(unknown))}")
+        for name in options['rollups'] or sorted(ROLLUPS):
+            rollup = ROLLUPS[name]
+            bounds = source_model(rollup).objects.aggregate(first=Min(rollup.day_field), last=Max(rollup.day_field))
+            if not (start or bounds['first']):
+                self.stdout.write(f'{name}: no source rows.')
+                continue
+            first = start or day_of(bounds['first'])
+            last = end or max(day_of(bounds['last']), timezone.localdate())
+
+            started = time.perf_counter()
+            written = 0
+            month = first
+            while month <= last:
+                chunk_end = min(month.replace(day=1) + relativedelta(months=1, days=-1), last)
+                written += rebuild(name, month, chunk_end)
+                month = chunk_end + relativedelta(days=1)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {written} rows for {first} to {last} in {time.perf_counter() - started:.1f}s.'
+            ))
@@ -0,0 +1,70 @@
+# Generated by Django 4.2 on 2026-10-17 05:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('procurement', '0001_initial'),
+        ('inventory', '0003_product_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyQuality',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('qc_type', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('check_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'qc_type', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('attendance_count', models.IntegerField(default=0)),
+                ('overtime_hours', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'unique_together': {('date', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('grand_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('order_count', models.IntegerField(default=0)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='procurement.supplier')),
+            ],
+            options={
+                'unique_together': {('date', 'supplier', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProduction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('completed_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'unique_together': {('date', 'product')},
+            },
+        ),
+    ]
@@ -1,3 +1,58 @@
 from django.db import models
 
-# Create your models here.
+
+class DailyProduction(models.Model):
+    """Completed production orders per day (of actual end) and product"""
+    date = models.DateField()
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='+')
+    completed_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['date', 'product']
+
+    def __str__(self):
+        return f"{self.date} - {self.product_id}: {self.completed_quantity}"
+
+
+class DailyQuality(models.Model):
+    """Quality checks per inspection date, check type and status"""
+    date = models.DateField()
+    qc_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    check_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['date', 'qc_type', 'status']
+
+    def __str__(self):
+        return f"{self.date} - {self.qc_type}/{self.status}: {self.check_count}"
+
+
+class DailyAttendance(models.Model):
+    """Attendance records per day and status"""
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    attendance_count = models.IntegerField(default=0)
+    overtime_hours = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['date', 'status']
+
+    def __str__(self):
+        return f"{self.date} - {self.status}: {self.attendance_count}"
+
+
+class DailyPurchase(models.Model):
+    """Purchase orders per order date, supplier and status"""
+    date = models.DateField()
+    supplier = models.ForeignKey('procurement.Supplier', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    grand_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['date', 'supplier', 'status']
+
+    def __str__(self):
+        return f"{self.date} - {self.supplier_id}/{self.status}: {self.grand_total}"
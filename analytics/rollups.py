@@ -0,0 +1,171 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import DailyAttendance, DailyProduction, DailyPurchase, DailyQuality
+
+# A daily fact table fed by one source model. Rows are keyed by the day of
+# ``day_field`` plus ``dimensions`` (attnames shared by source and rollup).
+# ``measures`` are (rollup field, source field) pairs: the source field is
+# summed, or with None the rows are counted. Only source rows matching
+# ``conditions`` are counted at all.
+Rollup = namedtuple('Rollup', 'source model day_field dimensions measures conditions')
+
+ROLLUPS = {
+    'production': Rollup(
+        'production.ProductionOrder', DailyProduction, 'actual_end', ('product_id',),
+        (('completed_quantity', 'completed_quantity'), ('order_count', None)), {'status': 'completed'},
+    ),
+    'quality': Rollup(
+        'quality.QualityCheck', DailyQuality, 'inspection_date', ('qc_type', 'status'),
+        (('check_count', None),), {},
+    ),
+    'attendance': Rollup(
+        'hr.Attendance', DailyAttendance, 'date', ('status',),
+        (('attendance_count', None), ('overtime_hours', 'overtime_hours')), {},
+    ),
+    'purchase': Rollup(
+        'procurement.PurchaseOrder', DailyPurchase, 'order_date', ('supplier_id', 'status'),
+        (('grand_total', 'grand_total'), ('order_count', None)), {},
+    ),
+}
+
+# Longest range (in days) still served at each granularity; anything longer is monthly
+GRANULARITIES = ((90, 'day'), (730, 'week'))
+BUCKETS = {
+    'day': lambda field: F(field),
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+BATCH_SIZE = 1000
+
+
+def state_fields(rollup):
+    """Source attnames a rollup reads, in a fixed order"""
+    fields = [rollup.day_field, *rollup.dimensions, *rollup.conditions]
+    fields += [source for _, source in rollup.measures if source]
+    return list(dict.fromkeys(fields))
+
+
+def snapshot(rollup, instance):
+    """The rollup fields loaded on ``instance``; deferred fields are left out rather than fetched"""
+    values = instance.__dict__
+    return {field: values[field] for field in state_fields(rollup) if field in values}
+
+
+def day_of(value):
+    """Local calendar day of a date, aware datetime or ISO string"""
+    if isinstance(value, str):
+        value = parse_datetime(value) or date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def contribution(rollup, state):
+    """(key, measures) a source row adds to its rollup, or None if it doesn't count"""
+    if not state or any(state.get(field) != value for field, value in rollup.conditions.items()):
+        return None
+    day = day_of(state.get(rollup.day_field))
+    if day is None:
+        return None
+    key = (day, *(state.get(dimension) for dimension in rollup.dimensions))
+    measures = tuple(1 if source is None else state.get(source) or 0 for _, source in rollup.measures)
+    return key, measures
+
+
+def apply(rollup, key, measures, sign=1):
+    """Add ``measures`` (times ``sign``) to the rollup row of ``key``, creating it if needed"""
+    lookup = dict(zip(('date', *rollup.dimensions), key))
+    updates = {field: F(field) + sign * value for (field, _), value in zip(rollup.measures, measures)}
+    if rollup.model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            rollup.model.objects.create(
+                **lookup, **{field: sign * value for (field, _), value in zip(rollup.measures, measures)}
+            )
+    except IntegrityError:
+        # Another writer created the row first
+        rollup.model.objects.filter(**lookup).update(**updates)
+
+
+def record_change(rollup, old_state, new_state):
+    """Move a source row's contribution from its old to its new state: at most two UPDATEs"""
+    old = contribution(rollup, old_state)
+    new = contribution(rollup, new_state)
+    if old and new and old[0] == new[0]:
+        delta = tuple(n - o for o, n in zip(old[1], new[1]))
+        if any(delta):
+            apply(rollup, new[0], delta)
+        return
+    if old:
+        apply(rollup, *old, sign=-1)
+    if new:
+        apply(rollup, *new)
+
+
+def source_model(rollup):
+    from django.apps import apps
+    return apps.get_model(rollup.source)
+
+
+def _is_datetime(rollup):
+    return source_model(rollup)._meta.get_field(rollup.day_field).get_internal_type() == 'DateTimeField'
+
+
+def rebuild(name, start, end):
+    """Recompute one rollup for the days ``start`` to ``end`` from its source table.
+
+    The rows of the range are replaced in one transaction with the result
+    of a single grouped query. Used to backfill and to repair rollups after
+    writes that bypass model signals (queryset update(), bulk_create).
+    Returns the number of rollup rows written.
+    """
+    rollup = ROLLUPS[name]
+    if _is_datetime(rollup):
+        day, range_lookup = TruncDate(rollup.day_field), f'{rollup.day_field}__date__range'
+    else:
+        day, range_lookup = F(rollup.day_field), f'{rollup.day_field}__range'
+    aggregates = {
+        f'total_{field}': Count('pk') if source is None else Sum(source) for field, source in rollup.measures
+    }
+    rows = source_model(rollup).objects.filter(
+        **rollup.conditions, **{range_lookup: (start, end)}
+    ).annotate(day=day).values('day', *rollup.dimensions).annotate(**aggregates).order_by()
+
+    facts = [
+        rollup.model(
+            date=row['day'], **{dimension: row[dimension] for dimension in rollup.dimensions},
+            **{field: row[f'total_{field}'] or 0 for field, _ in rollup.measures},
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        rollup.model.objects.filter(date__range=(start, end)).delete()
+        rollup.model.objects.bulk_create(facts, batch_size=BATCH_SIZE)
+    return len(facts)
+
+
+def granularity(days):
+    """Bucket size for a range of ``days``: daily, weekly, then monthly for long ranges"""
+    for limit, name in GRANULARITIES:
+        if days <= limit:
+            return name
+    return 'month'
+
+
+def date_range(days):
+    """(start, end) dates of the last ``days`` days, ending today"""
+    end = timezone.localdate()
+    return end - timedelta(days=days), end
+
+
+def series(queryset, days, **aggregates):
+    """Aggregate a rollup queryset into buckets sized for ``days``; rows carry the bucket start as ``period``"""
+    return queryset.annotate(period=BUCKETS[granularity(days)]('date')).values('period').annotate(
+        **aggregates
+    ).order_by('period')
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from .rollups import ROLLUPS, record_change, snapshot, source_model, state_fields
+
+# Rollups are kept current with deltas written in the same transaction as
+# the source row, so a rollback undoes both. Before a save or delete the
+# row's stored state is read back from the database (one values() query on
+# the pk), never taken from the instance, which may be stale: its old
+# contribution comes off and the new one goes on.
+
+
+def _rollup(sender):
+    return ROLLUP_BY_SOURCE[sender]
+
+
+def _stored_state(sender, instance):
+    """The rollup fields of ``instance``'s row as currently stored, or None if there is no row"""
+    return sender._base_manager.filter(pk=instance.pk).values(*state_fields(_rollup(sender))).first()
+
+
+def before_save(sender, instance, **kwargs):
+    instance._rollup_state = None if instance._state.adding else _stored_state(sender, instance)
+
+
+def after_save(sender, instance, created, update_fields=None, **kwargs):
+    rollup = _rollup(sender)
+    old = None if created else instance._rollup_state
+    current = snapshot(rollup, instance)
+    if update_fields is not None and old:
+        # Only these fields were written; anything else changed in memory is not in the database
+        saved = {sender._meta.get_field(name).attname for name in update_fields}
+        current = {field: value for field, value in current.items() if field in saved}
+    record_change(rollup, old, {**(old or {}), **current})
+
+
+def before_delete(sender, instance, **kwargs):
+    instance._rollup_state = _stored_state(sender, instance)
+
+
+def after_delete(sender, instance, **kwargs):
+    record_change(_rollup(sender), instance._rollup_state, None)
+
+
+ROLLUP_BY_SOURCE = {}
+for name, rollup in ROLLUPS.items():
+    model = source_model(rollup)
+    ROLLUP_BY_SOURCE[model] = rollup
+    pre_save.connect(before_save, sender=model, dispatch_uid=f'rollup_pre_save_{name}')
+    post_save.connect(after_save, sender=model, dispatch_uid=f'rollup_save_{name}')
+    pre_delete.connect(before_delete, sender=model, dispatch_uid=f'rollup_pre_delete_{name}')
+    post_delete.connect(after_delete, sender=model, dispatch_uid=f'rollup_delete_{name}')
@@ -1,3 +1,127 @@
+from datetime import date, datetime
+from decimal import Decimal
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+from core.models import Department
+from hr.models import Attendance, Employee
+from inventory.models import Product, UnitOfMeasure
+from production.models import BillOfMaterials, ProductionOrder
+from quality.models import QualityCheck
+from .models import DailyQuality
+from .rollups import ROLLUPS, rebuild
 
-# Create your tests here.
+START, END = date(2025, 1, 1), date(2025, 12, 31)
+
+
+class RollupTest(TestCase):
+    """Rollups kept by the signals must match a rebuild from the source tables"""
+
+    def setUp(self):
+        self.inspector = User.objects.create(username='inspector')
+
+    def facts(self, name):
+        """The rollup's non-empty rows, keyed by date and dimensions"""
+        rollup = ROLLUPS[name]
+        measures = [field for field, _ in rollup.measures]
+        return {
+            row[:len(row) - len(measures)]: row[-len(measures):]
+            for row in rollup.model.objects.values_list('date', *rollup.dimensions, *measures)
+            if any(row[-len(measures):])
+        }
+
+    def assertMatchesRebuild(self, name):
+        maintained = self.facts(name)
+        rebuild(name, START, END)
+        self.assertEqual(maintained, self.facts(name))
+        return maintained
+
+    def check(self, day=10, status='pending', qc_type='final'):
+        return QualityCheck.objects.create(
+            qc_type=qc_type, reference_type='other', inspector=self.inspector,
+            inspection_date=date(2025, 3, day), status=status
+        )
+
+    def test_create_update_and_delete(self):
+        first = self.check()
+        self.check(status='passed')
+        self.check(day=11)
+        first.status = 'failed'
+        first.inspection_date = date(2025, 3, 12)
+        first.save()
+        self.assertEqual(self.assertMatchesRebuild('quality'), {
+            (date(2025, 3, 10), 'final', 'passed'): (1,),
+            (date(2025, 3, 11), 'final', 'pending'): (1,),
+            (date(2025, 3, 12), 'final', 'failed'): (1,),
+        })
+        first.delete()
+        self.assertMatchesRebuild('quality')
+        self.assertFalse(DailyQuality.objects.filter(status='failed', check_count__gt=0).exists())
+
+    def test_update_fields_only_counts_what_was_written(self):
+        check = self.check()
+        check.status = 'passed'
+        check.inspection_date = date(2025, 3, 20)
+        check.save(update_fields=['status'])
+        self.assertEqual(self.assertMatchesRebuild('quality'), {(date(2025, 3, 10), 'final', 'passed'): (1,)})
+
+    def test_deferred_instances(self):
+        self.check()
+        check = QualityCheck.objects.only('pk', 'status').get()
+        check.status = 'failed'
+        check.save()
+        self.assertEqual(self.assertMatchesRebuild('quality'), {(date(2025, 3, 10), 'final', 'failed'): (1,)})
+        QualityCheck.objects.defer('status').get().delete()
+        self.assertEqual(self.assertMatchesRebuild('quality'), {})
+
+    def test_stale_instances(self):
+        check = self.check()
+        # Another copy of the row moves it to failed; the first one still says pending
+        copy = QualityCheck.objects.get(pk=check.pk)
+        copy.status = 'failed'
+        copy.save()
+        check.delete()
+        self.assertEqual(self.assertMatchesRebuild('quality'), {})
+        self.assertFalse(DailyQuality.objects.filter(check_count__lt=0).exists())
+
+        check = self.check()
+        QualityCheck.objects.get(pk=check.pk).delete()
+        # Saving an instance whose row is gone inserts it again
+        check.save()
+        self.assertEqual(self.assertMatchesRebuild('quality'), {(date(2025, 3, 10), 'final', 'pending'): (1,)})
+
+    def test_summed_measures(self):
+        employee = Employee.objects.create(
+            user=User.objects.create(username='welder'), employee_id='W001',
+            department=Department.objects.create(name='Welding', code='WLD'), designation='Welder',
+            employee_type='permanent', date_of_joining=date(2020, 1, 1), date_of_birth=date(1990, 1, 1),
+            gender='male', phone='1', address='-'
+        )
+        attendance = Attendance.objects.create(employee=employee, date=date(2025, 3, 3), status='present',
+                                               overtime_hours=Decimal('1.5'))
+        Attendance.objects.create(employee=employee, date=date(2025, 3, 4), status='present')
+        attendance.overtime_hours = Decimal('4')
+        attendance.save(update_fields=['overtime_hours'])
+        self.assertEqual(self.assertMatchesRebuild('attendance'), {
+            (date(2025, 3, 3), 'present'): (1, Decimal('4')),
+            (date(2025, 3, 4), 'present'): (1, Decimal('0')),
+        })
+
+    def test_conditions(self):
+        uom = UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        product = Product.objects.create(SKU='FG', name='FG', product_type='finished', unit_of_measure=uom)
+        bom = BillOfMaterials.objects.create(code='BOM-FG', finished_product=product, effective_date=START)
+        end = timezone.make_aware(datetime(2025, 3, 5, 16))
+        order = ProductionOrder.objects.create(
+            bom=bom, product=product, quantity=10, uom=uom, planned_start=end, planned_end=end,
+            status='in_progress', actual_end=end
+        )
+        # Only completed orders count
+        self.assertEqual(self.assertMatchesRebuild('production'), {})
+        order.status = 'completed'
+        order.completed_quantity = 10
+        order.save()
+        self.assertEqual(self.assertMatchesRebuild('production'), {(date(2025, 3, 5), product.pk): (Decimal('10'), 1)})
+        order.status = 'cancelled'
+        order.save(update_fields=['status'])
+        self.assertEqual(self.assertMatchesRebuild('production'), {})
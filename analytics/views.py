@@ -1,7 +1,8 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Sum, Count, Avg, F, Q
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
 from django.utils import timezone
 import json
 from datetime import datetime, timedelta
@@ -15,6 +16,8 @@ def analytics_dashboard(request):
 def production_analytics(request):
     """Production analytics API"""
     from production.models import ProductionOrder
+    from .models import DailyProduction
+    from .rollups import date_range, granularity, series
     
     days = int(request.GET.get('days', 30))
     end_date = timezone.now()
@@ -25,13 +28,15 @@ def production_analytics(request):
         planned_start__range=[start_date, end_date]
     )
     
-    # Daily production summary
-    daily_data = orders.filter(status='completed').values(
-        'actual_end__date'
-    ).annotate(
-        total_quantity=Sum('completed_quantity'),
-        total_orders=Count('id')
-    ).order_by('actual_end__date')
+    # Completed production per day, from the daily rollup (weekly/monthly for long ranges)
+    daily_data = [
+        {'actual_end__date': row['period'], 'total_quantity': row['total_quantity'],
+         'total_orders': row['total_orders']}
+        for row in series(
+            DailyProduction.objects.filter(date__range=date_range(days)), days,
+            total_quantity=Sum('completed_quantity'), total_orders=Sum('order_count')
+        )
+    ]
     
     # Status distribution
     status_distribution = orders.values('status').annotate(
@@ -45,7 +50,8 @@ def production_analytics(request):
     ).order_by('-total_quantity')[:10]
     
     return JsonResponse({
-        'daily_data': list(daily_data),
+        'granularity': granularity(days),
+        'daily_data': daily_data,
         'status_distribution': list(status_distribution),
         'product_data': list(product_data),
     })
@@ -61,8 +67,8 @@ def inventory_analytics(request):
     
     # Stock status
     stock_status = Stock.objects.aggregate(
-        low_stock=Count('id', filter=Q(quantity__lt=models.F('product__min_stock'))),
-        normal_stock=Count('id', filter=Q(quantity__gte=models.F('product__min_stock'))),
+        low_stock=Count('id', filter=Q(quantity__lt=F('product__min_stock'))),
+        normal_stock=Count('id', filter=Q(quantity__gte=F('product__min_stock'))),
         out_of_stock=Count('id', filter=Q(quantity=0))
     )
     
@@ -81,33 +87,41 @@ def inventory_analytics(request):
 @login_required
 def quality_analytics(request):
     """Quality analytics API"""
-    from quality.models import QualityCheck
+    from .models import DailyQuality
+    from .rollups import date_range, granularity, series
     
     days = int(request.GET.get('days', 30))
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=days)
+    checks = DailyQuality.objects.all()
     
     # Quality trends
-    quality_trends = QualityCheck.objects.filter(
-        inspection_date__range=[start_date, end_date]
-    ).values('inspection_date').annotate(
-        total=Count('id'),
-        passed=Count('id', filter=Q(status='passed')),
-        failed=Count('id', filter=Q(status='failed'))
-    ).order_by('inspection_date')
+    quality_trends = [
+        {'inspection_date': row['period'], 'total': row['total'], 'passed': row['passed'],
+         'failed': row['failed']}
+        for row in series(
+            checks.filter(date__range=date_range(days)), days,
+            total=Sum('check_count'),
+            passed=Coalesce(Sum('check_count', filter=Q(status='passed')), 0),
+            failed=Coalesce(Sum('check_count', filter=Q(status='failed')), 0)
+        )
+    ]
     
     # Overall quality metrics
-    total_checks = QualityCheck.objects.count()
-    passed_checks = QualityCheck.objects.filter(status='passed').count()
+    totals = checks.aggregate(
+        total=Coalesce(Sum('check_count'), 0),
+        passed=Coalesce(Sum('check_count', filter=Q(status='passed')), 0)
+    )
+    total_checks = totals['total']
+    passed_checks = totals['passed']
     quality_rate = (passed_checks / total_checks * 100) if total_checks > 0 else 0
     
     # Check type distribution
-    type_distribution = QualityCheck.objects.values('qc_type').annotate(
-        count=Count('id')
-    ).order_by('-count')
+    type_distribution = checks.values('qc_type').annotate(
+        count=Sum('check_count')
+    ).filter(count__gt=0).order_by('-count')
     
     return JsonResponse({
-        'quality_trends': list(quality_trends),
+        'granularity': granularity(days),
+        'quality_trends': quality_trends,
         'total_checks': total_checks,
         'passed_checks': passed_checks,
         'quality_rate': quality_rate,
@@ -117,34 +131,38 @@ def quality_analytics(request):
 @login_required
 def financial_analytics(request):
     """Financial analytics API"""
-    from procurement.models import PurchaseOrder
+    from .models import DailyPurchase
+    from .rollups import date_range, granularity, series
     
     days = int(request.GET.get('days', 90))
-    end_date = timezone.now()
-    start_date = end_date - timedelta(days=days)
     
     # Purchase analytics
-    purchases = PurchaseOrder.objects.filter(
-        order_date__range=[start_date, end_date],
+    purchases = DailyPurchase.objects.filter(
+        date__range=date_range(days),
         status__in=['received', 'partial']
     )
     
     # Monthly spending
     monthly_spending = purchases.values(
-        'order_date__year', 'order_date__month'
+        order_date__year=ExtractYear('date'), order_date__month=ExtractMonth('date')
     ).annotate(
         total_amount=Sum('grand_total'),
-        count=Count('id')
+        count=Sum('order_count')
     ).order_by('order_date__year', 'order_date__month')
     
+    # Spending over the range, bucketed by its length
+    spending_trend = series(purchases, days, total_amount=Sum('grand_total'), count=Sum('order_count'))
+    
     # Supplier spending
     supplier_spending = purchases.values('supplier__name').annotate(
         total_amount=Sum('grand_total'),
-        order_count=Count('id')
+        order_count=Sum('order_count')
     ).order_by('-total_amount')[:10]
     
     return JsonResponse({
+        'granularity': granularity(days),
         'monthly_spending': list(monthly_spending),
+        'spending_trend': list(spending_trend),
         'supplier_spending': list(supplier_spending),
         'total_spending': purchases.aggregate(total=Sum('grand_total'))['total'] or 0,
     })
@@ -152,7 +170,9 @@ def financial_analytics(request):
 @login_required
 def hr_analytics(request):
     """HR analytics API"""
-    from hr.models import Employee, Attendance, LeaveApplication
+    from hr.models import Employee, LeaveApplication
+    from .models import DailyAttendance
+    from .rollups import date_range, granularity, series
     
     days = int(request.GET.get('days', 30))
     end_date = timezone.now()
@@ -162,13 +182,15 @@ def hr_analytics(request):
     total_employees = Employee.objects.count()
     active_employees = Employee.objects.filter(employment_status='active').count()
     
-    # Attendance trends
-    attendance_trends = Attendance.objects.filter(
-        date__range=[start_date, end_date]
-    ).values('date').annotate(
-        present=Count('id', filter=Q(status='present')),
-        absent=Count('id', filter=Q(status='absent'))
-    ).order_by('date')
+    # Attendance trends, from the daily rollup (weekly/monthly for long ranges)
+    attendance_trends = [
+        {'date': row['period'], 'present': row['present'], 'absent': row['absent']}
+        for row in series(
+            DailyAttendance.objects.filter(date__range=date_range(days)), days,
+            present=Coalesce(Sum('attendance_count', filter=Q(status='present')), 0),
+            absent=Coalesce(Sum('attendance_count', filter=Q(status='absent')), 0)
+        )
+    ]
     
     # Leave trends
     leave_trends = LeaveApplication.objects.filter(
@@ -185,7 +207,8 @@ def hr_analytics(request):
     return JsonResponse({
         'total_employees': total_employees,
         'active_employees': active_employees,
-        'attendance_trends': list(attendance_trends),
+        'granularity': granularity(days),
+        'attendance_trends': attendance_trends,
         'leave_trends': list(leave_trends),
         'department_distribution': list(department_distribution),
     })
@@ -216,7 +239,7 @@ def real_time_metrics(request):
     
     # Low stock items
     low_stock = Stock.objects.filter(
-        quantity__lt=models.F('product__min_stock')
+        quantity__lt=F('product__min_stock')
     ).count()
     
     # Pending quality checks
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q, F
+from django.utils import timezone
+
+DASHBOARD_KPI_KEY = 'core:dashboard_kpis:{date}'
+
+
+def empty_dashboard_kpis():
+    """Placeholder figures used when the dashboard data can't be loaded"""
+    return {
+        'active_orders': 0,
+        'today_production': 0,
+        'low_stock_items': 0,
+        'pending_qc': 0,
+        'recent_orders': [],
+        'low_stock_list': [],
+        'today_attendance': {'present': 0, 'absent': 0},
+        'pending_purchase_orders': 0,
+    }
+
+
+def _cache_key(day=None):
+    return DASHBOARD_KPI_KEY.format(date=(day or timezone.localdate()).isoformat())
+
+
+def build_dashboard_kpis(day=None):
+    """Compute the dashboard figures straight from the database"""
+    from production.models import ProductionOrder
+    from inventory.models import Stock
+    from quality.models import QualityCheck
+    from hr.models import Attendance
+    from procurement.models import PurchaseOrder
+
+    today = day or timezone.localdate()
+    low_stock = Stock.objects.filter(quantity__lt=F('product__min_stock'))
+
+    return {
+        'active_orders': ProductionOrder.objects.filter(
+            status__in=['in_progress', 'released']
+        ).count(),
+        'today_production': ProductionOrder.objects.filter(
+            status='completed',
+            actual_end__date=today
+        ).aggregate(total=Sum('completed_quantity'))['total'] or 0,
+        'low_stock_items': low_stock.count(),
+        'pending_qc': QualityCheck.objects.filter(status='pending').count(),
+        # Materialised so the snapshot can be pickled into the cache
+        'recent_orders': list(ProductionOrder.objects.select_related(
+            'product', 'uom'
+        ).order_by('-created_at')[:5]),
+        'low_stock_list': list(low_stock.select_related('product', 'warehouse')[:5]),
+        'today_attendance': Attendance.objects.filter(date=today).aggregate(
+            present=Count('id', filter=Q(status='present')),
+            absent=Count('id', filter=Q(status='absent'))
+        ),
+        'pending_purchase_orders': PurchaseOrder.objects.filter(
+            status__in=['draft', 'sent', 'confirmed']
+        ).count(),
+    }
+
+
+def get_dashboard_kpis():
+    """Return today's dashboard snapshot, computing it only on a cache miss"""
+    key = _cache_key()
+    kpis = cache.get(key)
+    if kpis is None:
+        kpis = build_dashboard_kpis()
+        cache.set(key, kpis, getattr(settings, 'DASHBOARD_KPI_TIMEOUT', 300))
+    return kpis
+
+
+def invalidate_dashboard_kpis():
+    """Drop today's snapshot so the next dashboard hit rebuilds it"""
+    cache.delete(_cache_key())
@@ -0,0 +1,140 @@
+import statistics
+import time
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from core.kpi import invalidate_dashboard_kpis
+from core.models import Department
+from core.views import dashboard
+from hr.models import Attendance, Employee
+from inventory.models import Product, Stock, UnitOfMeasure, Warehouse
+from procurement.models import PurchaseOrder, Supplier
+from production.models import BillOfMaterials, ProductionOrder
+from quality.models import QualityCheck
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Compare cold and warm dashboard latency over generated rows in every KPI table (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Rows per KPI table')
+        parser.add_argument('--repeat', type=int, default=5, help='Dashboard hits measured per case')
+
+    def _populate(self, rows):
+        today = timezone.localdate()
+        now = timezone.now()
+        user = User.objects.create(username='bench-dashboard')
+        uom = UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        warehouses = Warehouse.objects.bulk_create(
+            [Warehouse(name=f'Bench {n}', code=f'BW{n}', location='-') for n in range(10)]
+        )
+        products = Product.objects.bulk_create([
+            Product(SKU=f'BENCH-{n}', name=f'Bench product {n}', product_type='raw',
+                    unit_of_measure=uom, min_stock=50)
+            for n in range(rows // len(warehouses))
+        ], batch_size=BATCH_SIZE)
+        Stock.objects.bulk_create([
+            Stock(product=product, warehouse=warehouse, quantity=n % 100)
+            for n, product in enumerate(products) for warehouse in warehouses
+        ], batch_size=BATCH_SIZE)
+
+        bom = BillOfMaterials.objects.create(
+            code='BENCH-BOM', finished_product=products[0], effective_date=today
+        )
+        statuses = ['draft', 'released', 'in_progress', 'completed']
+        ProductionOrder.objects.bulk_create([
+            ProductionOrder(
+                order_number=f'BENCH-PROD-{n}', bom=bom, product=products[0], quantity=10, uom=uom,
+                planned_start=now, planned_end=now, status=statuses[n % 4],
+                actual_end=now if n % 4 == 3 else None, completed_quantity=10
+            )
+            for n in range(rows)
+        ], batch_size=BATCH_SIZE)
+
+        QualityCheck.objects.bulk_create([
+            QualityCheck(
+                qc_number=f'BENCH-QC-{n}', qc_type='final', reference_type='other', inspector=user,
+                inspection_date=today, status='pending' if n % 3 else 'passed'
+            )
+            for n in range(rows)
+        ], batch_size=BATCH_SIZE)
+
+        supplier = Supplier.objects.create(
+            code='BENCH', name='Bench supplier', contact_person='-', email='bench@example.com',
+            phone='-', address='-'
+        )
+        PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(
+                po_number=f'BENCH-PO-{n}', supplier=supplier, order_date=today, expected_delivery=today,
+                status='sent' if n % 2 else 'received', delivery_address='-'
+            )
+            for n in range(rows)
+        ], batch_size=BATCH_SIZE)
+
+        # unique (employee, date): a thousand employees over as many days as it takes
+        department = Department.objects.create(name='Bench', code='BENCH')
+        employee_count = min(rows, 1000)
+        users = User.objects.bulk_create(
+            [User(username=f'bench-employee-{n}') for n in range(employee_count)], batch_size=BATCH_SIZE
+        )
+        employees = Employee.objects.bulk_create([
+            Employee(
+                user=employee_user, employee_id=f'BENCH-{n}', department=department, designation='-',
+                employee_type='permanent', date_of_joining=date(2020, 1, 1),
+                date_of_birth=date(1990, 1, 1), gender='other', phone='-', address='-'
+            )
+            for n, employee_user in enumerate(users)
+        ], batch_size=BATCH_SIZE)
+        Attendance.objects.bulk_create([
+            Attendance(employee=employees[n % employee_count], date=today - timedelta(days=n // employee_count),
+                       status='present' if n % 5 else 'absent')
+            for n in range(rows)
+        ], batch_size=BATCH_SIZE)
+        return user
+
+    def _hit(self, request):
+        """Milliseconds and queries of one dashboard view call, template rendering included"""
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            dashboard(request)
+            milliseconds = (time.perf_counter() - started) * 1000
+        return milliseconds, queries
+
+    def _report(self, label, hits):
+        times = [milliseconds for milliseconds, _ in hits]
+        self.stdout.write(
+            f'{label:<5} median {statistics.median(times):>8.1f} ms  max {max(times):>8.1f} ms  '
+            f'{hits[0][1]} queries'
+        )
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            started = time.perf_counter()
+            user = self._populate(rows)
+            self.stdout.write(f'{rows} rows per table generated in {time.perf_counter() - started:.1f}s')
+
+            request = RequestFactory().get('/')
+            request.user = user
+            cold = []
+            for _ in range(repeat):
+                invalidate_dashboard_kpis()
+                cold.append(self._hit(request))
+            warm = [self._hit(request) for _ in range(repeat)]
+            self._report('cold', cold)
+            self._report('warm', warm)
+
+            invalidate_dashboard_kpis()
+            transaction.set_rollback(True)
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from core.tasks import execute, next_task, reclaim_stale, worker_id
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (payroll runs, report jobs, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when idle')
+
+    def handle(self, *args, **options):
+        worker = worker_id()
+        self.stdout.write(f'Worker {worker} started.')
+        while True:
+            reclaim_stale()
+            task = next_task(worker)
+            if task is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            ok = execute(task)
+            self.stdout.write(f"{task.name} #{task.pk}: {'done' if ok else task.status}")
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20)),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField(default=0)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('prefix', 'year', 'month')},
+            },
+        ),
+    ]
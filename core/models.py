@@ -30,4 +30,44 @@ class Department(models.Model):
     description = models.TextField(blank=True)
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class DocumentSequence(models.Model):
+    """Counter behind numbers like PROD-2025-00001, one row per prefix and year"""
+    prefix = models.CharField(max_length=20)
+    year = models.IntegerField()
+    month = models.IntegerField(default=0)  # 0 for sequences that only reset yearly
+    last_value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['prefix', 'year', 'month']
+    
+    def __str__(self):
+        return f"{self.prefix}-{self.year}: {self.last_value}"
+
+class BackgroundTask(models.Model):
+    """Job waiting for (or run by) a ``manage.py run_worker`` process"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
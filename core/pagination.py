@@ -0,0 +1,251 @@
+import base64
+import datetime
+import decimal
+import json
+import uuid
+from django.db import DatabaseError, connection
+from django.db.models import Model, Q
+from django.utils.functional import cached_property
+
+# Rows counted before estimate mode gives up and reports "N+"
+ESTIMATE_COUNT_LIMIT = 1000
+
+
+class _CursorEncoder(json.JSONEncoder):
+    # DjangoJSONEncoder truncates microseconds, which would make a cursor
+    # land between two rows created in the same millisecond
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+            return o.isoformat()
+        if isinstance(o, (decimal.Decimal, uuid.UUID)):
+            return str(o)
+        return super().default(o)
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, list(values)], cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, values), or None for a missing or mangled cursor"""
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(data)
+    except (ValueError, TypeError):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator, usable like a Paginator page in templates"""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor, params=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.params = params
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _querystring(self, cursor):
+        # Keep the current filters; drop any old-style ?page= parameter
+        params = self.params.copy() if self.params is not None else {}
+        params.pop('page', None)
+        params.pop(self.paginator.cursor_param, None)
+        if cursor:
+            params[self.paginator.cursor_param] = cursor
+        if hasattr(params, 'urlencode'):
+            return params.urlencode()
+        from urllib.parse import urlencode
+        return urlencode(params)
+
+    @property
+    def first_querystring(self):
+        return self._querystring(None)
+
+    @property
+    def next_querystring(self):
+        return self._querystring(self.next_cursor)
+
+    @property
+    def previous_querystring(self):
+        return self._querystring(self.previous_cursor)
+
+
+class KeysetPaginator:
+    """Cursor pagination on the queryset's ordering keys.
+
+    Instead of COUNT(*) plus OFFSET, each page is fetched with a WHERE on the
+    last row's ordering values (``created_at < x OR (created_at = x AND
+    id < y)``), so page 500 costs the same as page 1 when the ordering is
+    indexed. The primary key is appended as a tie-breaker if missing.
+    Ordering keys must be non-null.
+
+    With ``estimate_count`` the total comes from table statistics (when the
+    queryset is unfiltered) or stops counting at ESTIMATE_COUNT_LIMIT rows.
+    """
+    cursor_param = 'cursor'
+
+    def __init__(self, queryset, per_page, ordering=None, estimate_count=False,
+                 cursor_param=None):
+        self.per_page = int(per_page)
+        self.estimate_count = estimate_count
+        self.count_is_estimate = False
+        if cursor_param:
+            self.cursor_param = cursor_param
+
+        keys = list(ordering or queryset.query.order_by or queryset.model._meta.ordering or [])
+        if not any(key.lstrip('-') in ('pk', 'id') for key in keys):
+            descending = bool(keys) and keys[0].startswith('-')
+            keys.append('-pk' if descending else 'pk')
+        self.keys = keys
+        self.queryset = queryset.order_by(*keys)
+
+    def _key_values(self, obj):
+        values = []
+        for key in self.keys:
+            value = obj
+            for attr in key.lstrip('-').split('__'):
+                value = getattr(value, attr)
+            values.append(value.pk if isinstance(value, Model) else value)
+        return values
+
+    def _seek(self, values, forward):
+        """Rows after (or, going back, before) the row with these key values"""
+        condition = Q()
+        equal = Q()
+        for key, value in zip(self.keys, values):
+            name = key.lstrip('-')
+            descending = key.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Redundant range on the leading key, so the database can seek its
+        # index instead of evaluating the OR row by row
+        name = self.keys[0].lstrip('-')
+        lookup = 'lte' if self.keys[0].startswith('-') == forward else 'gte'
+        return Q(**{f'{name}__{lookup}': values[0]}) & condition
+
+    def get_page(self, cursor=None, params=None):
+        """Page after/before ``cursor``; a missing or invalid cursor gives the first page"""
+        decoded = decode_cursor(cursor)
+        if decoded and len(decoded[1]) != len(self.keys):
+            decoded = None
+        size = self.per_page
+
+        if decoded is None:
+            rows = list(self.queryset[:size + 1])
+            has_more, rows = len(rows) > size, rows[:size]
+            has_next, has_previous = has_more, False
+        elif decoded[0] == 'n':
+            rows = list(self.queryset.filter(self._seek(decoded[1], True))[:size + 1])
+            has_more, rows = len(rows) > size, rows[:size]
+            has_next, has_previous = has_more, True
+        else:
+            # Walk backwards with the ordering reversed, then flip the rows
+            reverse = self.queryset.reverse().filter(self._seek(decoded[1], False))
+            rows = list(reverse[:size + 1])
+            has_more, rows = len(rows) > size, rows[:size][::-1]
+            has_next, has_previous = True, has_more
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor('n', self._key_values(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor('p', self._key_values(rows[0]))
+        return KeysetPage(rows, self, next_cursor, previous_cursor, params)
+
+    @cached_property
+    def count(self):
+        if not self.estimate_count:
+            return self.queryset.count()
+        if not self.queryset.query.where:
+            estimate = _table_estimate(self.queryset.model)
+            if estimate is not None:
+                self.count_is_estimate = True
+                return estimate
+        counted = self.queryset.order_by()[:ESTIMATE_COUNT_LIMIT + 1].count()
+        if counted > ESTIMATE_COUNT_LIMIT:
+            self.count_is_estimate = True
+            return ESTIMATE_COUNT_LIMIT
+        return counted
+
+    @property
+    def count_label(self):
+        """Total for display, e.g. '1,234', '~250,000' or '1,000+'"""
+        count = self.count
+        if not self.count_is_estimate:
+            return f'{count:,}'
+        if count == ESTIMATE_COUNT_LIMIT:
+            return f'{count:,}+'
+        return f'~{count:,}'
+
+
+def _table_estimate(model):
+    """Approximate row count from the planner statistics, or None"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+        elif connection.vendor == 'sqlite':
+            # Only present once ANALYZE has been run
+            try:
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s ORDER BY idx IS NOT NULL LIMIT 1",
+                    [table]
+                )
+            except DatabaseError:
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    if row and row[0] and row[0] > 0:
+        return int(row[0])
+    return None
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that pages with KeysetPaginator instead of Paginator.
+
+    Set ``ordering_keys`` to override the queryset's ordering, and
+    ``estimate_count`` to avoid an exact COUNT(*) on large tables.
+    """
+    paginate_by = 20
+    ordering_keys = None
+    estimate_count = False
+    cursor_param = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(
+            queryset, page_size, ordering=self.ordering_keys,
+            estimate_count=self.estimate_count, cursor_param=self.cursor_param
+        )
+        page = paginator.get_page(self.request.GET.get(self.cursor_param), params=self.request.GET)
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,96 @@
+import threading
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import DocumentSequence
+
+# Blocks of numbers reserved by this worker process, keyed by (prefix, year, month).
+# Each entry is [next value to hand out, last value of the block].
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def _seed_value(prefix, year, month, seed_from):
+    """Highest number already used for this prefix/year, read from the owning model"""
+    if seed_from is None:
+        return 0
+    model, field = seed_from
+    scope = _scope(prefix, year, month)
+    # Compared as text, ...-9 would sort above ...-10 (and padding may vary),
+    # so the suffixes are compared as numbers; rows whose suffix is not a
+    # number are skipped. This only runs when the counter row is created.
+    numbers = model.objects.filter(**{f'{field}__startswith': f'{scope}-'}).values_list(field, flat=True)
+    suffixes = (number[len(scope) + 1:] for number in numbers.iterator())
+    return max((int(suffix) for suffix in suffixes if suffix.isdigit()), default=0)
+
+
+def _scope(prefix, year, month):
+    if month:
+        return f"{prefix}-{year}-{month:02d}"
+    return f"{prefix}-{year}"
+
+
+def _reserve(prefix, year, month, count, seed_from):
+    """Atomically bump the counter row by ``count`` and return the new last value"""
+    counter = DocumentSequence.objects.filter(prefix=prefix, year=year, month=month)
+    with transaction.atomic():
+        while True:
+            # The UPDATE takes the row (or on SQLite, database) write lock, so
+            # concurrent callers are serialised here and never see the same value.
+            if counter.update(last_value=F('last_value') + count):
+                return counter.values_list('last_value', flat=True).get()
+            try:
+                with transaction.atomic():
+                    DocumentSequence.objects.create(
+                        prefix=prefix, year=year, month=month,
+                        last_value=_seed_value(prefix, year, month, seed_from) + count
+                    )
+                return counter.values_list('last_value', flat=True).get()
+            except IntegrityError:
+                # Another worker created the row first; retry the update
+                continue
+
+
+def allocate(prefix, count=1, year=None, month=0, seed_from=None):
+    """Allocate ``count`` consecutive sequence values and return the first one.
+
+    When DOCUMENT_SEQUENCE_BLOCK_SIZE is above 1, single allocations made
+    outside a transaction are served from a block reserved in advance for
+    this worker process (hi/lo), so most calls never touch the database.
+    Numbers stay unique but may be issued out of order across workers.
+    """
+    year = year or timezone.now().year
+    key = (prefix, year, month)
+    block_size = getattr(settings, 'DOCUMENT_SEQUENCE_BLOCK_SIZE', 1)
+
+    # A block reserved inside a transaction that later rolls back would be
+    # handed out again by the database, so only prefetch in autocommit mode.
+    if count > 1 or block_size <= 1 or connection.in_atomic_block:
+        return _reserve(prefix, year, month, count, seed_from) - count + 1
+
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block is None or block[0] > block[1]:
+            hi = _reserve(prefix, year, month, block_size, seed_from)
+            block = _blocks[key] = [hi - block_size + 1, hi]
+        value = block[0]
+        block[0] += 1
+        return value
+
+
+def next_document_number(prefix, year=None, month=0, seed_from=None):
+    """Next number in the PREFIX-YYYY-NNNNN format (PREFIX-YYYY-MM-NNNNN with a month)"""
+    year = year or timezone.now().year
+    value = allocate(prefix, year=year, month=month, seed_from=seed_from)
+    return f"{_scope(prefix, year, month)}-{value:05d}"
+
+
+def next_document_numbers(prefix, count, year=None, month=0, seed_from=None):
+    """Reserve ``count`` consecutive numbers at once, for bulk inserts"""
+    if count <= 0:
+        return []
+    year = year or timezone.now().year
+    first = allocate(prefix, count=count, year=year, month=month, seed_from=seed_from)
+    scope = _scope(prefix, year, month)
+    return [f"{scope}-{value:05d}" for value in range(first, first + count)]
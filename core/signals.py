@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from production.models import ProductionOrder
+from inventory.models import Stock, Product
+from quality.models import QualityCheck
+from hr.models import Attendance
+from procurement.models import PurchaseOrder
+from .kpi import invalidate_dashboard_kpis
+
+# Every model the dashboard snapshot reads from. Product is included because
+# changing min_stock moves items in and out of the low stock figures.
+DASHBOARD_SOURCES = [ProductionOrder, Stock, Product, QualityCheck, Attendance, PurchaseOrder]
+
+
+def dashboard_source_changed(sender, **kwargs):
+    # Wait for the commit so a concurrent dashboard hit can't re-cache
+    # figures from before this write
+    transaction.on_commit(invalidate_dashboard_kpis)
+
+
+for model in DASHBOARD_SOURCES:
+    receiver(post_save, sender=model, dispatch_uid=f'dashboard_kpis_save_{model.__name__}')(dashboard_source_changed)
+    receiver(post_delete, sender=model, dispatch_uid=f'dashboard_kpis_delete_{model.__name__}')(dashboard_source_changed)
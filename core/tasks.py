@@ -0,0 +1,115 @@
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+from .models import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+# Task name -> callable taking the BackgroundTask, filled by @register in <app>/tasks.py
+_registry = {}
+_discovered = False
+
+
+def register(name):
+    """Decorator registering a task handler under ``name``"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def _handler(name):
+    global _discovered
+    if name not in _registry and not _discovered:
+        autodiscover_modules('tasks')
+        _discovered = True
+    return _registry[name]
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(name, payload=None, run_after=None, max_attempts=3):
+    """Queue a task for the worker and return it.
+
+    With BACKGROUND_TASKS_EAGER set (handy in development without a
+    worker running) the task runs in-process once the current
+    transaction commits.
+    """
+    task = BackgroundTask.objects.create(
+        name=name, payload=payload or {}, max_attempts=max_attempts,
+        run_after=run_after or timezone.now()
+    )
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(lambda: _run_eager(task))
+    return task
+
+
+def _run_eager(task):
+    if claim(task.pk, worker_id()):
+        task.refresh_from_db()
+        execute(task)
+
+
+def heartbeat(task):
+    """Tell other workers the task is still alive; call between units of work"""
+    BackgroundTask.objects.filter(pk=task.pk).update(heartbeat_at=timezone.now())
+
+
+def claim(pk, worker):
+    """Take a queued task; the conditional UPDATE means only one worker wins"""
+    return BackgroundTask.objects.filter(pk=pk, status='queued').update(
+        status='running', locked_by=worker, heartbeat_at=timezone.now(),
+        attempts=F('attempts') + 1
+    ) == 1
+
+
+def reclaim_stale():
+    """Requeue running tasks whose worker stopped sending heartbeats (crashed or killed)"""
+    timeout = getattr(settings, 'BACKGROUND_TASK_STALE_SECONDS', 300)
+    stale = BackgroundTask.objects.filter(
+        status='running', heartbeat_at__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', error='Worker stopped responding', finished_at=timezone.now()
+    )
+    return failed + stale.update(status='queued', locked_by='')
+
+
+def next_task(worker):
+    """Claim the oldest due task, or return None"""
+    due = BackgroundTask.objects.filter(status='queued', run_after__lte=timezone.now())
+    for pk in due.order_by('run_after', 'pk').values_list('pk', flat=True)[:10]:
+        if claim(pk, worker):
+            return BackgroundTask.objects.get(pk=pk)
+    return None
+
+
+def execute(task):
+    """Run a claimed task, then mark it done, requeued with backoff, or failed"""
+    try:
+        _handler(task.name)(task)
+    except Exception:
+        logger.exception('Background task %s #%s failed', task.name, task.pk)
+        task.error = traceback.format_exc()
+        if task.attempts < task.max_attempts:
+            task.status = 'queued'
+            task.run_after = timezone.now() + timedelta(seconds=30 * task.attempts)
+        else:
+            task.status = 'failed'
+            task.finished_at = timezone.now()
+        task.locked_by = ''
+        task.save(update_fields=['status', 'error', 'run_after', 'locked_by', 'finished_at'])
+        return False
+    task.status = 'done'
+    task.finished_at = timezone.now()
+    task.save(update_fields=['status', 'finished_at'])
+    return True
@@ -1,3 +1,177 @@
-from django.test import TestCase
+import datetime
+import threading
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from inventory.models import Product, Stock, UnitOfMeasure, Warehouse
+from .kpi import build_dashboard_kpis, get_dashboard_kpis
+from .models import Department, DocumentSequence
+from .pagination import KeysetPaginator, decode_cursor, encode_cursor
+from .sequences import _blocks, _seed_value, allocate, next_document_number
 
-# Create your tests here.
+
+class ConcurrentAllocationTest(TransactionTestCase):
+    """Threads allocating from the same sequence must get every number exactly once"""
+
+    THREADS = 8
+    PER_THREAD = 25
+
+    def setUp(self):
+        _blocks.clear()
+
+    def _allocate_concurrently(self, count=1):
+        start = threading.Barrier(self.THREADS)
+        values, errors = [], []
+
+        def worker():
+            try:
+                start.wait()
+                for _ in range(self.PER_THREAD):
+                    values.append(allocate('TEST', count=count, year=2025))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return values
+
+    def test_single_allocations_have_no_gaps_or_duplicates(self):
+        values = self._allocate_concurrently()
+        total = self.THREADS * self.PER_THREAD
+        self.assertEqual(sorted(values), list(range(1, total + 1)))
+        self.assertEqual(DocumentSequence.objects.get(prefix='TEST', year=2025).last_value, total)
+
+    def test_ranges_do_not_overlap(self):
+        firsts = self._allocate_concurrently(count=3)
+        values = sorted(first + offset for first in firsts for offset in range(3))
+        self.assertEqual(values, list(range(1, self.THREADS * self.PER_THREAD * 3 + 1)))
+
+    @override_settings(DOCUMENT_SEQUENCE_BLOCK_SIZE=10)
+    def test_blocks_are_handed_out_once(self):
+        values = self._allocate_concurrently()
+        self.assertEqual(len(set(values)), len(values))
+        self.assertEqual(sorted(values), list(range(1, len(values) + 1)))
+
+
+class SeedTest(TestCase):
+
+    def test_seeds_from_the_highest_numeric_suffix(self):
+        Department.objects.bulk_create(
+            Department(name=code, code=code) for code in ['D-2025-9', 'D-2025-10', 'D-2025-007', 'D-2025-X']
+        )
+        self.assertEqual(_seed_value('D', 2025, 0, (Department, 'code')), 10)
+        self.assertEqual(next_document_number('D', year=2025, seed_from=(Department, 'code')), 'D-2025-00011')
+
+
+class DashboardKPITest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            SKU='BOLT', name='Bolt', product_type='raw', min_stock=10,
+            unit_of_measure=UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        )
+        self.warehouse = Warehouse.objects.create(name='Main', code='MAIN', location='-')
+
+    def test_warm_snapshot_costs_no_queries(self):
+        self.assertEqual(get_dashboard_kpis()['low_stock_items'], 0)
+        with self.assertNumQueries(0):
+            get_dashboard_kpis()
+
+    def test_source_writes_drop_the_snapshot_on_commit(self):
+        get_dashboard_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            stock = Stock.objects.create(product=self.product, warehouse=self.warehouse, quantity=5)
+        self.assertEqual(get_dashboard_kpis()['low_stock_items'], 1)
+
+        # Product counts too: min_stock moves items in and out of low stock
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.min_stock = 1
+            self.product.save()
+        self.assertEqual(get_dashboard_kpis()['low_stock_items'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.min_stock = 10
+            self.product.save()
+        get_dashboard_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.delete()
+        self.assertEqual(get_dashboard_kpis(), build_dashboard_kpis())
+        self.assertEqual(get_dashboard_kpis()['low_stock_items'], 0)
+
+    def test_invalidation_waits_for_the_commit(self):
+        get_dashboard_kpis()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Stock.objects.create(product=self.product, warehouse=self.warehouse, quantity=5)
+            # Not committed yet: the old snapshot is still served
+            self.assertEqual(get_dashboard_kpis()['low_stock_items'], 0)
+        self.assertTrue(callbacks)
+
+    def test_other_models_keep_the_snapshot(self):
+        get_dashboard_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.create(name='Stores', code='ST')
+        with self.assertNumQueries(0):
+            get_dashboard_kpis()
+
+
+class KeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        # Four names shared by 23 rows, so most page boundaries fall inside a tie
+        Department.objects.bulk_create(
+            Department(name=f'Dept {n % 4}', code=f'D{n:02}') for n in range(23)
+        )
+
+    def _walk(self, paginator):
+        """Every page front to back, then back to front through the previous links"""
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(paginator.get_page(backwards[-1].previous_cursor))
+        return [list(page) for page in pages], [list(page) for page in reversed(backwards)]
+
+    def test_cursor_round_trip(self):
+        values = [datetime.datetime(2025, 1, 2, 3, 4, 5, 678901), datetime.date(2025, 1, 2), Decimal('1.50'), 7]
+        self.assertEqual(
+            decode_cursor(encode_cursor('n', values)),
+            ('n', ['2025-01-02T03:04:05.678901', '2025-01-02', '1.50', 7])
+        )
+        self.assertNotIn('=', encode_cursor('p', values))
+
+    def test_mangled_cursors_are_ignored(self):
+        for cursor in ['', None, 'not base64!', encode_cursor('x', [1]), 'W10']:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+        paginator = KeysetPaginator(Department.objects.order_by('name'), 5)
+        first = list(paginator.get_page())
+        # A cursor for another ordering (wrong number of keys) starts over too
+        self.assertEqual(list(paginator.get_page(encode_cursor('n', ['Dept 0']))), first)
+        self.assertEqual(list(paginator.get_page('garbage')), first)
+
+    def test_paging_through_ties(self):
+        for ordering in (['name'], ['-name'], ['name', '-code']):
+            with self.subTest(ordering=ordering):
+                paginator = KeysetPaginator(Department.objects.all(), 5, ordering=ordering)
+                expected = list(Department.objects.order_by(*paginator.keys))
+                forward, backward = self._walk(paginator)
+                self.assertEqual([len(page) for page in forward], [5, 5, 5, 5, 3])
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(backward, forward)
+
+    def test_page_links_keep_the_filters(self):
+        paginator = KeysetPaginator(Department.objects.order_by('name'), 5)
+        page = paginator.get_page(params={'search': 'Dept', 'page': '3'})
+        self.assertFalse(page.has_previous())
+        self.assertEqual(page.next_querystring, f'search=Dept&cursor={page.next_cursor}')
+        self.assertEqual(page.first_querystring, 'search=Dept')
+        self.assertEqual((paginator.count, paginator.count_label), (23, '23'))
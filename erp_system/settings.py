@@ -75,6 +75,56 @@ INSTALLED_APPS = [
 # CELERY_RESULT_SERIALIZER = 'json'
 # CELERY_TIMEZONE = TIME_ZONE
 
+# Cache configuration (swap in Redis so every worker shares one cache)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'erp-default',
+    },
+    # 'default': {
+    #     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    #     'LOCATION': 'redis://127.0.0.1:6379/1',
+    # },
+}
+
+# Seconds the cached dashboard KPI snapshot lives between invalidations
+DASHBOARD_KPI_TIMEOUT = 300
+
+# Seconds the current year's payroll summary lives; closed years are cached until a payroll changes
+PAYROLL_SUMMARY_TIMEOUT = 300
+
+# Seconds a finished report job is handed out again for identical template and parameters
+REPORT_JOB_REUSE_SECONDS = 300
+
+# Backstop lifetime of cached report figures; model writes invalidate them sooner
+REPORT_CACHE_TIMEOUT = 600
+
+# Document numbers each worker reserves at a time (hi/lo). 1 keeps numbers
+# strictly sequential; larger blocks avoid a counter write on most inserts.
+DOCUMENT_SEQUENCE_BLOCK_SIZE = 1
+
+# Background tasks are stored in core.BackgroundTask and run by `manage.py run_worker`.
+# Eager mode runs each task in-process after commit, for development without a worker.
+BACKGROUND_TASKS_EAGER = False
+# A running task whose worker has not sent a heartbeat for this long is requeued
+BACKGROUND_TASK_STALE_SECONDS = 300
+# Seconds between runs of the notification outbox dispatcher task (see notifications.outbox)
+NOTIFICATION_DISPATCH_INTERVAL = 5
+
+# Low stock alerts: 'event' checks each stock change, 'scan' checks all stock every
+# LOW_STOCK_SCAN_INTERVAL seconds instead (see notifications.low_stock)
+LOW_STOCK_ALERT_MODE = 'event'
+LOW_STOCK_SCAN_INTERVAL = 900
+# Percent above min_stock the quantity must recover to before another alert can fire
+LOW_STOCK_HYSTERESIS = 10
+# Seconds after an alert during which a new crossing of the same stock stays silent
+LOW_STOCK_ALERT_COOLDOWN = 86400
+
+# Backstop lifetime of cached unread notification counts; changes drop them sooner
+UNREAD_COUNT_TIMEOUT = 300
+# Seconds between runs of the task correcting drifted unread counters
+UNREAD_RECONCILE_INTERVAL = 3600
+
 # Email configuration for notifications
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -125,6 +175,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # On disk rather than in memory, so tests with concurrent connections
+        # wait on locks the way the real database does
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 05:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'employee'], name='hr_attendan_date_c5d0e5_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from core.models import TimeStampedModel, Department
+from core.sequences import next_document_number
 from django.utils import timezone
 
 class Employee(TimeStampedModel):
@@ -73,12 +74,9 @@ class LeaveApplication(TimeStampedModel):
     
     def save(self, *args, **kwargs):
         if not self.application_number:
-            last_leave = LeaveApplication.objects.all().order_by('id').last()
-            if last_leave:
-                last_number = int(last_leave.application_number.split('-')[-1])
-                self.application_number = f"LEAVE-{timezone.now().year}-{last_number + 1:05d}"
-            else:
-                self.application_number = f"LEAVE-{timezone.now().year}-00001"
+            self.application_number = next_document_number(
+                'LEAVE', seed_from=(LeaveApplication, 'application_number')
+            )
         
         # Calculate total days
         if self.start_date and self.end_date:
@@ -109,6 +107,7 @@ class Attendance(models.Model):
     
     class Meta:
         unique_together = ['employee', 'date']
+        indexes = [models.Index(fields=['date', 'employee'])]  # period-wide aggregates and lists
     
     @property
     def total_hours(self):
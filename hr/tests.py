@@ -1,3 +1,40 @@
+from datetime import date, timedelta
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from core.models import Department
+from .models import Attendance, Employee
 
-# Create your tests here.
+
+class AttendanceListTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='clerk')
+        employee = Employee.objects.create(
+            user=user, employee_id='E1', department=Department.objects.create(name='Stores', code='ST'),
+            designation='Clerk', employee_type='permanent', date_of_joining=date(2020, 1, 1),
+            date_of_birth=date(1990, 1, 1), gender='other', phone='-', address='-'
+        )
+        Attendance.objects.bulk_create(
+            Attendance(employee=employee, date=date(2025, 1, 1) + timedelta(days=n), status='present')
+            for n in range(60)
+        )
+        self.client.force_login(user)
+
+    def test_pages_reach_every_record(self):
+        response = self.client.get(reverse('hr:attendance_list'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 50)
+        self.assertEqual(page[0].date, date(2025, 3, 1))
+        self.assertContains(response, f'href="?{page.next_querystring}"')
+
+        response = self.client.get(reverse('hr:attendance_list'), {'cursor': page.next_cursor})
+        page = response.context['page_obj']
+        self.assertEqual([a.date for a in page], [date(2025, 1, 1) + timedelta(days=n) for n in range(9, -1, -1)])
+        self.assertFalse(page.has_next())
+        self.assertContains(response, 'Previous')
+
+    def test_date_filter(self):
+        response = self.client.get(reverse('hr:attendance_list'), {'date': '2025-01-05'})
+        self.assertEqual([a.date for a in response.context['attendances']], [date(2025, 1, 5)])
+        self.assertFalse(response.context['page_obj'].has_other_pages())
@@ -8,6 +8,7 @@ from django.utils import timezone
 from django.http import HttpResponse
 from .models import Employee, Attendance, LeaveApplication, Shift, LeaveType, EmployeeShift
 from .forms import EmployeeForm, AttendanceForm, LeaveApplicationForm, ShiftForm, LeaveTypeForm, EmployeeShiftForm
+from core.pagination import KeysetPaginationMixin
 
 class EmployeeListView(LoginRequiredMixin, ListView):
     model = Employee
@@ -61,13 +62,15 @@ class EmployeeDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(request, 'Employee deleted successfully!')
         return super().delete(request, *args, **kwargs)
 
-class AttendanceListView(LoginRequiredMixin, ListView):
+class AttendanceListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Attendance
     template_name = 'hr/attendance_list.html'
     context_object_name = 'attendances'
+    paginate_by = 50
+    estimate_count = True
     
     def get_queryset(self):
-        queryset = Attendance.objects.select_related('employee').all()
+        queryset = Attendance.objects.select_related('employee__user').all()
         date = self.request.GET.get('date')
         if date:
             queryset = queryset.filter(date=date)
@@ -66,6 +66,13 @@ class WarehouseForm(forms.ModelForm):
         }
 
 class StockTransactionForm(forms.ModelForm):
+    to_warehouse = forms.ModelChoiceField(
+        queryset=Warehouse.objects.filter(is_active=True),
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+        help_text='Destination warehouse for transfers'
+    )
+    
     class Meta:
         model = StockTransaction
         fields = ['product', 'warehouse', 'transaction_type', 'quantity', 'reference_no', 'remarks']
@@ -82,4 +89,14 @@ class StockTransactionForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Only show active products and warehouses
         self.fields['product'].queryset = Product.objects.filter(is_active=True)
-        self.fields['warehouse'].queryset = Warehouse.objects.filter(is_active=True)
\ No newline at end of file
+        self.fields['warehouse'].queryset = Warehouse.objects.filter(is_active=True)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('transaction_type') == 'TRF':
+            to_warehouse = cleaned_data.get('to_warehouse')
+            if not to_warehouse:
+                self.add_error('to_warehouse', 'Select the destination warehouse for the transfer.')
+            elif to_warehouse == cleaned_data.get('warehouse'):
+                self.add_error('to_warehouse', 'Destination must differ from the source warehouse.')
+        return cleaned_data
\ No newline at end of file
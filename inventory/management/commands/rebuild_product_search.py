@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from inventory.search import index_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index (needed after bulk imports that skip signals)'
+
+    def handle(self, *args, **options):
+        if not index_available():
+            self.stdout.write(self.style.WARNING('Search index not available on this database; nothing to do.'))
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products.'))
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS inventory_product_search "
+            "USING fts5(sku, name, description, tokenize='trigram')"
+        )
+        Product = apps.get_model('inventory', 'Product')
+        cursor.executemany(
+            "INSERT INTO inventory_product_search (rowid, sku, name, description) VALUES (%s, %s, %s, %s)",
+            list(Product.objects.values_list('pk', 'SKU', 'name', 'description'))
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS inventory_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import F
+
+# Ledger rows hold the signed change to the stock; OUT rows were posted
+# with a positive quantity before
+
+
+def sign_out_rows(apps, schema_editor):
+    StockTransaction = apps.get_model('inventory', 'StockTransaction')
+    StockTransaction.objects.filter(transaction_type='OUT', quantity__gt=0).update(quantity=-F('quantity'))
+
+
+def unsign_out_rows(apps, schema_editor):
+    StockTransaction = apps.get_model('inventory', 'StockTransaction')
+    StockTransaction.objects.filter(transaction_type='OUT', quantity__lt=0).update(quantity=-F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_product_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(sign_out_rows, unsign_out_rows),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# ADJ rows were posted with the counted quantity; they now hold the change
+# the count made, like every other ledger row. Each product/warehouse ledger
+# is replayed in posting order from zero: an ADJ row becomes its count minus
+# the sum of the rows before it. Stock on hand before the ledger started is
+# not recorded anywhere, so it ends up inside the first adjustment, which
+# keeps the sum of the rows up to any adjustment equal to its count.
+
+BATCH_SIZE = 500
+
+
+def _replay(apps, convert):
+    StockTransaction = apps.get_model('inventory', 'StockTransaction')
+    rows = StockTransaction.objects.order_by('product_id', 'warehouse_id', 'created_at', 'pk').values_list(
+        'pk', 'product_id', 'warehouse_id', 'transaction_type', 'quantity'
+    )
+    changed = []
+    key, running = None, 0
+    for pk, product_id, warehouse_id, transaction_type, quantity in rows.iterator(chunk_size=2000):
+        if (product_id, warehouse_id) != key:
+            key, running = (product_id, warehouse_id), 0
+        if transaction_type == 'ADJ':
+            quantity, running = convert(quantity, running)
+            changed.append(StockTransaction(pk=pk, quantity=quantity))
+        else:
+            running += quantity
+    StockTransaction.objects.bulk_update(changed, ['quantity'], batch_size=BATCH_SIZE)
+
+
+def counts_to_deltas(apps, schema_editor):
+    _replay(apps, lambda counted, running: (counted - running, counted))
+
+
+def deltas_to_counts(apps, schema_editor):
+    _replay(apps, lambda delta, running: (running + delta, running + delta))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_signed_stock_out_quantities'),
+    ]
+
+    operations = [
+        migrations.RunPython(counts_to_deltas, deltas_to_counts),
+    ]
@@ -46,6 +46,10 @@ class Product(TimeStampedModel):
     max_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     is_active = models.BooleanField(default=True)
     
+    class Meta:
+        # product_list pages newest-first with keyset pagination
+        indexes = [models.Index(fields=['created_at'])]
+    
     def __str__(self):
         return f"{self.SKU} - {self.name}"
 
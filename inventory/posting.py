@@ -0,0 +1,248 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from .models import Stock, StockTransaction
+from .signals import stock_posted
+
+# Rows per SELECT/INSERT batch, keeping every statement under SQLite's
+# 999 query parameter limit
+CHUNK_SIZE = 250
+
+
+def _pk(value):
+    return getattr(value, 'pk', value)
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _insert_stock_rows(keys):
+    """Create empty Stock rows for ``keys``, skipping any a concurrent posting just created"""
+    ops = connection.ops
+    meta = Stock._meta
+    columns = [meta.get_field(name).column for name in (
+        'product', 'warehouse', 'quantity', 'reserved_quantity', 'last_updated'
+    )]
+    zero = ops.adapt_decimalfield_value(Decimal('0'), 12, 3)
+    now = ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(meta.db_table)} '
+            f'({", ".join(map(ops.quote_name, columns))}) VALUES ({", ".join(["%s"] * len(columns))}) '
+            f'{ops.on_conflict_suffix_sql(meta.fields, OnConflict.IGNORE, None, None)}',
+            [(product_id, warehouse_id, zero, zero, now) for product_id, warehouse_id in keys]
+        )
+
+
+def _select_stock_rows(keys):
+    """{(product_id, warehouse_id): stock_id} of the existing rows among ``keys``, locked.
+
+    Rows are looked up per chunk of products, which takes far fewer (and
+    cheaper to build) queries than filtering on product and warehouse
+    pairs; the other warehouses' rows are dropped here.
+    """
+    rows = {}
+    for chunk in _chunks({product_id for product_id, _ in keys}):
+        pairs = Stock.objects.select_for_update().filter(product_id__in=chunk).values_list(
+            'product_id', 'warehouse_id', 'pk'
+        )
+        rows.update({(p, w): pk for p, w, pk in pairs if (p, w) in keys})
+    return rows
+
+
+def _lock_stock_rows(keys):
+    """Return {(product_id, warehouse_id): stock_id}, creating missing Stock rows.
+
+    Rows are fetched with select_for_update so no other posting can change
+    them until this transaction commits.
+    """
+    rows = _select_stock_rows(keys)
+    missing = {key for key in keys if key not in rows}
+    if missing:
+        _insert_stock_rows(missing)
+        rows.update(_select_stock_rows(missing))
+    return rows
+
+
+def _build(movements):
+    """Turn movements into ledger rows plus the quantity changes they make, in order.
+
+    A ledger row is [transaction_type, product_id, warehouse_id, quantity,
+    reference_no, remarks], its quantity being the signed change to the
+    on-hand stock: IN adds, OUT takes away, a transfer takes away at the
+    source and adds at the destination. A change is ((product_id,
+    warehouse_id), 'set' or 'delta', quantity, ledger row).
+    """
+    rows = []
+    changes = []
+    for movement in movements:
+        transaction_type = movement['transaction_type']
+        product_id = _pk(movement['product'])
+        warehouse_id = _pk(movement['warehouse'])
+        quantity = Decimal(str(movement['quantity']))
+        reference_no = movement.get('reference_no', '')
+        remarks = movement.get('remarks', '')
+
+        if quantity < 0 or (quantity == 0 and transaction_type != 'ADJ'):
+            raise ValidationError(f'Invalid quantity {quantity} for {transaction_type} movement.')
+
+        def post(warehouse_id, kind, quantity):
+            row = [transaction_type, product_id, warehouse_id, quantity, reference_no, remarks]
+            rows.append(row)
+            changes.append(((product_id, warehouse_id), kind, quantity, row))
+
+        if transaction_type == 'IN':
+            post(warehouse_id, 'delta', quantity)
+        elif transaction_type == 'OUT':
+            post(warehouse_id, 'delta', -quantity)
+        elif transaction_type == 'ADJ':
+            # Adjustments set the on-hand quantity to the counted figure; the
+            # row's change is filled in by _resolve_adjustments
+            post(warehouse_id, 'set', quantity)
+        elif transaction_type == 'TRF':
+            to_warehouse_id = _pk(movement.get('to_warehouse'))
+            if not to_warehouse_id or to_warehouse_id == warehouse_id:
+                raise ValidationError('Transfers need a destination warehouse different from the source.')
+            post(warehouse_id, 'delta', -quantity)
+            post(to_warehouse_id, 'delta', quantity)
+        else:
+            raise ValidationError(f'Unknown transaction type {transaction_type}.')
+    return rows, changes
+
+
+def _resolve_adjustments(changes, stock_ids):
+    """Replace the counted figure of ADJ rows by the change it makes to the stock"""
+    keys = {key for key, kind, _, _ in changes if kind == 'set'}
+    on_hand = {}
+    for chunk in _chunks(keys):
+        on_hand.update(Stock.objects.filter(pk__in=[stock_ids[key] for key in chunk]).values_list('pk', 'quantity'))
+    running = {key: on_hand[stock_ids[key]] for key in keys}
+    for key, kind, quantity, row in changes:
+        if key not in running:
+            continue
+        if kind == 'set':
+            row[3] = quantity - running[key]
+            running[key] = quantity
+        else:
+            running[key] += quantity
+
+
+def _apply(plan, stock_ids):
+    """Write the folded quantity changes onto the locked Stock rows.
+
+    This is the SQL form of ``quantity = F('quantity') + delta``, run through
+    executemany: building one ORM CASE expression per row costs far more in
+    query compilation than SQLite spends executing the statements.
+    """
+    ops = connection.ops
+    table = ops.quote_name(Stock._meta.db_table)
+    quantity = ops.quote_name(Stock._meta.get_field('quantity').column)
+    last_updated = ops.quote_name(Stock._meta.get_field('last_updated').column)
+    now = ops.adapt_datetimefield_value(timezone.now())
+
+    deltas, absolutes = [], []
+    for key, (target, delta) in plan.items():
+        if target is not None:
+            absolutes.append((ops.adapt_decimalfield_value(target + delta, 12, 3), now, stock_ids[key]))
+        else:
+            deltas.append((ops.adapt_decimalfield_value(delta, 12, 3), now, stock_ids[key]))
+
+    with connection.cursor() as cursor:
+        if deltas:
+            cursor.executemany(
+                f'UPDATE {table} SET {quantity} = {quantity} + %s, {last_updated} = %s WHERE id = %s',
+                deltas
+            )
+        if absolutes:
+            cursor.executemany(
+                f'UPDATE {table} SET {quantity} = %s, {last_updated} = %s WHERE id = %s',
+                absolutes
+            )
+
+
+def _insert_ledger(rows, user):
+    """Insert the StockTransaction rows with executemany, for the same reason as _apply"""
+    ops = connection.ops
+    meta = StockTransaction._meta
+    columns = [meta.get_field(name).column for name in (
+        'transaction_type', 'product', 'warehouse', 'quantity', 'reference_no', 'remarks',
+        'created_by', 'updated_by', 'created_at', 'updated_at',
+    )]
+    now = ops.adapt_datetimefield_value(timezone.now())
+    user_id = _pk(user)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {ops.quote_name(meta.db_table)} ({", ".join(map(ops.quote_name, columns))}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})',
+            [
+                (transaction_type, product_id, warehouse_id, ops.adapt_decimalfield_value(quantity, 12, 3),
+                 reference_no, remarks, user_id, user_id, now, now)
+                for transaction_type, product_id, warehouse_id, quantity, reference_no, remarks in rows
+            ]
+        )
+
+
+@transaction.atomic
+def post_movements(movements, user=None, allow_negative=False):
+    """Post a batch of stock movements and keep Stock in step with StockTransaction.
+
+    ``movements`` is an iterable of dicts with ``transaction_type`` (IN, OUT,
+    ADJ or TRF), ``product``, ``warehouse``, ``quantity`` and optionally
+    ``to_warehouse`` (for TRF), ``reference_no`` and ``remarks``. Products
+    and warehouses may be given as instances or ids.
+
+    Movements are applied in order. Every ledger row holds the signed change
+    it made to the stock (an ADJ row the difference to the counted figure),
+    so a warehouse's rows add up to its on-hand quantity. The whole batch is
+    written with two executemany statements plus a few lookups, and either
+    posts completely or not at all. Returns the number of ledger rows.
+    Raises ValidationError if a movement is invalid or, unless
+    ``allow_negative`` is set, if any stock would go below zero.
+    """
+    rows, changes = _build(movements)
+    if not rows:
+        return 0
+
+    # Fold every change into one final expression per stock row: either a
+    # delta on the current quantity, or (after an ADJ) an absolute value.
+    plan = {}
+    for key, kind, quantity, _ in changes:
+        target, delta = plan.get(key, (None, Decimal('0')))
+        if kind == 'set':
+            plan[key] = (quantity, Decimal('0'))
+        else:
+            plan[key] = (target, delta + quantity)
+
+    stock_ids = _lock_stock_rows(set(plan))
+    _resolve_adjustments(changes, stock_ids)
+    _apply(plan, stock_ids)
+
+    if not allow_negative:
+        for chunk in _chunks(stock_ids.values()):
+            short = Stock.objects.filter(pk__in=chunk, quantity__lt=0).select_related('product', 'warehouse').first()
+            if short:
+                raise ValidationError(
+                    f'Insufficient stock for {short.product.SKU} in {short.warehouse.name}.'
+                )
+
+    _insert_ledger(rows, user)
+
+    # Raw writes bypass post_save, so refresh the dashboard once per batch
+    # and tell listeners (low stock alerts) which rows changed
+    from core.kpi import invalidate_dashboard_kpis
+    transaction.on_commit(invalidate_dashboard_kpis)
+    stock_posted.send(sender=Stock, stock_ids=list(stock_ids.values()))
+    return len(rows)
+
+
+def post_movement(transaction_type, product, warehouse, quantity, user=None, **extra):
+    """Post a single movement; see post_movements"""
+    allow_negative = extra.pop('allow_negative', False)
+    movement = dict(extra, transaction_type=transaction_type, product=product,
+                    warehouse=warehouse, quantity=quantity)
+    return post_movements([movement], user=user, allow_negative=allow_negative)
@@ -0,0 +1,172 @@
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import Product
+
+# SQLite FTS5 table mirroring Product.SKU/name/description, keyed by product id.
+# The trigram tokenizer indexes every 3-character slice, so substring and
+# prefix lookups are index probes instead of LIKE '%x%' scans.
+SEARCH_TABLE = 'inventory_product_search'
+
+_available = None
+
+
+def index_available():
+    """True when the FTS5 table exists (SQLite builds with FTS5 only)"""
+    global _available
+    if _available is None:
+        _available = (
+            connection.vendor == 'sqlite'
+            and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _available
+
+
+def _phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _match_query(search):
+    """Every word must appear somewhere, as a substring, in SKU, name or description"""
+    return ' '.join(_phrase(term) for term in search.split())
+
+
+def _fuzzy_query(search):
+    """Any trigram of the search text; bm25 ranks the closest products first"""
+    text = ' '.join(search.lower().split())
+    trigrams = {text[i:i + 3] for i in range(len(text) - 2)}
+    return ' OR '.join(_phrase(t) for t in sorted(trigrams) if t.strip())
+
+
+def _matching_ids(match, limit=None, ranked=True, within=None):
+    sql = f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+    params = [match]
+    if within is not None:
+        # Apply the caller's filters before the LIMIT, not after it
+        within_sql, within_params = within.order_by().values('pk').query.sql_with_params()
+        sql += f" AND rowid IN ({within_sql})"
+        params += within_params
+    if limit:
+        if ranked:
+            sql += " ORDER BY rank"
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params
+
+
+def filter_products(queryset, search, prefix=''):
+    """Narrow ``queryset`` to products matching ``search``.
+
+    ``prefix`` is the lookup path from the queryset's model to Product, e.g.
+    'product__' when filtering Stock. The match runs as a subquery against
+    the search index, so the caller's ordering and pagination still apply.
+    """
+    search = (search or '').strip()
+    if not search:
+        return queryset
+
+    # Words shorter than a trigram can't use the index
+    if index_available() and all(len(term) >= 3 for term in search.split()):
+        sql, params = _matching_ids(_match_query(search))
+        return queryset.filter(**{f'{prefix}pk__in': RawSQL(sql, params)})
+
+    condition = Q()
+    for term in search.split():
+        condition &= (
+            Q(**{f'{prefix}SKU__icontains': term}) |
+            Q(**{f'{prefix}name__icontains': term}) |
+            Q(**{f'{prefix}description__icontains': term})
+        )
+    return queryset.filter(condition)
+
+
+def search_products(search, limit=20, fuzzy=True, queryset=None):
+    """Best matching products for pickers, most relevant first.
+
+    Substring matches come first. When nothing matches and ``fuzzy`` is set,
+    falls back to trigram similarity so typos like 'stel bolt' still find
+    'Steel Bolt'.
+    """
+    queryset = queryset if queryset is not None else Product.objects.all()
+    search = (search or '').strip()
+    if not search:
+        return []
+
+    if not index_available():
+        return list(filter_products(queryset, search).order_by('name')[:limit])
+
+    # A filtered queryset (active products, a product type, ...) restricts
+    # the index lookups themselves, so the limit counts only products the
+    # caller can use
+    within = queryset if queryset.query.has_filters() else None
+    ids = []
+    if all(len(term) >= 3 for term in search.split()):
+        # SKU hits first, then anything else. Plain substring hits are not
+        # ranked: bm25 over a common term would score every matching row.
+        ids = _fetch_ids('{sku} : (' + _match_query(search) + ')', limit, ranked=False, within=within)
+        if len(ids) < limit:
+            seen = set(ids)
+            more = _fetch_ids(_match_query(search), limit + len(ids), ranked=False, within=within)
+            ids += [pk for pk in more if pk not in seen][:limit - len(ids)]
+    if not ids and fuzzy and len(search) >= 3:
+        ids = _fetch_ids(_fuzzy_query(search), limit, within=within)
+    if not ids:
+        return list(filter_products(queryset, search).order_by('name')[:limit])
+
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def _fetch_ids(match, limit, ranked=True, within=None):
+    """Product ids for an FTS5 match expression, best ranked first when ``ranked``"""
+    sql, params = _matching_ids(match, limit, ranked, within)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def index_product(product):
+    """Insert or refresh one product in the search index"""
+    if not index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product.pk])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, sku, name, description) VALUES (%s, %s, %s, %s)",
+            [product.pk, product.SKU, product.name, product.description]
+        )
+
+
+def unindex_product(product_id):
+    if not index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rebuild_index(batch_size=5000):
+    """Repopulate the whole index, e.g. after bulk imports that skip signals"""
+    if not index_available():
+        return 0
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        rows = Product.objects.values_list('pk', 'SKU', 'name', 'description').order_by('pk')
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(
+                    f"INSERT INTO {SEARCH_TABLE} (rowid, sku, name, description) VALUES (%s, %s, %s, %s)",
+                    batch
+                )
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, sku, name, description) VALUES (%s, %s, %s, %s)",
+                batch
+            )
+            count += len(batch)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return count
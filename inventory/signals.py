@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from .models import Product
+from .search import index_product, unindex_product
+
+# Sent by posting.post_movements, inside its transaction, with the ids of
+# every Stock row it changed. Postings write with raw UPDATEs, so Stock's
+# post_save never fires for them.
+stock_posted = Signal()
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, **kwargs):
+    index_product(instance)
+
+@receiver(post_delete, sender=Product)
+def remove_product_search_index(sender, instance, **kwargs):
+    unindex_product(instance.pk)
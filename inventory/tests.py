@@ -1,3 +1,224 @@
+from decimal import Decimal
+from importlib import import_module
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from production.forms import BOMLineForm
+from production.models import BOMLine
+from .models import Product, Stock, StockTransaction, UnitOfMeasure, Warehouse
+from .posting import CHUNK_SIZE, post_movement, post_movements
+from .search import _fetch_ids, _match_query, filter_products, index_available, search_products
 
-# Create your tests here.
+adjustment_deltas = import_module('inventory.migrations.0005_adjustment_quantity_deltas')
+
+
+class InventoryTestCase(TestCase):
+
+    def setUp(self):
+        self.uom = UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        self.product = self.make_product('BOLT')
+        self.main = Warehouse.objects.create(name='Main', code='MAIN', location='-')
+        self.spare = Warehouse.objects.create(name='Spare', code='SPARE', location='-')
+
+    def make_product(self, sku, name='', **fields):
+        return Product.objects.create(
+            SKU=sku, name=name or sku.title(), product_type='raw', unit_of_measure=self.uom, **fields
+        )
+
+    def on_hand(self, warehouse, product=None):
+        stock = Stock.objects.filter(product=product or self.product, warehouse=warehouse).first()
+        return stock.quantity if stock else None
+
+    def ledger(self, warehouse, product=None):
+        """Sum of the ledger rows of one stock, which must match its on-hand quantity"""
+        return StockTransaction.objects.filter(
+            product=product or self.product, warehouse=warehouse
+        ).aggregate(total=Sum('quantity'))['total']
+
+
+class PostingTest(InventoryTestCase):
+
+    def test_rows_hold_signed_changes(self):
+        post_movement('IN', self.product, self.main, 10)
+        post_movement('OUT', self.product, self.main, 4)
+        post_movement('TRF', self.product, self.main, 2, to_warehouse=self.spare)
+        post_movement('ADJ', self.product, self.main, 3)
+
+        quantities = list(StockTransaction.objects.order_by('pk').values_list('transaction_type', 'quantity'))
+        self.assertEqual(quantities, [
+            ('IN', Decimal('10')), ('OUT', Decimal('-4')),
+            ('TRF', Decimal('-2')), ('TRF', Decimal('2')), ('ADJ', Decimal('-1')),
+        ])
+        self.assertEqual((self.on_hand(self.main), self.on_hand(self.spare)), (Decimal('3'), Decimal('2')))
+        for warehouse in (self.main, self.spare):
+            self.assertEqual(self.ledger(warehouse), self.on_hand(warehouse))
+
+    def test_batch_applies_in_order(self):
+        count = post_movements([
+            {'transaction_type': 'IN', 'product': self.product.pk, 'warehouse': self.main.pk, 'quantity': 5},
+            {'transaction_type': 'ADJ', 'product': self.product, 'warehouse': self.main, 'quantity': 8},
+            {'transaction_type': 'OUT', 'product': self.product, 'warehouse': self.main, 'quantity': 6},
+        ])
+        self.assertEqual(count, 3)
+        self.assertEqual(self.on_hand(self.main), Decimal('2'))
+        self.assertEqual(
+            list(StockTransaction.objects.order_by('pk').values_list('quantity', flat=True)),
+            [Decimal('5'), Decimal('3'), Decimal('-6')]
+        )
+        self.assertEqual(post_movements([]), 0)
+
+    def test_negative_stock_rolls_the_batch_back(self):
+        post_movement('IN', self.product, self.main, 5)
+        with self.assertRaisesMessage(ValidationError, 'Insufficient stock for BOLT in Main'):
+            post_movements([
+                {'transaction_type': 'IN', 'product': self.product, 'warehouse': self.spare, 'quantity': 1},
+                {'transaction_type': 'OUT', 'product': self.product, 'warehouse': self.main, 'quantity': 6},
+            ])
+        self.assertEqual(self.on_hand(self.main), Decimal('5'))
+        self.assertEqual(self.on_hand(self.spare), None)
+        self.assertEqual(StockTransaction.objects.count(), 1)
+
+        post_movement('OUT', self.product, self.main, 6, allow_negative=True)
+        self.assertEqual(self.on_hand(self.main), Decimal('-1'))
+
+    def test_invalid_movements_are_rejected(self):
+        for args, extra in [
+            (('IN', self.product, self.main, -1), {}),
+            (('OUT', self.product, self.main, 0), {}),
+            (('TRF', self.product, self.main, 1), {}),
+            (('TRF', self.product, self.main, 1), {'to_warehouse': self.main}),
+            (('XX', self.product, self.main, 1), {}),
+        ]:
+            with self.subTest(args=args, extra=extra), self.assertRaises(ValidationError):
+                post_movement(*args, **extra)
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_batches_larger_than_a_chunk(self):
+        products = Product.objects.bulk_create([
+            Product(SKU=f'P{n}', name=f'Part {n}', product_type='raw', unit_of_measure=self.uom)
+            for n in range(CHUNK_SIZE + 10)
+        ])
+        # Some rows exist before the batch, the rest are created by it
+        post_movements([
+            {'transaction_type': 'IN', 'product': product, 'warehouse': self.main, 'quantity': 1}
+            for product in products[::3]
+        ])
+        movements = [
+            {'transaction_type': 'IN', 'product': product, 'warehouse': warehouse, 'quantity': 2}
+            for product in products for warehouse in (self.main, self.spare)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(post_movements(movements), len(movements))
+        # A few lookups per chunk of products, not statements per movement
+        self.assertLess(len(queries), 20)
+        self.assertEqual(Stock.objects.count(), 2 * len(products))
+        self.assertEqual(Stock.objects.filter(warehouse=self.spare, quantity=2).count(), len(products))
+        self.assertEqual(
+            Stock.objects.filter(warehouse=self.main).aggregate(total=Sum('quantity'))['total'],
+            StockTransaction.objects.filter(warehouse=self.main).aggregate(total=Sum('quantity'))['total']
+        )
+
+
+class AdjustmentMigrationTest(InventoryTestCase):
+
+    def test_counted_adjustments_become_deltas_and_back(self):
+        StockTransaction.objects.bulk_create([
+            StockTransaction(transaction_type=transaction_type, product=self.product, warehouse=self.main,
+                             quantity=quantity)
+            for transaction_type, quantity in [('IN', 10), ('OUT', -4), ('ADJ', 5), ('IN', 1), ('ADJ', 2)]
+        ] + [StockTransaction(transaction_type='ADJ', product=self.product, warehouse=self.spare, quantity=7)])
+
+        adjustment_deltas.counts_to_deltas(apps, None)
+        self.assertEqual(
+            list(StockTransaction.objects.filter(transaction_type='ADJ').order_by('pk').values_list('quantity', flat=True)),
+            [Decimal('-1'), Decimal('-4'), Decimal('7')]
+        )
+        self.assertEqual(self.ledger(self.main), Decimal('2'))
+
+        adjustment_deltas.deltas_to_counts(apps, None)
+        self.assertEqual(
+            list(StockTransaction.objects.filter(transaction_type='ADJ').order_by('pk').values_list('quantity', flat=True)),
+            [Decimal('5'), Decimal('2'), Decimal('7')]
+        )
+
+
+class SearchTest(InventoryTestCase):
+
+    def setUp(self):
+        if not index_available():
+            self.skipTest('SQLite without FTS5')
+        super().setUp()
+        self.bolt = self.make_product('BLT-00123', 'Steel Bolt', description='M8 hex head')
+
+    def indexed(self, search):
+        """Ids the FTS5 index itself returns, without the LIKE fallback"""
+        return _fetch_ids(_match_query(search), 10, ranked=False)
+
+    def test_index_follows_save_and_delete(self):
+        self.assertEqual(self.indexed('Steel'), [self.bolt.pk])
+        self.bolt.name = 'Brass Bolt'
+        self.bolt.save()
+        self.assertEqual(self.indexed('Steel'), [])
+        self.assertEqual(search_products('Brass', fuzzy=False), [self.bolt])
+        pk = self.bolt.pk
+        self.bolt.delete()
+        self.assertEqual(self.indexed('Brass'), [])
+        self.assertNotIn(pk, self.indexed('Bolt'))
+
+    def test_substring_and_partial_sku_matches(self):
+        washer = self.make_product('W-1', 'Washer for 00123 bolts')
+        # SKU hits come before name or description hits
+        self.assertEqual(search_products('0012'), [self.bolt, washer])
+        self.assertEqual(search_products('hex hea'), [self.bolt])
+        self.assertEqual(list(filter_products(Product.objects.order_by('pk'), '00123')), [self.bolt, washer])
+
+    def test_fuzzy_fallback_finds_typos(self):
+        self.make_product('NUT-1', 'Nylon Nut')
+        self.assertEqual(search_products('stel bolt')[0], self.bolt)
+        self.assertEqual(search_products('stel bolt', fuzzy=False), [])
+
+    def test_filters_apply_before_the_limit(self):
+        Product.objects.bulk_create([
+            Product(SKU=f'OLD-{n}', name=f'Old Steel Bolt {n}', product_type='raw', unit_of_measure=self.uom,
+                    is_active=False)
+            for n in range(30)
+        ])
+        # bulk_create skips the signals that keep the index in step
+        from .search import rebuild_index
+        rebuild_index()
+        self.assertEqual(search_products('steel', limit=5, queryset=Product.objects.filter(is_active=True)),
+                         [self.bolt])
+        self.assertEqual(len(search_products('steel', limit=5)), 5)
+
+    def test_stock_search_goes_through_the_product(self):
+        post_movement('IN', self.bolt, self.main, 1)
+        post_movement('IN', self.product, self.main, 1)
+        stocks = filter_products(Stock.objects.all(), 'steel', prefix='product__')
+        self.assertEqual([stock.product for stock in stocks], [self.bolt])
+
+    def test_picker_api(self):
+        self.make_product('BLT-9', 'Old Steel Bolt', is_active=False)
+        self.client.force_login(User.objects.create(username='buyer'))
+        response = self.client.get(reverse('inventory:product_search'), {'q': 'steel'})
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.bolt.pk, 'sku': 'BLT-00123', 'name': 'Steel Bolt', 'text': str(self.bolt), 'uom': 'pc'}]
+        )
+        response = self.client.get(reverse('inventory:product_search'), {'q': 'steel', 'active': 'false'})
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+class ProductPickerWidgetTest(InventoryTestCase):
+
+    def test_renders_only_the_selected_product(self):
+        self.make_product('NUT-1', 'Nylon Nut')
+        html = str(BOMLineForm(instance=BOMLine(component=self.product))['component'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn(f'value="{self.product.pk}" selected', html)
+        self.assertIn('data-search-url="%s"' % reverse('inventory:product_search'), html)
+        self.assertIn('product-picker-search', html)
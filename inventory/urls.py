@@ -10,6 +10,7 @@ urlpatterns = [
     path('products/<int:pk>/', views.product_detail, name='product_detail'),
     path('products/<int:pk>/update/', views.product_update, name='product_update'),
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
+    path('products/search/', views.product_search_api, name='product_search'),
     
     # Stock URLs
     path('stock/', views.stock_list, name='stock_list'),
@@ -1,10 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
-from .models import Product, Category, UnitOfMeasure, Warehouse, Stock
-from .forms import ProductForm
+from django.core.exceptions import ValidationError
+from .models import Product, Category, UnitOfMeasure, Warehouse, Stock, StockTransaction
+from .forms import ProductForm, StockTransactionForm
+from .posting import post_movement
+from .search import filter_products, search_products
+from core.pagination import KeysetPaginator
 from django.db.models import Sum
 
 # Dashboard and main pages
@@ -25,11 +29,7 @@ def product_list(request):
     active = request.GET.get('active')
     
     if search:
-        products = products.filter(
-            Q(SKU__icontains=search) |
-            Q(name__icontains=search) |
-            Q(description__icontains=search)
-        )
+        products = filter_products(products, search)
     
     if category:
         products = products.filter(category_id=category)
@@ -45,10 +45,9 @@ def product_list(request):
     # Order by created date (newest first)
     products = products.order_by('-created_at')
     
-    # Pagination
-    paginator = Paginator(products, 25)  # Show 25 products per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: 25 products per page, no COUNT(*) or OFFSET scan
+    paginator = KeysetPaginator(products, 25)
+    page_obj = paginator.get_page(request.GET.get('cursor'), params=request.GET)
     
     # Get categories for filter dropdown
     categories = Category.objects.all()
@@ -143,10 +142,7 @@ def stock_list(request):
     # Filter by product search
     search = request.GET.get('search')
     if search:
-        stocks = stocks.filter(
-            Q(product__SKU__icontains=search) |
-            Q(product__name__icontains=search)
-        )
+        stocks = filter_products(stocks, search, prefix='product__')
     
     # Filter by warehouse
     warehouse = request.GET.get('warehouse')
@@ -156,10 +152,9 @@ def stock_list(request):
     # Order by product name
     stocks = stocks.order_by('product__name')
     
-    # Pagination
-    paginator = Paginator(stocks, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination
+    paginator = KeysetPaginator(stocks, 25)
+    page_obj = paginator.get_page(request.GET.get('cursor'), params=request.GET)
     
     # Get warehouses for filter dropdown
     warehouses = Warehouse.objects.all()
@@ -175,17 +170,64 @@ def stock_list(request):
 
 @login_required
 def stock_transaction(request):
-    # This would handle stock in/out transactions
-    # For now, just show a basic page
-    products = Product.objects.filter(is_active=True)
-    warehouses = Warehouse.objects.filter(is_active=True)
+    """Post a single stock movement through the posting engine"""
+    if request.method == 'POST':
+        form = StockTransactionForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            try:
+                post_movement(
+                    data['transaction_type'], data['product'], data['warehouse'], data['quantity'],
+                    user=request.user,
+                    to_warehouse=data.get('to_warehouse'),
+                    reference_no=data.get('reference_no', ''),
+                    remarks=data.get('remarks', '')
+                )
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                messages.success(request, 'Stock transaction posted successfully!')
+                return redirect('inventory:stock_transaction')
+    else:
+        form = StockTransactionForm()
+    
+    recent_transactions = StockTransaction.objects.select_related('product').order_by('-created_at')[:10]
     
     context = {
-        'products': products,
-        'warehouses': warehouses
+        'form': form,
+        'recent_transactions': recent_transactions,
     }
     return render(request, 'inventory/stock_transaction.html', context)
 
+@login_required
+def product_search_api(request):
+    """Product lookup for item pickers (BOM lines, PO items, gate pass items)"""
+    products = Product.objects.select_related('unit_of_measure')
+    if request.GET.get('active', 'true') == 'true':
+        products = products.filter(is_active=True)
+    product_type = request.GET.get('type')
+    if product_type:
+        products = products.filter(product_type=product_type)
+    
+    try:
+        limit = min(int(request.GET.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    
+    results = search_products(request.GET.get('q'), limit=limit, queryset=products)
+    return JsonResponse({
+        'results': [
+            {
+                'id': product.pk,
+                'sku': product.SKU,
+                'name': product.name,
+                'text': str(product),
+                'uom': product.unit_of_measure.symbol,
+            }
+            for product in results
+        ]
+    })
+
 # Category management views
 @login_required
 def category_list(request):
@@ -0,0 +1,37 @@
+from django import forms
+from django.urls import reverse_lazy
+from django.utils.safestring import mark_safe
+
+from .models import Product
+
+
+class ProductPickerWidget(forms.Select):
+    """Product select for item pickers (BOM lines, PO items, gate pass items).
+
+    Only the selected product is rendered as an option; the search box in
+    front of the select fills in matches from ``inventory:product_search`` as
+    the user types (see templates/includes/product_picker.html), so the page
+    does not carry every product in the catalogue.
+    """
+
+    def __init__(self, attrs=None, product_type=''):
+        attrs = {'class': 'form-control product-picker', **(attrs or {})}
+        attrs['data-search-url'] = reverse_lazy('inventory:product_search')
+        if product_type:
+            attrs['data-product-type'] = product_type
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if str(v).isdigit()]
+        products = Product.objects.filter(pk__in=selected) if selected else []
+        options = [self.create_option(name, '', '---------', not selected, 0)]
+        for index, product in enumerate(products, start=1):
+            options.append(self.create_option(name, str(product.pk), str(product), True, index))
+        return [(None, options, 0)]
+
+    def render(self, name, value, attrs=None, renderer=None):
+        search = mark_safe(
+            '<input type="search" class="form-control form-control-sm mb-1 product-picker-search" '
+            'placeholder="Search SKU or name..." autocomplete="off">'
+        )
+        return search + super().render(name, value, attrs, renderer)
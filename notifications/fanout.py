@@ -0,0 +1,86 @@
+from django.db.models import QuerySet
+from .models import Notification, NotificationPreference
+from .unread import added
+
+# Ids per preference lookup, keeping every statement under SQLite's
+# 999 query parameter limit
+CHUNK_SIZE = 500
+BATCH_SIZE = 1000
+
+
+def required_preferences(title, notification_type):
+    """Preference flags a user must have on to receive this notification"""
+    required = []
+    if notification_type == 'warning':
+        required.append('low_stock_alerts')
+    if 'quality' in title.lower():
+        required.append('quality_alerts')
+    if 'production' in title.lower():
+        required.append('production_alerts')
+    return required
+
+
+def recipient_ids(users):
+    """Distinct user ids of ``users``: a User queryset (one query), or User objects or ids"""
+    if isinstance(users, QuerySet):
+        return list(users.order_by().values_list('pk', flat=True).distinct())
+    return list(dict.fromkeys(getattr(user, 'pk', user) for user in users))
+
+
+def load_preferences(user_ids, fields):
+    """{user id: (flag, ...)} for ``fields``, creating default preferences for users without any.
+
+    One query per CHUNK_SIZE users to read them, and one bulk insert for
+    the missing ones.
+    """
+    preferences = {}
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        for user_id, *flags in NotificationPreference.objects.filter(
+            user_id__in=user_ids[start:start + CHUNK_SIZE]
+        ).values_list('user_id', *fields):
+            preferences[user_id] = tuple(flags)
+
+    missing = [user_id for user_id in user_ids if user_id not in preferences]
+    if missing:
+        # A concurrent first notification may create some of them too
+        NotificationPreference.objects.bulk_create(
+            [NotificationPreference(user_id=user_id) for user_id in missing],
+            batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        defaults = tuple(NotificationPreference._meta.get_field(field).default for field in fields)
+        preferences.update((user_id, defaults) for user_id in missing)
+    return preferences
+
+
+def eligible_recipients(users, title, notification_type='info'):
+    """Ids of ``users`` who have not opted out of this kind of notification.
+
+    Recipients are resolved with one query. When the kind can be opted
+    out of, their preferences are read (or created) in bulk and filtered
+    in memory.
+    """
+    user_ids = recipient_ids(users)
+    fields = required_preferences(title, notification_type)
+    if user_ids and fields:
+        preferences = load_preferences(user_ids, fields)
+        user_ids = [user_id for user_id in user_ids if all(preferences[user_id])]
+    return user_ids
+
+
+def fan_out(users, title, message, notification_type='info', related_model=None, related_id=None,
+            priority=1):
+    """Create one notification per recipient who has not opted out of this kind.
+
+    All notifications go in with a single bulk_create, so the cost no
+    longer grows by two or three queries per recipient; the unread
+    counters follow with one UPDATE. Returns the created notifications.
+    """
+    notifications = Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id, title=title, message=message, notification_type=notification_type,
+            related_model=related_model or '', related_id=related_id, priority=priority,
+        )
+        for user_id in eligible_recipients(users, title, notification_type)
+    ], batch_size=BATCH_SIZE)
+    added(notifications)
+    return notifications
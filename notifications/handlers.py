@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from production.models import ProductionOrder
+from inventory.models import Stock
+from quality.models import QualityCheck
+from procurement.models import PurchaseOrder
+from .fanout import CHUNK_SIZE
+from .low_stock import evaluate
+from .outbox import handles
+from .signals import get_related_users, notify_users
+
+# Dispatcher side of the outbox events written in signals.py. Objects are
+# read back when the event is handled; one deleted in the meantime needs
+# no notification.
+
+
+@handles('production.created')
+def production_created(event):
+    order = ProductionOrder.objects.select_related('product').filter(pk=event.object_id).first()
+    if order is None:
+        return
+    notify_users(
+        users=User.objects.filter(groups__name='Production Managers'),
+        title="New Production Order Created",
+        message=f"Production order {order.order_number} has been created for {order.product.name}.",
+        notification_type='info',
+        related_model='production.ProductionOrder',
+        related_id=order.id
+    )
+
+
+@handles('production.status_changed')
+def production_status_changed(event):
+    order = ProductionOrder.objects.filter(pk=event.object_id).first()
+    if order is None:
+        return
+    # The status at the time of the change, not whatever it is by now
+    status = dict(ProductionOrder.ORDER_STATUS).get(event.payload['status'], event.payload['status'])
+    notify_users(
+        users=get_related_users(order, event.event),
+        title="Production Order Status Changed",
+        message=f"Order {order.order_number} is now {status}.",
+        notification_type='info',
+        related_model='production.ProductionOrder',
+        related_id=order.id
+    )
+
+
+@handles('stock.changed')
+def stock_changed(event):
+    # Alerts only on threshold crossings, see low_stock.py
+    evaluate(Stock.objects.filter(pk=event.object_id))
+
+
+@handles('stock.posted')
+def stock_posted(event):
+    ids = event.payload['ids']
+    for start in range(0, len(ids), CHUNK_SIZE):
+        evaluate(Stock.objects.filter(pk__in=ids[start:start + CHUNK_SIZE]))
+
+
+@handles('quality.failed')
+def quality_failed(event):
+    check = QualityCheck.objects.filter(pk=event.object_id).first()
+    if check is None:
+        return
+    notify_users(
+        users=User.objects.filter(groups__name='Quality Managers'),
+        title="Quality Check Failed",
+        message=f"Quality check {check.qc_number} has failed. Please review.",
+        notification_type='error',
+        related_model='quality.QualityCheck',
+        related_id=check.id
+    )
+
+
+@handles('quality.passed')
+def quality_passed(event):
+    check = QualityCheck.objects.filter(pk=event.object_id).first()
+    if check is None:
+        return
+    notify_users(
+        users=get_related_users(check, event.event),
+        title="Quality Check Passed",
+        message=f"Quality check {check.qc_number} has passed successfully.",
+        notification_type='success',
+        related_model='quality.QualityCheck',
+        related_id=check.id
+    )
+
+
+@handles('purchase.created')
+def purchase_created(event):
+    order = PurchaseOrder.objects.select_related('supplier').filter(pk=event.object_id).first()
+    if order is None:
+        return
+    notify_users(
+        users=User.objects.filter(groups__name='Procurement Managers'),
+        title="New Purchase Order",
+        message=f"Purchase order {order.po_number} has been created for {order.supplier.name}.",
+        notification_type='info',
+        related_model='procurement.PurchaseOrder',
+        related_id=order.id
+    )
+
+
+@handles('purchase.delivery_due')
+def purchase_delivery_due(event):
+    order = PurchaseOrder.objects.filter(pk=event.object_id).first()
+    if order is None:
+        return
+    notify_users(
+        users=get_related_users(order, event.event),
+        title="Delivery Due Today",
+        message=f"Purchase order {order.po_number} is due for delivery today.",
+        notification_type='reminder',
+        related_model='procurement.PurchaseOrder',
+        related_id=order.id
+    )
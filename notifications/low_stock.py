@@ -0,0 +1,111 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import BooleanField, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .fanout import BATCH_SIZE, eligible_recipients
+from .models import Notification, StockAlertState
+from .unread import added
+
+SCAN_TASK = 'notifications.scan_low_stock'
+TITLE = 'Low Stock Alert'
+
+# A product/warehouse is either armed (ok) or low. Dropping below
+# min_stock while armed is a crossing: it becomes low and, unless it was
+# alerted within the cooldown, one alert goes out. It only re-arms once
+# the quantity is back LOW_STOCK_HYSTERESIS percent above min_stock, so
+# stock hovering around the threshold cannot alert over and over.
+
+
+def _settings():
+    hysteresis = Decimal(str(getattr(settings, 'LOW_STOCK_HYSTERESIS', 10)))
+    cooldown = timedelta(seconds=getattr(settings, 'LOW_STOCK_ALERT_COOLDOWN', 86400))
+    return 1 + hysteresis / 100, cooldown
+
+
+def transitions(stocks):
+    """Rows of ``stocks`` whose alert state has to change, found with one query.
+
+    Each row carries the stock figures and its current alert state, so the
+    caller needs nothing else. Stock that stays on the same side of its
+    thresholds is filtered out by the database.
+    """
+    rearm, _ = _settings()
+    state = StockAlertState.objects.filter(product=OuterRef('product'), warehouse=OuterRef('warehouse'))
+    return stocks.annotate(
+        state_id=Subquery(state.values('pk')[:1]),
+        alert_low=Coalesce(Subquery(state.values('is_low')[:1]), Value(False), output_field=BooleanField()),
+        last_alerted_at=Subquery(state.values('last_alerted_at')[:1]),
+    ).filter(
+        Q(alert_low=False, product__min_stock__gt=0, quantity__lt=F('product__min_stock'))
+        | Q(alert_low=True) & (Q(product__min_stock__lte=0) | Q(quantity__gte=F('product__min_stock') * rearm))
+    ).values(
+        'pk', 'product_id', 'warehouse_id', 'quantity', 'product__min_stock', 'product__SKU',
+        'warehouse__name', 'state_id', 'alert_low', 'last_alerted_at',
+    ).order_by()
+
+
+def evaluate(stocks):
+    """Apply the alert state changes of ``stocks`` (a Stock queryset); returns the alerts sent.
+
+    State rows are written with one bulk update and one bulk insert, and
+    the alerts of all crossings go to the Inventory Managers with a
+    single bulk_create.
+    """
+    _, cooldown = _settings()
+    now = timezone.now()
+    changed, created, alerts = [], [], []
+    for row in transitions(stocks):
+        state = StockAlertState(
+            pk=row['state_id'], product_id=row['product_id'], warehouse_id=row['warehouse_id'],
+            is_low=not row['alert_low'], last_alerted_at=row['last_alerted_at'], updated_at=now,
+        )
+        if state.is_low and (state.last_alerted_at is None or now - state.last_alerted_at >= cooldown):
+            state.last_alerted_at = now
+            alerts.append(row)
+        (changed if state.pk else created).append(state)
+
+    if changed:
+        StockAlertState.objects.bulk_update(changed, ['is_low', 'last_alerted_at', 'updated_at'])
+    if created:
+        # A concurrent evaluation may have created some already; its state wins
+        StockAlertState.objects.bulk_create(created, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    if alerts:
+        _notify(alerts)
+    return len(alerts)
+
+
+def _notify(alerts):
+    recipients = eligible_recipients(User.objects.filter(groups__name='Inventory Managers'), TITLE, 'warning')
+    added(Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id, title=TITLE, notification_type='warning',
+            message=f"Product {row['product__SKU']} is below minimum stock level in {row['warehouse__name']}. "
+                    f"Current: {row['quantity']}, Min: {row['product__min_stock']}",
+            related_model='inventory.Stock', related_id=row['pk'],
+        )
+        for row in alerts for user_id in recipients
+    ], batch_size=BATCH_SIZE))
+
+
+def scan():
+    """Evaluate all stock at once; the periodic alternative to checking on every save"""
+    from inventory.models import Stock
+    return evaluate(Stock.objects.all())
+
+
+def per_save():
+    """Whether stock saves are checked as they happen, rather than by the periodic scan"""
+    return getattr(settings, 'LOW_STOCK_ALERT_MODE', 'event') == 'event'
+
+
+def schedule_scan():
+    """Queue the recurring scan task for run_worker, unless it is queued already"""
+    from core.models import BackgroundTask
+    from core.tasks import enqueue
+    if BackgroundTask.objects.filter(name=SCAN_TASK, status='queued').exists():
+        return None
+    interval = getattr(settings, 'LOW_STOCK_SCAN_INTERVAL', 900)
+    return enqueue(SCAN_TASK, run_after=timezone.now() + timedelta(seconds=interval))
@@ -0,0 +1,70 @@
+import time
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from notifications.fanout import fan_out
+from notifications.models import Notification, NotificationPreference
+
+EVENT = {
+    'title': 'Quality Check Failed',
+    'message': 'Quality check QC-BENCH has failed. Please review.',
+    'notification_type': 'error',
+    'related_model': 'quality.QualityCheck',
+    'related_id': 1,
+}
+
+
+def _per_recipient(users, title, message, notification_type, related_model, related_id):
+    """The previous notify_users: a preference get_or_create and an insert per recipient"""
+    for user in users:
+        pref, _ = NotificationPreference.objects.get_or_create(user=user)
+        if 'quality' in title.lower() and not pref.quality_alerts:
+            continue
+        Notification.objects.create(
+            user=user, title=title, message=message, notification_type=notification_type,
+            related_model=related_model, related_id=related_id,
+        )
+
+
+class Command(BaseCommand):
+    help = 'Compare per-recipient and bulk notification fan-out for groups of test users (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,1000,10000', help='Comma separated recipient counts')
+
+    def _measure(self, notify, users):
+        """Queries, seconds and notifications created; rolled back so each run starts from the same state"""
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with transaction.atomic():
+            with connection.execute_wrapper(count):
+                started = time.perf_counter()
+                notify(users, **EVENT)
+                seconds = time.perf_counter() - started
+            created = Notification.objects.filter(related_model=EVENT['related_model']).count()
+            transaction.set_rollback(True)
+        return queries, seconds, created
+
+    def handle(self, *args, **options):
+        for size in [int(size) for size in options['sizes'].split(',')]:
+            with transaction.atomic():
+                group = Group.objects.create(name='Benchmark Recipients')
+                User.objects.bulk_create(
+                    [User(username=f'bench-recipient-{n}') for n in range(size)], batch_size=1000
+                )
+                group.user_set.add(*User.objects.filter(username__startswith='bench-recipient-'))
+                users = User.objects.filter(groups=group)
+
+                # Neither approach finds preferences yet, as on the first event for a new group
+                for label, notify in (('per recipient', _per_recipient), ('bulk fan-out', fan_out)):
+                    queries, seconds, created = self._measure(notify, users)
+                    self.stdout.write(
+                        f'{size:>6} recipients  {label:<14} {queries:>6} queries  {seconds * 1000:>9.1f} ms  '
+                        f'{created} notifications'
+                    )
+                transaction.set_rollback(True)
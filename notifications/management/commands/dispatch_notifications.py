@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from notifications.outbox import drain, schedule_dispatch
+
+
+class Command(BaseCommand):
+    help = 'Turn pending notification outbox events into notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true',
+                            help='Instead of draining now, queue the recurring dispatcher task for run_worker')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            task = schedule_dispatch()
+            self.stdout.write(self.style.SUCCESS(
+                f'Queued dispatcher task #{task.pk}.' if task else 'Dispatcher task already queued.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Dispatched {drain()} events.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from notifications.unread import reconcile, schedule_reconcile
+
+
+class Command(BaseCommand):
+    help = 'Correct per-user unread notification counters that drifted from the notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true',
+                            help='Instead of reconciling now, queue the recurring task for run_worker')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            task = schedule_reconcile()
+            self.stdout.write(self.style.SUCCESS(
+                f'Queued reconcile task #{task.pk}.' if task else 'Reconcile task already queued.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Corrected {reconcile()} unread counters.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from notifications.low_stock import scan, schedule_scan
+
+
+class Command(BaseCommand):
+    help = 'Check all stock against min_stock and alert on new low stock crossings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true',
+                            help='Instead of scanning now, queue the recurring scan task for run_worker')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            task = schedule_scan()
+            self.stdout.write(self.style.SUCCESS(
+                f'Queued scan task #{task.pk}.' if task else 'Scan task already queued.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Sent {scan()} low stock alerts.'))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-17 05:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('notifications', '0003_stockalertstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.IntegerField(blank=True, null=True)),
+                ('event', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notification_routes', to='auth.group')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notification_routes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notificationroute',
+            index=models.Index(fields=['model', 'object_id', 'event'], name='notificatio_model_de1f15_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationroute',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('group__isnull', True), ('user__isnull', False)), models.Q(('group__isnull', False), ('user__isnull', True)), _connector='OR'), name='notifications_route_user_or_group'),
+        ),
+    ]
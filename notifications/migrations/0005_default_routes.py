@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# The manager groups that already hear about new orders and failed checks
+# also get the events that used to go to every user
+DEFAULT_ROUTES = [
+    ('production.ProductionOrder', 'production.status_changed', 'Production Managers'),
+    ('quality.QualityCheck', 'quality.passed', 'Quality Managers'),
+    ('procurement.PurchaseOrder', 'purchase.delivery_due', 'Procurement Managers'),
+]
+
+
+def add_routes(apps, schema_editor):
+    Group = apps.get_model('auth', 'Group')
+    NotificationRoute = apps.get_model('notifications', 'NotificationRoute')
+    for model, event, group_name in DEFAULT_ROUTES:
+        group, _ = Group.objects.get_or_create(name=group_name)
+        NotificationRoute.objects.get_or_create(model=model, object_id=None, event=event, group=group)
+
+
+def remove_routes(apps, schema_editor):
+    NotificationRoute = apps.get_model('notifications', 'NotificationRoute')
+    for model, event, group_name in DEFAULT_ROUTES:
+        NotificationRoute.objects.filter(
+            model=model, object_id=None, event=event, group__name=group_name
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('notifications', '0004_notificationroute'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_routes, remove_routes),
+    ]
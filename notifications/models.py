@@ -1,5 +1,5 @@
 from django.db import models
-from django.contrib.auth.models import User
+from django.contrib.auth.models import Group, User
 from core.models import TimeStampedModel
 from django.utils import timezone
 
@@ -25,14 +25,23 @@ class Notification(TimeStampedModel):
     
     class Meta:
         ordering = ['-created_at', '-priority']
+        indexes = [models.Index(fields=['user', 'is_read'])]  # unread counts and lists
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
     
     def mark_as_read(self):
+        from .unread import adjust
+        # Conditional UPDATE: of concurrent requests only the one that
+        # actually flips the row decrements the counter
+        now = timezone.now()
+        rows = Notification.objects.filter(pk=self.pk, is_read=False).update(
+            is_read=True, read_at=now, updated_at=now
+        )
         self.is_read = True
-        self.read_at = timezone.now()
-        self.save()
+        if rows:
+            self.read_at = now
+            adjust({self.user_id: -rows})
 
 class NotificationPreference(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_preferences')
@@ -46,4 +55,87 @@ class NotificationPreference(models.Model):
     attendance_alerts = models.BooleanField(default=True)
     
     def __str__(self):
-        return f"Preferences for {self.user.username}"
\ No newline at end of file
+        return f"Preferences for {self.user.username}"
+
+class OutboxEvent(models.Model):
+    """Notification-worthy change, written in the same transaction as the change itself.
+
+    The dispatcher (notifications.outbox) turns events into notifications
+    later, so business saves only pay for this one insert.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    event = models.CharField(max_length=50)
+    object_id = models.IntegerField()
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
+    
+    def __str__(self):
+        return f"{self.event} #{self.object_id} ({self.status})"
+
+
+class StockAlertState(models.Model):
+    """Low stock alert state of one product in one warehouse (see notifications.low_stock)"""
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE, related_name='+')
+    warehouse = models.ForeignKey('inventory.Warehouse', on_delete=models.CASCADE, related_name='+')
+    is_low = models.BooleanField(default=False)
+    last_alerted_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['product', 'warehouse']
+    
+    def __str__(self):
+        return f"{self.product_id}/{self.warehouse_id}: {'low' if self.is_low else 'ok'}"
+
+
+class NotificationRoute(models.Model):
+    """Extra recipients of an event: watchers of one object, or a group for every object of a model.
+
+    The creator and other stakeholders of an object need no route; they
+    come from the object itself (see notifications.routing).
+    """
+    model = models.CharField(max_length=50)  # e.g., 'production.ProductionOrder'
+    object_id = models.IntegerField(null=True, blank=True)  # empty: every object of the model
+    event = models.CharField(max_length=50, blank=True)  # e.g., 'production.status_changed'; empty: every event
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='notification_routes')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='notification_routes')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['model', 'object_id', 'event'])]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(user__isnull=False, group__isnull=True) | models.Q(user__isnull=True, group__isnull=False),
+                name='notifications_route_user_or_group',
+            ),
+        ]
+    
+    def __str__(self):
+        target = self.user or self.group
+        return f"{self.model} #{self.object_id or '*'} {self.event or '*'} -> {target}"
+
+
+class UnreadCounter(models.Model):
+    """Denormalized unread notification count of a user (see notifications.unread)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.count} unread"
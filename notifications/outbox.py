@@ -0,0 +1,138 @@
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_TASK = 'notifications.dispatch'
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 5
+# Seconds a claimed batch stays hidden from other dispatchers; a crashed
+# dispatcher's events come back once it runs out
+LEASE_SECONDS = 300
+RETENTION_DAYS = 7
+
+# Event name -> callable taking the OutboxEvent, filled by @handles in handlers.py
+_handlers = {}
+_discovered = False
+
+
+def handles(event):
+    """Decorator registering the dispatcher handler of ``event``"""
+    def decorator(func):
+        _handlers[event] = func
+        return func
+    return decorator
+
+
+def _handler(event):
+    global _discovered
+    if event not in _handlers and not _discovered:
+        from . import handlers  # noqa: F401
+        _discovered = True
+    return _handlers[event]
+
+
+def record(event, instance, **payload):
+    """Add ``event`` for ``instance`` to the outbox: one INSERT in the caller's transaction.
+
+    ``payload`` holds the few values the handler needs from the moment of
+    the change (JSON types only). With BACKGROUND_TASKS_EAGER set the
+    outbox is drained in-process once the transaction commits.
+    """
+    OutboxEvent.objects.create(event=event, object_id=instance.pk, payload=payload)
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(drain)
+
+
+def record_many(event, object_ids):
+    """Add one ``event`` covering many objects, for bulk writes: their ids go in payload['ids']"""
+    OutboxEvent.objects.create(event=event, object_id=0, payload={'ids': list(object_ids)})
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(drain)
+
+
+def claim_batch(worker, size=BATCH_SIZE):
+    """Lease up to ``size`` due events to ``worker``; concurrent dispatchers get disjoint batches"""
+    now = timezone.now()
+    due = OutboxEvent.objects.filter(status='pending', available_at__lte=now)
+    ids = list(due.order_by('available_at', 'pk').values_list('pk', flat=True)[:size])
+    if not ids:
+        return []
+    token = f'{worker}:{uuid.uuid4().hex[:8]}'
+    due.filter(pk__in=ids).update(
+        locked_by=token, available_at=now + timedelta(seconds=LEASE_SECONDS), attempts=F('attempts') + 1
+    )
+    return list(OutboxEvent.objects.filter(locked_by=token).order_by('pk'))
+
+
+def dispatch_batch(worker, size=BATCH_SIZE):
+    """Handle one batch of events; returns how many were claimed.
+
+    Each event is handled in its own transaction, so a failing one
+    creates no notifications and does not hold back the rest. It is
+    retried with a growing delay and marked failed after MAX_ATTEMPTS.
+    """
+    events = claim_batch(worker, size)
+    done, failed = [], []
+    for event in events:
+        try:
+            with transaction.atomic():
+                _handler(event.event)(event)
+        except Exception:
+            logger.exception('Notification event %s #%s failed', event.event, event.pk)
+            event.error = traceback.format_exc()
+            event.locked_by = ''
+            if event.attempts >= MAX_ATTEMPTS:
+                event.status = 'failed'
+                event.processed_at = timezone.now()
+            else:
+                event.available_at = timezone.now() + timedelta(seconds=30 * event.attempts)
+            failed.append(event)
+        else:
+            done.append(event.pk)
+    if done:
+        OutboxEvent.objects.filter(pk__in=done).update(
+            status='done', processed_at=timezone.now(), locked_by='', error=''
+        )
+    if failed:
+        OutboxEvent.objects.bulk_update(failed, ['status', 'error', 'available_at', 'locked_by', 'processed_at'])
+    return len(events)
+
+
+def purge():
+    """Delete events handled more than RETENTION_DAYS ago"""
+    cutoff = timezone.now() - timedelta(days=RETENTION_DAYS)
+    return OutboxEvent.objects.filter(status='done', processed_at__lt=cutoff).delete()[0]
+
+
+def drain(heartbeat=None, worker=None):
+    """Dispatch batches until no event is due; returns the number handled"""
+    from core.tasks import worker_id
+    worker = worker or worker_id()
+    total = 0
+    while True:
+        count = dispatch_batch(worker)
+        total += count
+        if not count:
+            break
+        if heartbeat:
+            heartbeat()
+    purge()
+    return total
+
+
+def schedule_dispatch():
+    """Queue the recurring dispatcher task for run_worker, unless it is queued already"""
+    from core.models import BackgroundTask
+    from core.tasks import enqueue
+    if BackgroundTask.objects.filter(name=DISPATCH_TASK, status='queued').exists():
+        return None
+    interval = getattr(settings, 'NOTIFICATION_DISPATCH_INTERVAL', 5)
+    return enqueue(DISPATCH_TASK, run_after=timezone.now() + timedelta(seconds=interval))
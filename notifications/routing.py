@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from .models import NotificationRoute
+
+# Stakeholders an object names itself: fields holding a User id, and
+# fields holding an hr.Employee id (notified through the employee's user)
+STAKEHOLDER_USERS = {
+    'production.ProductionOrder': ['created_by_id'],
+    'quality.QualityCheck': ['created_by_id', 'inspector_id'],
+    'procurement.PurchaseOrder': ['created_by_id'],
+}
+STAKEHOLDER_EMPLOYEES = {
+    'production.ProductionOrder': ['supervisor_id'],
+}
+
+
+def routes_for(model, object_id, event):
+    """Routes of an event: the object's watchers and model-wide routes, for this event or every event"""
+    return NotificationRoute.objects.filter(
+        Q(object_id=object_id) | Q(object_id__isnull=True), model=model, event__in=[event, '']
+    )
+
+
+def recipients(instance, event):
+    """Active users to notify of ``event`` on ``instance``.
+
+    These are the object's own stakeholders (creator, supervisor, ...),
+    its watchers, and the groups routed to the event. They are resolved
+    with one query, through the route index and primary keys, so a
+    notification reaches the people involved instead of every user.
+    """
+    model = instance._meta.label
+    user_ids = [getattr(instance, field) for field in STAKEHOLDER_USERS.get(model, ['created_by_id'])
+                if getattr(instance, field, None)]
+    employee_ids = [getattr(instance, field) for field in STAKEHOLDER_EMPLOYEES.get(model, [])
+                    if getattr(instance, field, None)]
+    routes = routes_for(model, instance.pk, event)
+
+    wanted = (
+        Q(pk__in=user_ids)
+        | Q(pk__in=routes.filter(user__isnull=False).values('user_id'))
+        | Q(groups__in=routes.filter(group__isnull=False).values('group_id'))
+    )
+    if employee_ids:
+        wanted |= Q(employee__id__in=employee_ids)
+    return User.objects.filter(wanted, is_active=True).distinct()
+
+
+def watch(user, instance, event=''):
+    """Have ``user`` notified of ``event`` (default: every event) on ``instance``"""
+    route, _ = NotificationRoute.objects.get_or_create(
+        model=instance._meta.label, object_id=instance.pk, event=event, user=user
+    )
+    return route
+
+
+def unwatch(user, instance, event=''):
+    return NotificationRoute.objects.filter(
+        model=instance._meta.label, object_id=instance.pk, event=event, user=user
+    ).delete()[0]
+
+
+def route_group(group, model, event=''):
+    """Have ``group`` notified of ``event`` (default: every event) on every object of ``model``"""
+    route, _ = NotificationRoute.objects.get_or_create(model=model, object_id=None, event=event, group=group)
+    return route
@@ -0,0 +1,23 @@
+from core.tasks import heartbeat, register
+from .low_stock import SCAN_TASK, scan, schedule_scan
+from .outbox import DISPATCH_TASK, drain, schedule_dispatch
+from .unread import RECONCILE_TASK, reconcile, schedule_reconcile
+
+
+@register(DISPATCH_TASK)
+def dispatch(task):
+    drain(heartbeat=lambda: heartbeat(task))
+    # Requeue itself, so a running worker keeps draining the outbox every few seconds
+    schedule_dispatch()
+
+
+@register(SCAN_TASK)
+def scan_low_stock(task):
+    scan()
+    schedule_scan()
+
+
+@register(RECONCILE_TASK)
+def reconcile_unread(task):
+    reconcile()
+    schedule_reconcile()
@@ -1,3 +1,305 @@
+from datetime import timedelta
+from django.contrib.auth.models import Group, User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.models import Department
+from hr.models import Employee
+from inventory.models import Product, UnitOfMeasure, Warehouse
+from production.models import BillOfMaterials, ProductionOrder
+from inventory.posting import post_movement
+from . import outbox, unread
+from .routing import recipients, route_group, watch
+from .fanout import fan_out, load_preferences
+from .models import Notification, NotificationPreference, OutboxEvent, UnreadCounter
 
-# Create your tests here.
+handled = []
+
+
+@outbox.handles('tests.ok')
+def handle_ok(event):
+    handled.append(event.pk)
+
+
+@outbox.handles('tests.broken')
+def handle_broken(event):
+    raise RuntimeError('handler failed')
+
+
+class OutboxTest(TestCase):
+
+    def setUp(self):
+        handled.clear()
+        self.user = User.objects.create(username='outbox')
+
+    def _record(self, event, count=1):
+        for _ in range(count):
+            outbox.record(event, self.user)
+        return list(OutboxEvent.objects.filter(event=event).order_by('pk').values_list('pk', flat=True))
+
+    def _make_due(self):
+        OutboxEvent.objects.filter(status='pending').update(available_at=timezone.now())
+
+    def test_leases_are_disjoint(self):
+        ids = self._record('tests.ok', 5)
+        first = outbox.claim_batch('a', size=3)
+        second = outbox.claim_batch('b', size=3)
+        self.assertEqual([e.pk for e in first], ids[:3])
+        self.assertEqual([e.pk for e in second], ids[3:])
+        self.assertTrue(all(e.locked_by.startswith('a:') for e in first))
+        # Everything is leased, so a third dispatcher gets nothing
+        self.assertEqual(outbox.claim_batch('c'), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        ids = self._record('tests.ok')
+        [claimed] = outbox.claim_batch('a')
+        OutboxEvent.objects.filter(pk=claimed.pk).update(available_at=timezone.now() - timedelta(seconds=1))
+        [again] = outbox.claim_batch('b')
+        self.assertEqual(again.pk, ids[0])
+        self.assertEqual(again.attempts, 2)
+        self.assertNotEqual(again.locked_by, claimed.locked_by)
+
+    def test_handled_events_are_done(self):
+        ids = self._record('tests.ok', 3)
+        self.assertEqual(outbox.dispatch_batch('a'), 3)
+        self.assertEqual(handled, ids)
+        self.assertEqual(set(OutboxEvent.objects.values_list('status', 'locked_by')), {('done', '')})
+        self.assertEqual(outbox.dispatch_batch('a'), 0)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        [broken] = self._record('tests.broken')
+        [ok] = self._record('tests.ok')
+        with self.assertLogs('notifications.outbox', 'ERROR'):
+            self.assertEqual(outbox.dispatch_batch('a'), 2)
+        # The failure does not hold back the other event of the batch
+        self.assertEqual(handled, [ok])
+
+        event = OutboxEvent.objects.get(pk=broken)
+        self.assertEqual((event.status, event.attempts, event.locked_by), ('pending', 1, ''))
+        self.assertIn('handler failed', event.error)
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertEqual(outbox.dispatch_batch('a'), 0)
+
+        for _ in range(2, outbox.MAX_ATTEMPTS + 1):
+            self._make_due()
+            with self.assertLogs('notifications.outbox', 'ERROR'):
+                self.assertEqual(outbox.dispatch_batch('a'), 1)
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('failed', outbox.MAX_ATTEMPTS))
+        self.assertIsNotNone(event.processed_at)
+        self._make_due()
+        self.assertEqual(outbox.dispatch_batch('a'), 0)
+
+    def test_drain_and_purge(self):
+        self._record('tests.ok', 3)
+        self.assertEqual(outbox.drain(worker='a'), 3)
+        OutboxEvent.objects.update(processed_at=timezone.now() - timedelta(days=outbox.RETENTION_DAYS + 1))
+        self.assertEqual(outbox.purge(), 3)
+
+
+class LowStockPostingTest(TestCase):
+
+    def test_postings_alert_when_crossing_the_minimum(self):
+        User.objects.create(username='stores').groups.add(Group.objects.create(name='Inventory Managers'))
+        product = Product.objects.create(
+            SKU='BOLT', name='Bolt', product_type='raw', min_stock=10,
+            unit_of_measure=UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        )
+        warehouse = Warehouse.objects.create(name='Main', code='MAIN', location='-')
+        post_movement('IN', product, warehouse, 20)
+        post_movement('OUT', product, warehouse, 15)
+        outbox.drain(worker='test')
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['Low Stock Alert'])
+
+        # Still low: no second alert
+        post_movement('OUT', product, warehouse, 1)
+        outbox.drain(worker='test')
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class UnreadCounterTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        UnreadCounter.objects.create(user=self.user, count=0)
+        self.client.force_login(self.user)
+
+    def _notify(self, count=1):
+        return [Notification.objects.create(user=self.user, title='Hi', message='-') for _ in range(count)]
+
+    def _counter(self):
+        return UnreadCounter.objects.get(user=self.user).count
+
+    def test_created_notifications_are_counted(self):
+        self._notify(2)
+        unread.added(Notification.objects.bulk_create([Notification(user=self.user, title='Bulk', message='-')]))
+        self.assertEqual(self._counter(), 3)
+
+    def test_reading_twice_decrements_once(self):
+        [notification] = self._notify()
+        # Two requests holding the same unread row
+        stale = Notification.objects.get(pk=notification.pk)
+        notification.mark_as_read()
+        stale.mark_as_read()
+        self.assertEqual(self._counter(), 0)
+        self.client.get(reverse('notifications:mark_read', args=[notification.pk]))
+        self.assertEqual(self._counter(), 0)
+
+    def test_deleting_only_decrements_for_unread(self):
+        first, second = self._notify(2)
+        first.mark_as_read()
+        self.client.get(reverse('notifications:delete', args=[first.pk]))
+        self.client.get(reverse('notifications:delete', args=[second.pk]))
+        self.assertEqual(self._counter(), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_mark_all_and_clear_keep_concurrent_arrivals(self):
+        self._notify(3)
+        # Pretend a notification arrived between the update and the adjustment
+        UnreadCounter.objects.update(count=4)
+        self.client.get(reverse('notifications:mark_all_read'))
+        self.assertEqual(self._counter(), 1)
+
+        self._notify(2)
+        UnreadCounter.objects.update(count=4)
+        self.client.get(reverse('notifications:clear_all'))
+        self.assertEqual(self._counter(), 2)
+
+    def test_reconcile_fixes_drifted_counters(self):
+        self._notify(2)
+        UnreadCounter.objects.update(count=7)
+        self.assertEqual(unread.reconcile(), 1)
+        self.assertEqual(self._counter(), 2)
+        self.assertEqual(unread.reconcile(), 0)
+
+
+class FanOutTest(TestCase):
+    """fan_out must pick the same recipients as the old per-user notify_users loop"""
+
+    FLAGS = ('low_stock_alerts', 'quality_alerts', 'production_alerts')
+
+    def make_users(self, count, prefix='user'):
+        return [User.objects.create(username=f'{prefix}{n}') for n in range(count)]
+
+    def expected(self, users, title, notification_type):
+        """The old rules: each opt-out flag checked on the user's own preferences"""
+        recipients = []
+        for user in users:
+            preference, _ = NotificationPreference.objects.get_or_create(user=user)
+            if notification_type == 'warning' and not preference.low_stock_alerts:
+                continue
+            if 'quality' in title.lower() and not preference.quality_alerts:
+                continue
+            if 'production' in title.lower() and not preference.production_alerts:
+                continue
+            recipients.append(user.pk)
+        return recipients
+
+    def test_opt_outs_match_notify_users(self):
+        users = self.make_users(9)
+        # Every combination of the three flags, plus a user without preferences yet
+        for n, user in enumerate(users[:8]):
+            NotificationPreference.objects.create(
+                user=user, **{flag: not n & (1 << bit) for bit, flag in enumerate(self.FLAGS)}
+            )
+        for title, notification_type in (('Low Stock Alert', 'warning'), ('Quality Check Failed', 'error'),
+                                         ('Production Order Started', 'info'),
+                                         ('Quality hold on production', 'warning'), ('Shift change', 'info')):
+            notifications = fan_out(User.objects.filter(pk__in=[u.pk for u in users]), title, '-',
+                                    notification_type=notification_type)
+            self.assertEqual(sorted(n.user_id for n in notifications),
+                             sorted(self.expected(users, title, notification_type)), title)
+        self.assertEqual(len(fan_out(users, 'Shift change', '-')), 9)
+
+    def test_missing_preferences_are_created_in_bulk(self):
+        existing, *new = self.make_users(4)
+        NotificationPreference.objects.create(user=existing, quality_alerts=False)
+        with CaptureQueriesContext(connection) as queries:
+            preferences = load_preferences([u.pk for u in (existing, *new)], ['quality_alerts', 'low_stock_alerts'])
+        # One read, one insert
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(preferences, {existing.pk: (False, True), **{u.pk: (True, True) for u in new}})
+        self.assertEqual(NotificationPreference.objects.count(), 4)
+        self.assertFalse(NotificationPreference.objects.get(user=existing).quality_alerts)
+
+    def count_queries(self, users):
+        with CaptureQueriesContext(connection) as queries:
+            fan_out(User.objects.filter(pk__in=[u.pk for u in users]), 'Quality Check Failed', '-',
+                    notification_type='warning')
+        return len(queries)
+
+    def test_queries_do_not_grow_with_recipients(self):
+        small = self.count_queries(self.make_users(3, 'few'))
+        large = self.count_queries(self.make_users(60, 'many'))
+        self.assertEqual(small, large)
+        self.assertEqual(Notification.objects.count(), 63)
+
+
+class RoutingTest(TestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create(username='planner')
+        self.supervisor = User.objects.create(username='supervisor')
+        self.bystander = User.objects.create(username='bystander')
+        employee = Employee.objects.create(
+            user=self.supervisor, employee_id='SUP001', department=Department.objects.create(name='Plant', code='PLT'),
+            designation='Supervisor', employee_type='permanent', date_of_joining='2020-01-01',
+            date_of_birth='1980-01-01', gender='female', phone='1', address='-'
+        )
+        uom = UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        product = Product.objects.create(SKU='FG', name='FG', product_type='finished', unit_of_measure=uom)
+        bom = BillOfMaterials.objects.create(code='BOM-FG', finished_product=product, effective_date='2025-01-01')
+        self.order, self.other_order = [
+            ProductionOrder.objects.create(
+                bom=bom, product=product, quantity=1, uom=uom, planned_start=timezone.now(),
+                planned_end=timezone.now(), created_by=self.creator, supervisor=employee
+            )
+            for _ in range(2)
+        ]
+
+    def recipients(self, event='production.status_changed'):
+        return set(recipients(self.order, event).values_list('username', flat=True))
+
+    def test_stakeholders(self):
+        # The creator, and the supervisor through their employee record; nobody else
+        self.assertEqual(self.recipients(), {'planner', 'supervisor'})
+        User.objects.filter(pk=self.supervisor.pk).update(is_active=False)
+        self.assertEqual(self.recipients(), {'planner'})
+
+    def test_watchers(self):
+        watcher = User.objects.create(username='watcher')
+        watch(watcher, self.order)
+        watch(self.bystander, self.order, 'production.completed')
+        watch(User.objects.create(username='elsewhere'), self.other_order)
+        self.assertEqual(self.recipients(), {'planner', 'supervisor', 'watcher'})
+        self.assertEqual(self.recipients('production.completed'), {'planner', 'supervisor', 'watcher', 'bystander'})
+        User.objects.filter(pk=watcher.pk).update(is_active=False)
+        self.assertEqual(self.recipients(), {'planner', 'supervisor'})
+
+    def test_group_routes(self):
+        managers = Group.objects.create(name='Line Managers')
+        quality = Group.objects.create(name='QC Team')
+        planners = Group.objects.create(name='Planners')
+        for name, group in (('manager', managers), ('inspector', quality), ('scheduler', planners)):
+            User.objects.create(username=name).groups.add(group)
+        self.bystander.groups.add(Group.objects.create(name='Unrouted'))
+        route_group(managers, 'production.ProductionOrder')
+        route_group(planners, 'production.ProductionOrder', 'production.completed')
+        route_group(quality, 'quality.QualityCheck')
+        self.assertEqual(self.recipients(), {'planner', 'supervisor', 'manager'})
+        self.assertEqual(self.recipients('production.completed'), {'planner', 'supervisor', 'manager', 'scheduler'})
+
+    def test_toggle_watch(self):
+        self.client.force_login(self.bystander)
+        url = reverse('notifications:toggle_watch')
+        data = {'model': 'production.ProductionOrder', 'object_id': self.order.pk}
+        self.assertEqual(self.client.post(url, data).json(), {'success': True, 'watching': True})
+        self.assertIn('bystander', self.recipients())
+        self.assertEqual(self.client.post(url, data).json(), {'success': True, 'watching': False})
+        self.assertNotIn('bystander', self.recipients())
+
+        self.assertEqual(self.client.post(url, {**data, 'model': 'auth.User'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {**data, 'object_id': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
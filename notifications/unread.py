@@ -0,0 +1,99 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Notification, UnreadCounter
+
+UNREAD_KEY = 'notifications:unread:{user_id}'
+RECONCILE_TASK = 'notifications.reconcile_unread'
+# Users per UPDATE, keeping every statement under SQLite's 999 query parameter limit
+CHUNK_SIZE = 500
+
+# Each user's unread count lives in UnreadCounter and, in front of it, the
+# cache. Writes that change unread notifications adjust the row in their
+# own transaction and drop the cached value once committed, so a badge
+# poll is a cache hit until something actually changes. Counters are
+# created on first read; anything that slips past (raw SQL, a crash
+# between the two) is corrected by reconcile().
+
+
+def _forget(user_ids):
+    keys = [UNREAD_KEY.format(user_id=user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def adjust(deltas):
+    """Add ``deltas`` {user id: change} to the unread counters, one UPDATE per distinct change"""
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    now = timezone.now()
+    for delta, user_ids in by_delta.items():
+        for start in range(0, len(user_ids), CHUNK_SIZE):
+            UnreadCounter.objects.filter(user_id__in=user_ids[start:start + CHUNK_SIZE]).update(
+                count=F('count') + delta, updated_at=now
+            )
+    _forget([user_id for user_ids in by_delta.values() for user_id in user_ids])
+
+
+def added(notifications):
+    """Count freshly bulk-created ``notifications`` (bulk_create sends no post_save)"""
+    adjust(Counter(n.user_id for n in notifications if not n.is_read))
+
+
+def unread_count(user_id):
+    """Unread notifications of a user: from the cache, else the counter, else one COUNT"""
+    key = UNREAD_KEY.format(user_id=user_id)
+    count = cache.get(key)
+    if count is not None:
+        return count
+    count = UnreadCounter.objects.filter(user_id=user_id).values_list('count', flat=True).first()
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        try:
+            with transaction.atomic():
+                UnreadCounter.objects.create(user_id=user_id, count=count)
+        except IntegrityError:
+            # Created by a concurrent request meanwhile
+            pass
+    count = max(count, 0)
+    cache.set(key, count, getattr(settings, 'UNREAD_COUNT_TIMEOUT', 300))
+    return count
+
+
+def reconcile():
+    """Correct counters that drifted from the actual unread counts; returns how many were fixed.
+
+    The actual counts come from one grouped query over the (user, is_read)
+    index. Each correction only applies if the counter has not moved since
+    it was read, so a notification arriving meanwhile is not lost.
+    """
+    actual = dict(
+        Notification.objects.filter(is_read=False).values('user_id').annotate(n=Count('pk'))
+        .order_by().values_list('user_id', 'n')
+    )
+    wrong = [
+        (user_id, seen, actual.get(user_id, 0))
+        for user_id, seen in UnreadCounter.objects.values_list('user_id', 'count').iterator(chunk_size=2000)
+        if seen != actual.get(user_id, 0)
+    ]
+    fixed = [
+        user_id for user_id, seen, count in wrong
+        if UnreadCounter.objects.filter(user_id=user_id, count=seen).update(count=count, updated_at=timezone.now())
+    ]
+    _forget(fixed)
+    return len(fixed)
+
+
+def schedule_reconcile():
+    """Queue the recurring reconciliation task for run_worker, unless it is queued already"""
+    from core.models import BackgroundTask
+    from core.tasks import enqueue
+    if BackgroundTask.objects.filter(name=RECONCILE_TASK, status='queued').exists():
+        return None
+    interval = getattr(settings, 'UNREAD_RECONCILE_INTERVAL', 3600)
+    return enqueue(RECONCILE_TASK, run_after=timezone.now() + timedelta(seconds=interval))
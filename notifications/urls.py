@@ -15,6 +15,9 @@ urlpatterns = [
     path('preferences/', views.notification_preferences, name='preferences'),
     path('preferences/update/', views.update_preferences, name='update_preferences'),
     
+    # Watching objects
+    path('watch/', views.toggle_watch, name='toggle_watch'),
+    
     # Real-time endpoints
     # path('ws/notifications/', views.NotificationConsumer.as_asgi()),  # Comment out for now
     path('api/unread-count/', views.unread_notification_count, name='unread_count'),
@@ -2,8 +2,11 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 from .models import Notification, NotificationPreference
+from . import unread
 
 @login_required
 def notifications_list(request):
@@ -34,9 +37,11 @@ def mark_notification_read(request, pk):
 @login_required
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
-    Notification.objects.filter(user=request.user, is_read=False).update(
-        is_read=True, read_at=timezone.now()
+    now = timezone.now()
+    rows = Notification.objects.filter(user=request.user, is_read=False).update(
+        is_read=True, read_at=now, updated_at=now
     )
+    unread.adjust({request.user.pk: -rows})
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -48,7 +53,10 @@ def mark_all_notifications_read(request):
 def delete_notification(request, pk):
     """Delete a notification"""
     notification = get_object_or_404(Notification, pk=pk, user=request.user)
-    notification.delete()
+    # Decrement by what this request actually deleted, not by the row it loaded
+    rows, _ = Notification.objects.filter(pk=notification.pk, is_read=False).delete()
+    Notification.objects.filter(pk=notification.pk).delete()
+    unread.adjust({request.user.pk: -rows})
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -59,7 +67,9 @@ def delete_notification(request, pk):
 @login_required
 def clear_all_notifications(request):
     """Clear all notifications"""
+    rows, _ = Notification.objects.filter(user=request.user, is_read=False).delete()
     Notification.objects.filter(user=request.user).delete()
+    unread.adjust({request.user.pk: -rows})
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -107,11 +117,45 @@ def update_preferences(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request'})
 
+@login_required
+def toggle_watch(request):
+    """Start or stop watching an object (POST model, object_id and optionally event)"""
+    from django.apps import apps
+    from .routing import STAKEHOLDER_USERS, unwatch, watch
+    
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=405)
+    label = request.POST.get('model', '')
+    if label not in STAKEHOLDER_USERS:
+        return JsonResponse({'success': False, 'error': 'Unknown object'}, status=400)
+    try:
+        model = apps.get_model(label)
+        instance = model.objects.get(pk=int(request.POST.get('object_id', '')))
+    except (ValueError, ObjectDoesNotExist):
+        return JsonResponse({'success': False, 'error': 'Unknown object'}, status=400)
+    
+    event = request.POST.get('event', '')
+    if unwatch(request.user, instance, event):
+        return JsonResponse({'success': True, 'watching': False})
+    watch(request.user, instance, event)
+    return JsonResponse({'success': True, 'watching': True})
+
 @login_required
 def unread_notification_count(request):
-    """Get unread notification count for AJAX requests"""
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return JsonResponse({'count': count})
+    """Get unread notification count for AJAX requests.
+    
+    Served from the cached per-user counter. The ETag is the count, so a
+    tab polling without changes gets a bodiless 304.
+    """
+    count = unread.unread_count(request.user.pk)
+    etag = f'"unread-{count}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'count': count})
+    response['ETag'] = etag
+    # Browsers and proxies may keep it, but must revalidate every poll
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 # WebSocket consumer (simplified for now)
 class NotificationConsumer:
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class PayrollConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payroll'  # Should be 'payroll' not 'payrollchannels'
-    verbose_name = 'Payroll Management'
\ No newline at end of file
+    verbose_name = 'Payroll Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
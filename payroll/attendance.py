@@ -0,0 +1,41 @@
+from collections import namedtuple
+from decimal import Decimal
+from django.db.models import Count, Q, Sum
+from hr.models import Attendance
+
+# Attendance of one employee over a payroll period
+AttendanceSummary = namedtuple(
+    'AttendanceSummary', ['present', 'absent', 'leave', 'holiday', 'half_day', 'overtime_hours']
+)
+
+NO_ATTENDANCE = AttendanceSummary(0, 0, 0, 0, 0, Decimal('0'))
+
+
+def period_attendance(period, employees=None):
+    """Attendance counts and overtime for every employee in a period, in one grouped query.
+
+    ``employees`` (a queryset or list of ids) limits the employees read;
+    a queryset is sent as a subquery rather than a list of ids. Returns
+    {employee_id: AttendanceSummary}. Employees without attendance rows are
+    left out; look them up with ``.get(pk, NO_ATTENDANCE)``.
+    """
+    records = Attendance.objects.filter(date__range=[period.start_date, period.end_date])
+    if employees is not None:
+        if hasattr(employees, 'values'):
+            employees = employees.values('pk')
+        records = records.filter(employee_id__in=employees)
+    rows = records.order_by().values('employee_id').annotate(
+        present=Count('pk', filter=Q(status='present')),
+        absent=Count('pk', filter=Q(status='absent')),
+        leave=Count('pk', filter=Q(status='leave')),
+        holiday=Count('pk', filter=Q(status='holiday')),
+        half_day=Count('pk', filter=Q(status='half_day')),
+        overtime_hours=Sum('overtime_hours'),
+    )
+    return {
+        row['employee_id']: AttendanceSummary(
+            row['present'], row['absent'], row['leave'], row['holiday'], row['half_day'],
+            row['overtime_hours'] or Decimal('0')
+        )
+        for row in rows
+    }
@@ -0,0 +1,190 @@
+from collections import defaultdict
+from decimal import Decimal
+from .calculation import DEDUCTION_FIELDS, EARNING_FIELDS, component_formula, fill_missing, period_installments
+from .formulas import FormulaError, compile_formula, payroll_variables, variable_name
+from .models import PayrollComponent, PayrollItem, SalaryAdvance, SalaryComponentValue
+
+HALF = Decimal('0.5')
+HUNDRED = 100
+
+
+def _deduction_components(codes):
+    """{code: PayrollComponent} for the LOAN-/ADV- deduction components, creating missing ones"""
+    if not codes:
+        return {}
+    components = {c.code: c for c in PayrollComponent.objects.filter(code__in=codes)}
+    missing = [
+        PayrollComponent(code=code, name=name, component_type='deduction',
+                         calculation_type='fixed', is_taxable=False)
+        for code, name in codes.items() if code not in components
+    ]
+    if missing:
+        PayrollComponent.objects.bulk_create(missing, ignore_conflicts=True)
+        components.update(
+            (c.code, c) for c in PayrollComponent.objects.filter(code__in=[m.code for m in missing])
+        )
+    return components
+
+
+class SalaryBatch:
+    """Salary calculation for many payrolls of one period at once.
+
+    Component values, loan installments and salary advances for all the
+    employees are read up front, a handful of queries in total. Each
+    component is then evaluated column-wise over all payrolls in
+    priority order. A formula runs once per distinct formula text, over
+    columns of every employee's variables. The arithmetic is the same Decimal arithmetic
+    as calculation.calculate_salary, so results are identical to the
+    per-payroll path.
+    """
+
+    def __init__(self, period, payrolls):
+        self.period = period
+        self.payrolls = payrolls
+        employee_ids = [p.employee_id for p in payrolls]
+        structure_ids = [p.salary_structure_id for p in payrolls]
+
+        self.values = defaultdict(list)
+        rows = SalaryComponentValue.objects.filter(
+            salary_structure_id__in=structure_ids,
+            component__component_type__in=['earning', 'deduction']
+        ).select_related('component').order_by('pk')
+        for value in rows:
+            self.values[value.salary_structure_id].append(value)
+
+        self.installments = defaultdict(list)
+        for installment in period_installments(period, employee_ids):
+            self.installments[installment.loan.employee_id].append(installment)
+
+        self.advances = defaultdict(list)
+        for advance in SalaryAdvance.objects.filter(
+            employee_id__in=employee_ids, status='disbursed', remaining_amount__gt=0
+        ).order_by('pk'):
+            self.advances[advance.employee_id].append(advance)
+
+        codes = {}
+        for installments in self.installments.values():
+            for i in installments:
+                codes[f'LOAN-{i.loan.loan_number}'] = f'Loan Deduction - {i.loan.loan_number}'
+        for advances in self.advances.values():
+            for a in advances:
+                codes[f'ADV-{a.advance_number}'] = f'Advance Deduction - {a.advance_number}'
+        self.deduction_components = _deduction_components(codes)
+        # Formula names of the components before each one, read only when an employee lacks one
+        self.earlier = {}
+
+    def _amounts(self, component, rows, variables):
+        """Amounts of one component for ``rows`` of (payroll index, component value)"""
+        payrolls = self.payrolls
+        if component.calculation_type == 'percentage':
+            return [payrolls[index].basic_salary * (value.percentage / HUNDRED) for index, value in rows]
+        amounts = [value.amount for _, value in rows]
+        if component.calculation_type != 'formula':
+            return amounts
+
+        # Rows sharing a formula (usually all of them) are evaluated in one call
+        by_formula = defaultdict(list)
+        for position, (index, value) in enumerate(rows):
+            formula = component_formula(component, value)
+            if formula:
+                by_formula[formula].append(position)
+        for text, positions in by_formula.items():
+            formula = compile_formula(text)
+            for position in positions:
+                fill_missing(component, formula, variables[rows[position][0]], self.earlier)
+            columns = {
+                name: [variables[rows[p][0]][name] for p in positions]
+                for name in formula.names
+            }
+            try:
+                results = formula.evaluate_many(columns, len(positions))
+            except FormulaError as e:
+                if len(e.args) > 1:
+                    employee = payrolls[rows[positions[e.args[1]]][0]].employee
+                    raise FormulaError(f'{component.code} for {employee.employee_id}: {e.args[0]}')
+                raise
+            for position, amount in zip(positions, results):
+                amounts[position] = amount
+        return amounts
+
+    def calculate(self):
+        """Fill every payroll's earnings, deductions and totals.
+
+        Returns (items, advances): unsaved PayrollItem rows for all
+        payrolls, ready for a single bulk_create, and the advances whose
+        remaining amount changed.
+        """
+        payrolls = self.payrolls
+
+        # Basic salary prorated on attendance, half pay for leave days
+        basics = [
+            p.salary_structure.basic_salary / p.total_working_days
+            * (p.present_days + p.holiday_days + (p.leave_days * HALF))
+            for p in payrolls
+        ]
+        for payroll, basic in zip(payrolls, basics):
+            payroll.basic_salary = basic
+
+        # Components in priority order, so formulas see the values computed before them
+        variables = [payroll_variables(p) for p in payrolls]
+        rows_by_component = defaultdict(list)
+        components = {}
+        for index, payroll in enumerate(payrolls):
+            for value in self.values.get(payroll.salary_structure_id, ()):
+                rows_by_component[value.component_id].append((index, value))
+                components[value.component_id] = value.component
+
+        items = []
+        for component in sorted(components.values(), key=lambda c: (c.priority, c.pk)):
+            rows = rows_by_component[component.pk]
+            name = variable_name(component.code)
+            for (index, value), amount in zip(rows, self._amounts(component, rows, variables)):
+                payroll = payrolls[index]
+                variables[index][name] = amount
+                if component.component_type == 'earning':
+                    field = EARNING_FIELDS.get(component.code)
+                    if field:
+                        setattr(payroll, field, amount)
+                    else:
+                        payroll.other_earnings += amount
+                else:
+                    field = DEDUCTION_FIELDS.get(component.code)
+                    if field:
+                        setattr(payroll, field, amount)
+                    else:
+                        payroll.other_deductions += amount
+                items.append(PayrollItem(
+                    payroll=payroll, component=component, amount=amount,
+                    calculation_note=f"{component.calculation_type} calculation"
+                ))
+
+        for payroll in payrolls:
+            for installment in self.installments.get(payroll.employee_id, ()):
+                payroll.loan_deduction += installment.total_amount
+                items.append(PayrollItem(
+                    payroll=payroll,
+                    component=self.deduction_components[f'LOAN-{installment.loan.loan_number}'],
+                    amount=installment.total_amount,
+                    calculation_note=f"Loan installment #{installment.installment_number}"
+                ))
+
+        changed = []
+        for payroll in payrolls:
+            for advance in self.advances.get(payroll.employee_id, ()):
+                deduction_amount = min(advance.monthly_deduction, advance.remaining_amount)
+                payroll.advance_deduction += deduction_amount
+                advance.remaining_amount -= deduction_amount
+                if advance.remaining_amount <= 0:
+                    advance.status = 'repaid'
+                changed.append(advance)
+                items.append(PayrollItem(
+                    payroll=payroll,
+                    component=self.deduction_components[f'ADV-{advance.advance_number}'],
+                    amount=deduction_amount,
+                    calculation_note="Salary advance repayment"
+                ))
+
+        for payroll in payrolls:
+            payroll.status = 'calculated'
+            payroll.calculate_totals()
+        return items, changed
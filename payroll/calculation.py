@@ -0,0 +1,211 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Q
+from .attendance import NO_ATTENDANCE, period_attendance
+from .formulas import VARIABLES, ZERO, FormulaError, compile_formula, payroll_variables, variable_name
+from .models import LoanInstallment, PayrollComponent, PayrollItem, SalaryAdvance
+
+# Component codes that have their own column on Payroll
+EARNING_FIELDS = {
+    'HRA': 'house_rent_allowance',
+    'CA': 'conveyance_allowance',
+    'MA': 'medical_allowance',
+    'SA': 'special_allowance',
+}
+DEDUCTION_FIELDS = {
+    'PF': 'provident_fund',
+    'PT': 'professional_tax',
+    'IT': 'income_tax',
+}
+
+
+def calculate_attendance(payroll, summary=None):
+    """Fill the attendance counts and overtime of an unsaved payroll from its period.
+
+    ``summary`` is the employee's AttendanceSummary when the caller has
+    already aggregated the whole period (see period_attendance); otherwise
+    it is read for this employee alone.
+    """
+    period = payroll.payroll_period
+    if summary is None:
+        summary = period_attendance(period, [payroll.employee_id]).get(payroll.employee_id, NO_ATTENDANCE)
+
+    payroll.total_working_days = (period.end_date - period.start_date).days + 1
+    payroll.present_days = summary.present
+    payroll.absent_days = summary.absent
+    payroll.leave_days = summary.leave
+    payroll.holiday_days = summary.holiday
+    payroll.attendance = summary  # half days and overtime hours, for formulas
+
+    # Overtime at 1.5x the hourly rate (22 working days, 8 hours/day)
+    hourly_rate = payroll.salary_structure.basic_salary / (22 * 8)
+    payroll.overtime_amount = Decimal(str(summary.overtime_hours)) * hourly_rate * Decimal('1.5')
+
+
+def component_formula(component, component_value):
+    """Formula text for a formula-type component: the structure's own, else the component's"""
+    if component.calculation_type != 'formula':
+        return None
+    return (component_value.formula or '').strip() or (component.formula or '').strip() or None
+
+
+def earlier_names(component):
+    """Formula names of every component calculated before ``component`` (by priority, then pk).
+
+    ``component`` may be unsaved, e.g. while its form is validated: it
+    then comes after the existing components of the same priority.
+    """
+    same_priority = Q(priority=component.priority)
+    if component.pk:
+        same_priority &= Q(pk__lt=component.pk)
+    earlier = PayrollComponent.objects.filter(Q(priority__lt=component.priority) | same_priority)
+    if component.code:
+        earlier = earlier.exclude(code=component.code)
+    return {variable_name(code) for code in earlier.values_list('code', flat=True)}
+
+
+def fill_missing(component, formula, variables, earlier):
+    """Set the names ``formula`` uses but ``variables`` lacks to 0, if they may be.
+
+    A component calculated before this one that is not in the employee's
+    structure pays 0; any other name (a typo, a deleted component, one
+    calculated later) raises FormulaError. ``earlier`` caches
+    earlier_names per component id across calls.
+    """
+    for name in formula.names:
+        if name in variables:
+            continue
+        if component.pk not in earlier:
+            earlier[component.pk] = earlier_names(component)
+        if name in VARIABLES or name not in earlier[component.pk]:
+            raise FormulaError(
+                f'{component.code}: "{name}" is neither a variable nor a component calculated before it'
+            )
+        variables[name] = ZERO
+
+
+def _component_amount(payroll, component, component_value, variables):
+    if component.calculation_type == 'percentage':
+        return payroll.basic_salary * (component_value.percentage / 100)
+    formula = component_formula(component, component_value)
+    if formula:
+        formula = compile_formula(formula)
+        fill_missing(component, formula, variables, {})
+        return formula.evaluate(variables)
+    return component_value.amount
+
+
+def _deduction_component(code, name):
+    return PayrollComponent.objects.get_or_create(
+        code=code,
+        defaults={
+            'name': name,
+            'component_type': 'deduction',
+            'calculation_type': 'fixed',
+            'is_taxable': False
+        }
+    )[0]
+
+
+def period_installments(period, employee_ids):
+    """The installment due in ``period`` of each active loan of ``employee_ids``, in one query.
+
+    Only the first unpaid installment per loan counts, in loan order. The
+    lookup runs on the (status, due_date) index of LoanInstallment.
+    """
+    first = {}
+    for installment in LoanInstallment.objects.filter(
+        status__in=['pending', 'due'], due_date__range=[period.start_date, period.end_date],
+        loan__employee_id__in=employee_ids, loan__status='active'
+    ).select_related('loan').order_by('loan_id', 'installment_number'):
+        first.setdefault(installment.loan_id, installment)
+    return list(first.values())
+
+
+def calculate_salary(payroll):
+    """Work out the salary of an unsaved payroll from its structure and attendance.
+
+    Sets the earning/deduction columns and totals on ``payroll`` and returns
+    (items, advances): unsaved PayrollItem rows (without ``payroll`` set)
+    and the SalaryAdvance rows whose remaining amount was reduced. Saving
+    them is left to the caller, so batches can be written in bulk.
+    """
+    structure = payroll.salary_structure
+
+    # Basic salary prorated on attendance, half pay for leave days
+    daily_rate = structure.basic_salary / payroll.total_working_days
+    payable_days = payroll.present_days + payroll.holiday_days + (payroll.leave_days * Decimal('0.5'))
+    payroll.basic_salary = daily_rate * payable_days
+
+    # Components in priority order, so a formula can use the ones before it
+    values = sorted(
+        structure.components.select_related('component'),
+        key=lambda v: (v.component.priority, v.component.pk)
+    )
+    variables = payroll_variables(payroll)
+    items = []
+    for component_value in values:
+        component = component_value.component
+        if component.component_type not in ('earning', 'deduction'):
+            continue
+        amount = _component_amount(payroll, component, component_value, variables)
+        variables[variable_name(component.code)] = amount
+
+        if component.component_type == 'earning':
+            field = EARNING_FIELDS.get(component.code)
+            if field:
+                setattr(payroll, field, amount)
+            else:
+                payroll.other_earnings += amount
+        else:
+            field = DEDUCTION_FIELDS.get(component.code)
+            if field:
+                setattr(payroll, field, amount)
+            else:
+                payroll.other_deductions += amount
+
+        items.append(PayrollItem(
+            component=component,
+            amount=amount,
+            calculation_note=f"{component.calculation_type} calculation"
+        ))
+
+    for installment in period_installments(payroll.payroll_period, [payroll.employee_id]):
+        loan = installment.loan
+        payroll.loan_deduction += installment.total_amount
+        items.append(PayrollItem(
+            component=_deduction_component(f'LOAN-{loan.loan_number}', f'Loan Deduction - {loan.loan_number}'),
+            amount=installment.total_amount,
+            calculation_note=f"Loan installment #{installment.installment_number}"
+        ))
+
+    advances = []
+    for advance in SalaryAdvance.objects.filter(
+        employee=payroll.employee, status='disbursed', remaining_amount__gt=0
+    ):
+        deduction_amount = min(advance.monthly_deduction, advance.remaining_amount)
+        payroll.advance_deduction += deduction_amount
+        advance.remaining_amount -= deduction_amount
+        if advance.remaining_amount <= 0:
+            advance.status = 'repaid'
+        advances.append(advance)
+        items.append(PayrollItem(
+            component=_deduction_component(f'ADV-{advance.advance_number}', f'Advance Deduction - {advance.advance_number}'),
+            amount=deduction_amount,
+            calculation_note="Salary advance repayment"
+        ))
+
+    payroll.status = 'calculated'
+    payroll.calculate_totals()
+    return items, advances
+
+
+def save_calculated(payroll, items, advances):
+    """Persist a payroll computed by calculate_salary, with its items and advances"""
+    with transaction.atomic():
+        payroll.save()
+        for item in items:
+            item.payroll = payroll
+        PayrollItem.objects.bulk_create(items)
+        for advance in advances:
+            advance.save(update_fields=['remaining_amount', 'status'])
@@ -5,6 +5,8 @@ from .models import (
     PayrollPeriod, Payroll, PayrollRun, Loan, SalaryAdvance
 )
 from hr.models import Employee, Department
+from .calculation import earlier_names
+from .formulas import validate_formula
 
 class PayrollComponentForm(forms.ModelForm):
     class Meta:
@@ -14,6 +16,18 @@ class PayrollComponentForm(forms.ModelForm):
             'formula': forms.Textarea(attrs={'rows': 3}),
             'notes': forms.Textarea(attrs={'rows': 2}),
         }
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        # The formula may use the components calculated before this one
+        component = PayrollComponent(
+            pk=self.instance.pk, code=cleaned_data.get('code'), priority=cleaned_data.get('priority') or 0
+        )
+        try:
+            validate_formula(cleaned_data.get('formula'), earlier_names(component))
+        except forms.ValidationError as e:
+            self.add_error('formula', e)
+        return cleaned_data
 
 class EmployeeSalaryStructureForm(forms.ModelForm):
     class Meta:
@@ -34,6 +48,15 @@ class SalaryComponentValueForm(forms.ModelForm):
     class Meta:
         model = SalaryComponentValue
         fields = ['component', 'amount', 'percentage', 'formula']
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        component = cleaned_data.get('component')
+        try:
+            validate_formula(cleaned_data.get('formula'), earlier_names(component) if component else None)
+        except forms.ValidationError as e:
+            self.add_error('formula', e)
+        return cleaned_data
 
 SalaryComponentValueFormSet = inlineformset_factory(
     EmployeeSalaryStructure,
@@ -79,10 +102,13 @@ class PayrollForm(forms.ModelForm):
 class PayrollRunForm(forms.ModelForm):
     class Meta:
         model = PayrollRun
-        fields = ['run_type', 'payroll_period', 'department', 'notes']
+        fields = ['run_type', 'payroll_period', 'department', 'chunk_size', 'notes']
         widgets = {
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
+        help_texts = {
+            'chunk_size': 'Employees saved per batch; a failed run resumes from the last saved batch.',
+        }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -95,10 +121,10 @@ class LoanForm(forms.ModelForm):
     class Meta:
         model = Loan
         fields = ['employee', 'loan_type', 'loan_amount', 'interest_rate', 
-                  'tenure_months', 'start_date', 'end_date', 'notes']
+                  'tenure_months', 'start_date', 'notes']
+        labels = {'start_date': 'First installment due'}
         widgets = {
             'start_date': forms.DateInput(attrs={'type': 'date'}),
-            'end_date': forms.DateInput(attrs={'type': 'date'}),
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
     
@@ -107,6 +133,12 @@ class LoanForm(forms.ModelForm):
         # Filter only active employees
         self.fields['employee'].queryset = Employee.objects.filter(employment_status='active')
 
+    def clean_tenure_months(self):
+        tenure = self.cleaned_data.get('tenure_months')
+        if tenure is not None and tenure < 1:
+            raise forms.ValidationError('Tenure must be at least one month.')
+        return tenure
+
 class SalaryAdvanceForm(forms.ModelForm):
     class Meta:
         model = SalaryAdvance
@@ -0,0 +1,214 @@
+import ast
+import re
+from decimal import ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_UP, Decimal, DecimalException
+from functools import lru_cache
+from django.core.exceptions import ValidationError
+
+ZERO = Decimal('0')
+
+# Variables every formula can use; component codes (HRA, PF, ...) are available too
+VARIABLES = {
+    'BASIC': 'Basic salary for the period, after attendance proration',
+    'STRUCTURE_BASIC': 'Monthly basic salary from the salary structure',
+    'CTC': 'Cost to company from the salary structure',
+    'WORKING_DAYS': 'Calendar days in the payroll period',
+    'PRESENT_DAYS': 'Days marked present',
+    'ABSENT_DAYS': 'Days marked absent',
+    'LEAVE_DAYS': 'Days on leave',
+    'HOLIDAY_DAYS': 'Holidays',
+    'HALF_DAYS': 'Half days',
+    'OT_HOURS': 'Overtime hours',
+    'OT_AMOUNT': 'Overtime pay',
+}
+
+
+_QUANTUMS = [Decimal(1).scaleb(-places) for places in range(10)]
+
+
+def _decimal(value):
+    return value if value.__class__ is Decimal else Decimal(value)
+
+
+def _round(value, places=0):
+    places = int(places)
+    quantum = _QUANTUMS[places] if 0 <= places < 10 else Decimal(1).scaleb(-places)
+    return _decimal(value).quantize(quantum, ROUND_HALF_UP)
+
+
+def _floor(value):
+    return _decimal(value).to_integral_value(ROUND_FLOOR)
+
+
+def _ceil(value):
+    return _decimal(value).to_integral_value(ROUND_CEILING)
+
+
+FUNCTIONS = {
+    'MIN': min,
+    'MAX': max,
+    'ABS': abs,
+    'ROUND': _round,
+    'FLOOR': _floor,
+    'CEIL': _ceil,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call,
+    ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod, ast.FloorDiv, ast.USub, ast.UAdd,
+    ast.And, ast.Or, ast.Not, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+_NAME = re.compile(r'^[A-Z][A-Z0-9_]*$')
+
+
+class FormulaError(ValueError):
+    pass
+
+
+def variable_name(code):
+    """Name a component's value goes by in formulas: its code, upper-cased, as an identifier"""
+    return re.sub(r'\W', '_', code.upper())
+
+
+class Formula:
+    """A payroll formula, checked against a small whitelist and compiled once.
+
+    Formulas are Python-style expressions over the VARIABLES and earlier
+    component codes, e.g. ``MIN(BASIC * 0.12, 1800)`` or
+    ``OT_HOURS * STRUCTURE_BASIC / 176 * 2 if OT_HOURS > 8 else 0``.
+    Names are case-insensitive and numbers are Decimals. Only arithmetic,
+    comparisons, ``and``/``or``/``not``, ``x if c else y`` and FUNCTIONS
+    are allowed. No attribute access, subscripts or other builtins.
+
+    The expression compiles into a list comprehension over one column per
+    variable, so evaluating it for thousands of employees is a single call.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise FormulaError(f'Invalid formula: {e.msg}')
+
+        constants = {}
+        names = []
+        functions = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise FormulaError(f'"{type(node).__name__}" is not allowed in formulas')
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id.upper() not in FUNCTIONS or node.keywords:
+                    raise FormulaError('Only MIN, MAX, ABS, ROUND, FLOOR and CEIL can be called')
+                functions.add(node.func)
+            elif isinstance(node, ast.Name) and node not in functions:
+                if not _NAME.match(node.id.upper()):
+                    raise FormulaError(f'Invalid name "{node.id}"')
+                node.id = node.id.upper()
+                if node.id not in names:
+                    names.append(node.id)
+            elif isinstance(node, ast.Constant):
+                if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                    raise FormulaError('Only numbers can be used as constants')
+                # Numbers become Decimal constants, so results match the rest of payroll
+                constants.setdefault(repr(node.value), f'_c{len(constants)}')
+        for node in functions:
+            # Internal names start with an underscore, which user names cannot
+            node.id = '_' + node.id.upper()
+        self.names = names
+
+        namespace = {'__builtins__': {}, 'zip': zip}
+        namespace.update((f'_{name}', func) for name, func in FUNCTIONS.items())
+        namespace.update((alias, Decimal(literal)) for literal, alias in constants.items())
+        body = _Constants(constants).visit(tree.body)
+
+        # lambda _columns: [<body> for (NAME, ...) in zip(*_columns)]
+        target = ast.Tuple(elts=[ast.Name(id=n, ctx=ast.Store()) for n in names] or [ast.Name(id='_row', ctx=ast.Store())], ctx=ast.Store())
+        loop = ast.comprehension(
+            target=target,
+            iter=ast.Call(func=ast.Name(id='zip', ctx=ast.Load()),
+                          args=[ast.Starred(value=ast.Name(id='_columns', ctx=ast.Load()), ctx=ast.Load())], keywords=[]),
+            ifs=[], is_async=0
+        )
+        function = ast.Lambda(
+            args=ast.arguments(posonlyargs=[], args=[ast.arg(arg='_columns')], kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=ast.ListComp(elt=body, generators=[loop])
+        )
+        code = compile(ast.fix_missing_locations(ast.Expression(body=function)), '<formula>', 'eval')
+        self._function = eval(code, namespace)
+
+    def evaluate_many(self, columns, count):
+        """Results for ``count`` rows; ``columns`` maps each name in ``self.names`` to a list of values"""
+        args = [columns[name] for name in self.names] or [[None] * count]
+        try:
+            return [value if value.__class__ is Decimal else Decimal(value) for value in self._function(args)]
+        except (ArithmeticError, DecimalException, TypeError) as e:
+            # Find the first row that fails, for the error message
+            for row in range(count):
+                try:
+                    self._function([[column[row]] for column in args])
+                except (ArithmeticError, DecimalException, TypeError):
+                    raise FormulaError(f'Formula "{self.text}" failed on row {row}: {e!r}', row)
+            raise FormulaError(f'Formula "{self.text}" failed: {e!r}')
+
+    def evaluate(self, variables):
+        """Result for one set of variables, which must hold every name the formula uses"""
+        for name in self.names:
+            if name not in variables:
+                raise FormulaError(f'Formula "{self.text}" uses unknown name "{name}"')
+        return self.evaluate_many({name: [variables[name]] for name in self.names}, 1)[0]
+
+
+class _Constants(ast.NodeTransformer):
+    def __init__(self, constants):
+        self.constants = constants
+
+    def visit_Constant(self, node):
+        return ast.copy_location(ast.Name(id=self.constants[repr(node.value)], ctx=ast.Load()), node)
+
+
+@lru_cache(maxsize=512)
+def compile_formula(text):
+    """Parsed and compiled Formula for ``text``, cached by its source"""
+    return Formula(text)
+
+
+def validate_formula(text, names=None):
+    """Form/model validator: the formula must parse and use known functions only.
+
+    With ``names`` (the components calculated before this one, see
+    calculation.earlier_names) it may only use those and the VARIABLES,
+    so a typo or a component calculated later is caught here instead of
+    paying 0.
+    """
+    if text and text.strip():
+        try:
+            formula = compile_formula(text)
+        except FormulaError as e:
+            raise ValidationError(str(e))
+        for name in formula.names:
+            if names is not None and name not in VARIABLES and name not in names:
+                raise ValidationError(
+                    f'Unknown name "{name}": use a variable or the code of a component calculated before this one.'
+                )
+
+
+def payroll_variables(payroll):
+    """Formula variables for an unsaved payroll whose attendance and basic are set"""
+    from .attendance import NO_ATTENDANCE
+    attendance = getattr(payroll, 'attendance', None) or NO_ATTENDANCE
+    structure = payroll.salary_structure
+    # Everything is a Decimal, so PRESENT_DAYS / WORKING_DAYS never turns into a float
+    return {
+        'BASIC': Decimal(payroll.basic_salary),
+        'STRUCTURE_BASIC': Decimal(structure.basic_salary),
+        'CTC': Decimal(structure.total_ctc),
+        'WORKING_DAYS': Decimal(payroll.total_working_days),
+        'PRESENT_DAYS': Decimal(payroll.present_days),
+        'ABSENT_DAYS': Decimal(payroll.absent_days),
+        'LEAVE_DAYS': Decimal(payroll.leave_days),
+        'HOLIDAY_DAYS': Decimal(payroll.holiday_days),
+        'HALF_DAYS': Decimal(attendance.half_day),
+        'OT_HOURS': Decimal(attendance.overtime_hours),
+        'OT_AMOUNT': Decimal(payroll.overtime_amount),
+    }
@@ -0,0 +1,226 @@
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
+from .calculation import period_installments
+from .models import Loan, LoanInstallment
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+TWELVE_HUNDRED = Decimal('1200')
+UNPAID = ['pending', 'due', 'overdue']
+BATCH_SIZE = 1000
+
+
+def _money(value):
+    return value.quantize(CENT, ROUND_HALF_UP)
+
+
+def monthly_rate(annual_rate):
+    """Monthly interest rate for an annual percentage, e.g. 12 -> 0.01"""
+    return Decimal(annual_rate) / TWELVE_HUNDRED
+
+
+def emis(principals, rates, tenures):
+    """Equated monthly installments for columns of principal, monthly rate and months"""
+    result = []
+    for principal, rate, months in zip(principals, rates, tenures):
+        if months <= 0:
+            raise ValueError('Loan tenure must be at least one month')
+        if rate:
+            factor = (1 + rate) ** months
+            result.append(_money(principal * rate * factor / (factor - 1)))
+        else:
+            result.append(_money(principal / months))
+    return result
+
+
+def amortize(principals, rates, installments, tenures=None):
+    """Principal/interest split of every installment, for many loans at once.
+
+    Columns run in parallel: ``principals`` (outstanding balance), monthly
+    ``rates`` and fixed ``installments`` (EMI). Each month is computed
+    across all loans still open. Interest is charged on the balance and
+    rounded to the paisa, the rest of the EMI repays principal. The last
+    installment clears the balance, so rounding never leaves a remainder.
+    With ``tenures`` a loan is also cleared at its last month; without,
+    it runs until the balance is repaid.
+
+    Returns one list of (principal, interest) per loan.
+    """
+    balances = [Decimal(p) for p in principals]
+    schedules = [[] for _ in balances]
+    open_loans = [i for i, balance in enumerate(balances) if balance > 0]
+    for i in open_loans:
+        if rates[i] and installments[i] <= _money(balances[i] * rates[i]):
+            raise ValueError(f'Installment {installments[i]} does not cover the interest on {balances[i]}')
+
+    month = 0
+    while open_loans:
+        month += 1
+        interest = [_money(balances[i] * rates[i]) for i in open_loans]
+        still_open = []
+        for i, charged in zip(open_loans, interest):
+            principal = installments[i] - charged
+            last = tenures is not None and month >= tenures[i]
+            if last or principal >= balances[i]:
+                principal = balances[i]
+            balances[i] -= principal
+            schedules[i].append((principal, charged))
+            if balances[i] > 0:
+                still_open.append(i)
+        open_loans = still_open
+    return schedules
+
+
+def loan_installments(loan, schedule, first_number=1, first_due=None):
+    """Unsaved LoanInstallment rows for ``schedule``, due monthly from ``first_due``"""
+    first_due = first_due or loan.start_date
+    return [
+        LoanInstallment(
+            loan=loan, installment_number=first_number + month,
+            due_date=first_due + relativedelta(months=month),
+            principal_amount=principal, interest_amount=interest, total_amount=principal + interest,
+        )
+        for month, (principal, interest) in enumerate(schedule)
+    ]
+
+
+def _apply(loan, schedule):
+    """Set the derived loan fields from its full schedule"""
+    loan.principal_balance = sum((principal for principal, _ in schedule), ZERO)
+    loan.interest_balance = sum((interest for _, interest in schedule), ZERO)
+    loan.end_date = loan.start_date + relativedelta(months=len(schedule) - 1)
+
+
+def prepare_loans(loans):
+    """Compute EMI, balances and end date of (unsaved) loans; returns their schedules"""
+    rates = [monthly_rate(loan.interest_rate) for loan in loans]
+    tenures = [loan.tenure_months for loan in loans]
+    principals = [Decimal(loan.loan_amount) for loan in loans]
+    installments = emis(principals, rates, tenures)
+    schedules = amortize(principals, rates, installments, tenures)
+    for loan, emi, schedule in zip(loans, installments, schedules):
+        loan.emi_amount = emi
+        _apply(loan, schedule)
+    return schedules
+
+
+def create_schedules(loans):
+    """(Re)build the full installment schedule of saved ``loans``.
+
+    Amounts are computed for all loans together. Rows go in through
+    executemany: a few thousand loans make hundreds of thousands of
+    installments, where building model instances for bulk_create costs
+    far more than the inserts themselves. Returns the number of
+    installments created.
+    """
+    ops = connection.ops
+    schedules = prepare_loans(loans)
+    due_dates = {}
+    rows = []
+    for loan, schedule in zip(loans, schedules):
+        # Loans starting together share their due dates
+        dates = due_dates.get(loan.start_date, ())
+        if len(dates) < len(schedule):
+            dates = due_dates[loan.start_date] = [
+                ops.adapt_datefield_value(loan.start_date + relativedelta(months=month))
+                for month in range(len(schedule))
+            ]
+        # Amounts are already rounded to the paisa, so the driver takes the Decimals as they are
+        rows.extend(
+            (loan.pk, month + 1, dates[month], principal, interest, principal + interest, 'pending', 0)
+            for month, (principal, interest) in enumerate(schedule)
+        )
+    updates = [
+        (loan.emi_amount, loan.principal_balance, loan.interest_balance,
+         ops.adapt_datefield_value(loan.end_date), loan.pk)
+        for loan in loans
+    ]
+
+    installments = ops.quote_name(LoanInstallment._meta.db_table)
+    insert = (
+        f"INSERT INTO {installments} (loan_id, installment_number, due_date, principal_amount, "
+        f"interest_amount, total_amount, status, paid_amount) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+    )
+    update = (
+        f"UPDATE {ops.quote_name(Loan._meta.db_table)} SET emi_amount = %s, principal_balance = %s, "
+        f"interest_balance = %s, end_date = %s WHERE id = %s"
+    )
+    loan_ids = [loan.pk for loan in loans]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(loan_ids), BATCH_SIZE):
+            LoanInstallment.objects.filter(loan_id__in=loan_ids[start:start + BATCH_SIZE]).delete()
+        for start in range(0, len(rows), 10000):
+            cursor.executemany(insert, rows[start:start + 10000])
+        cursor.executemany(update, updates)
+    return len(rows)
+
+
+def prepay(loan, amount, reduce='tenure', on_date=None):
+    """Apply a part prepayment and recompute the unpaid part of the schedule.
+
+    ``amount`` comes off the outstanding principal. With ``reduce='tenure'``
+    the EMI stays and the loan ends earlier; with ``reduce='emi'`` the
+    number of remaining installments stays and the EMI drops. A prepayment
+    covering the whole balance closes the loan.
+    """
+    amount = _money(Decimal(amount))
+    on_date = on_date or date.today()
+    with transaction.atomic():
+        loan = Loan.objects.select_for_update().get(pk=loan.pk)
+        unpaid = list(loan.installments.filter(status__in=UNPAID).order_by('installment_number'))
+        outstanding = sum((i.principal_amount for i in unpaid), ZERO)
+        if amount <= 0 or amount > outstanding:
+            raise ValueError(f'Prepayment must be between 0 and the outstanding principal {outstanding}')
+
+        balance = outstanding - amount
+        rate = monthly_rate(loan.interest_rate)
+        if balance == 0:
+            schedule = []
+        elif reduce == 'emi':
+            loan.emi_amount = emis([balance], [rate], [len(unpaid)])[0]
+            schedule = amortize([balance], [rate], [loan.emi_amount], [len(unpaid)])[0]
+        else:
+            schedule = amortize([balance], [rate], [loan.emi_amount])[0]
+
+        first = unpaid[0]
+        loan.installments.filter(pk__in=[i.pk for i in unpaid]).delete()
+        LoanInstallment.objects.bulk_create(
+            loan_installments(loan, schedule, first.installment_number, first.due_date), batch_size=BATCH_SIZE
+        )
+
+        loan.principal_balance = balance
+        loan.interest_balance = sum((interest for _, interest in schedule), ZERO)
+        if schedule:
+            loan.end_date = first.due_date + relativedelta(months=len(schedule) - 1)
+        else:
+            loan.status = 'closed'
+            loan.end_date = on_date
+        loan.notes = f'{loan.notes}\nPrepaid {amount} on {on_date}'.strip()
+        loan.save()
+    return loan
+
+
+def settle_installments(payroll):
+    """Mark the loan installments deducted in ``payroll`` as paid and reduce the loan balances"""
+    period = payroll.payroll_period
+    installments = period_installments(period, [payroll.employee_id])
+    if not installments:
+        return []
+    paid_date = payroll.payment_date or period.end_date
+    loans = []
+    with transaction.atomic():
+        for installment in installments:
+            installment.status = 'paid'
+            installment.paid_amount = installment.total_amount
+            installment.paid_date = paid_date
+            loan = installment.loan
+            loan.principal_balance -= installment.principal_amount
+            loan.interest_balance -= installment.interest_amount
+            if loan.principal_balance <= 0:
+                loan.status = 'closed'
+            loans.append(loan)
+        LoanInstallment.objects.bulk_update(installments, ['status', 'paid_amount', 'paid_date'])
+        Loan.objects.bulk_update(loans, ['principal_balance', 'interest_balance', 'status'])
+    return installments
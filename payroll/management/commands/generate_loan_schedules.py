@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from payroll.loans import create_schedules
+from payroll.models import Loan
+
+BATCH = 2000
+
+
+class Command(BaseCommand):
+    help = 'Build the amortization schedules of loans that have no installments yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild every loan without paid installments, not just loans without a schedule')
+
+    def handle(self, *args, **options):
+        loans = Loan.objects.exclude(status__in=['rejected', 'closed'])
+        if options['all']:
+            loans = loans.exclude(installments__status__in=['paid', 'partial'])
+        else:
+            loans = loans.filter(installments__isnull=True)
+        ids = list(loans.order_by('pk').values_list('pk', flat=True).distinct())
+
+        started = time.perf_counter()
+        created = 0
+        for start in range(0, len(ids), BATCH):
+            created += create_schedules(list(Loan.objects.filter(pk__in=ids[start:start + BATCH]).order_by('pk')))
+        self.stdout.write(self.style.SUCCESS(
+            f'Scheduled {len(ids)} loans ({created} installments) in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from payroll.models import PayrollPeriod, PayrollRun
+from payroll.payslips import generate_payslips, period_payrolls, run_payrolls
+
+
+class Command(BaseCommand):
+    help = 'Render the PDF payslips of a payroll period or run across a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', type=int, help='PayrollPeriod id')
+        parser.add_argument('--run', type=int, help='PayrollRun id')
+        parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        if options['run']:
+            payrolls = run_payrolls(PayrollRun.objects.select_related('payroll_period').get(pk=options['run']))
+        elif options['period']:
+            payrolls = period_payrolls(PayrollPeriod.objects.get(pk=options['period']))
+        else:
+            raise CommandError('Give --period or --run.')
+
+        count, seconds, workers = generate_payslips(payrolls, workers=options['workers'])
+        if not count:
+            self.stdout.write('No payrolls to render.')
+            return
+        rate = count / seconds
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {count} payslips in {seconds:.1f}s with {workers} worker(s): '
+            f'{rate:.0f}/s, {rate / workers:.0f}/s per core.'
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrollrun',
+            name='chunk_size',
+            field=models.PositiveIntegerField(default=200),
+        ),
+        migrations.AddField(
+            model_name='payrollrun',
+            name='last_employee_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payroll', '0002_payrollrun_chunking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loaninstallment',
+            index=models.Index(fields=['status', 'due_date'], name='payroll_installment_due_idx'),
+        ),
+    ]
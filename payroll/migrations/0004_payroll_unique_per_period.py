@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 06:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hr', '0002_attendance_date_index'),
+        ('payroll', '0003_loaninstallment_due_index'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='payroll',
+            unique_together={('employee', 'payroll_period')},
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
 from core.models import TimeStampedModel
+from core.sequences import next_document_number
 from hr.models import Employee, Department, Attendance
 from datetime import datetime, date
 
@@ -165,17 +166,11 @@ class Payroll(TimeStampedModel):
     
     def save(self, *args, **kwargs):
         if not self.payroll_number:
-            year = timezone.now().year
-            month = timezone.now().month
-            last_payroll = Payroll.objects.filter(
-                payroll_number__startswith=f"PR-{year}-{month:02d}"
-            ).order_by('id').last()
-            
-            if last_payroll:
-                last_number = int(last_payroll.payroll_number.split('-')[-1])
-                self.payroll_number = f"PR-{year}-{month:02d}-{last_number + 1:05d}"
-            else:
-                self.payroll_number = f"PR-{year}-{month:02d}-00001"
+            now = timezone.now()
+            self.payroll_number = next_document_number(
+                'PR', year=now.year, month=now.month,
+                seed_from=(Payroll, 'payroll_number')
+            )
         
         # Auto-calculate totals
         self.calculate_totals()
@@ -212,6 +207,10 @@ class Payroll(TimeStampedModel):
         self.gross_salary = self.total_earnings
         self.net_salary = self.total_earnings - self.total_deductions
     
+    class Meta:
+        # One payroll per employee and period, however many runs cover them
+        unique_together = ['employee', 'payroll_period']
+    
     def __str__(self):
         return f"{self.payroll_number} - {self.employee.employee_id}"
 
@@ -260,6 +259,10 @@ class PayrollRun(TimeStampedModel):
     failed_employees = models.IntegerField(default=0)
     total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
     
+    # Employees are processed in pk order, one committed chunk at a time
+    chunk_size = models.PositiveIntegerField(default=200)
+    last_employee_id = models.BigIntegerField(default=0)  # resume point after a crash
+    
     # Audit
     started_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name='payroll_runs_started')
     completed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payroll_runs_completed')
@@ -271,19 +274,17 @@ class PayrollRun(TimeStampedModel):
     
     def save(self, *args, **kwargs):
         if not self.run_number:
-            year = timezone.now().year
-            last_run = PayrollRun.objects.filter(
-                run_number__startswith=f"RUN-{year}"
-            ).order_by('id').last()
-            
-            if last_run:
-                last_number = int(last_run.run_number.split('-')[-1])
-                self.run_number = f"RUN-{year}-{last_number + 1:05d}"
-            else:
-                self.run_number = f"RUN-{year}-00001"
+            self.run_number = next_document_number('RUN', seed_from=(PayrollRun, 'run_number'))
         
         super().save(*args, **kwargs)
     
+    @property
+    def progress(self):
+        """Percentage of employees handled so far"""
+        if not self.total_employees:
+            return 100 if self.status == 'completed' else 0
+        return round((self.processed_employees + self.failed_employees) * 100 / self.total_employees)
+    
     def __str__(self):
         return f"{self.run_number} - {self.get_run_type_display()}"
 
@@ -330,16 +331,7 @@ class Loan(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.loan_number:
-            year = timezone.now().year
-            last_loan = Loan.objects.filter(
-                loan_number__startswith=f"LN-{year}"
-            ).order_by('id').last()
-            
-            if last_loan:
-                last_number = int(last_loan.loan_number.split('-')[-1])
-                self.loan_number = f"LN-{year}-{last_number + 1:05d}"
-            else:
-                self.loan_number = f"LN-{year}-00001"
+            self.loan_number = next_document_number('LN', seed_from=(Loan, 'loan_number'))
         
         super().save(*args, **kwargs)
     
@@ -367,6 +359,10 @@ class LoanInstallment(models.Model):
     class Meta:
         ordering = ['installment_number']
         unique_together = ['loan', 'installment_number']
+        indexes = [
+            # Payroll looks up the installments due in a period for all employees at once
+            models.Index(fields=['status', 'due_date'], name='payroll_installment_due_idx'),
+        ]
     
     def __str__(self):
         return f"{self.loan.loan_number} - Installment {self.installment_number}"
@@ -392,16 +388,9 @@ class SalaryAdvance(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.advance_number:
-            year = timezone.now().year
-            last_advance = SalaryAdvance.objects.filter(
-                advance_number__startswith=f"ADV-{year}"
-            ).order_by('id').last()
-            
-            if last_advance:
-                last_number = int(last_advance.advance_number.split('-')[-1])
-                self.advance_number = f"ADV-{year}-{last_number + 1:05d}"
-            else:
-                self.advance_number = f"ADV-{year}-00001"
+            self.advance_number = next_document_number(
+                'ADV', seed_from=(SalaryAdvance, 'advance_number')
+            )
         
         super().save(*args, **kwargs)
     
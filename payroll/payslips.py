@@ -0,0 +1,207 @@
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from .models import Payroll, Payslip
+
+CHUNK_SIZE = 100
+
+# Columns a payslip needs, read with one joined query
+PAYSLIP_FIELDS = [
+    'id', 'payroll_number', 'employee__employee_id', 'employee__user__first_name',
+    'employee__user__last_name', 'payroll_period__name', 'basic_salary', 'total_earnings',
+    'total_deductions', 'net_salary',
+]
+
+
+def period_payrolls(period, department=None):
+    """Payrolls of a period, optionally for one department"""
+    payrolls = Payroll.objects.filter(payroll_period=period)
+    if department:
+        payrolls = payrolls.filter(employee__department=department)
+    return payrolls
+
+
+def run_payrolls(run):
+    """Payrolls a payroll run covers: its period, limited to its department for department runs"""
+    return period_payrolls(run.payroll_period, run.department if run.run_type == 'department' else None)
+
+
+def render_payslip(row):
+    """PDF bytes for one payslip; ``row`` is a dict of PAYSLIP_FIELDS"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    full_name = f"{row['employee__user__first_name']} {row['employee__user__last_name']}".strip()
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+
+    p.drawString(100, 750, f"PAYSLIP - {row['payroll_number']}")
+    p.drawString(100, 730, f"Employee: {full_name}")
+    p.drawString(100, 710, f"Employee ID: {row['employee__employee_id']}")
+    p.drawString(100, 690, f"Period: {row['payroll_period__name']}")
+
+    # Earnings
+    p.drawString(100, 650, "EARNINGS")
+    p.drawString(100, 630, f"Basic Salary: ${row['basic_salary']}")
+    p.drawString(100, 610, f"Allowances: ${row['total_earnings'] - row['basic_salary']}")
+
+    # Deductions
+    p.drawString(100, 570, "DEDUCTIONS")
+    p.drawString(100, 550, f"Total Deductions: ${row['total_deductions']}")
+
+    # Net Salary
+    p.drawString(100, 500, f"NET SALARY: ${row['net_salary']}")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def payslip_filename(payroll_number):
+    return f'payslip_{payroll_number}.pdf'
+
+
+def _render_chunk(rows, names):
+    """Render and store one chunk of payslips; runs in a pool worker.
+
+    Workers only touch file storage, never the database, so they are safe
+    to fork from a process holding DB connections.
+    """
+    from django.core.files.storage import default_storage
+    saved = []
+    for row, name in zip(rows, names):
+        saved.append((row['id'], default_storage.save(name, ContentFile(render_payslip(row)))))
+    return saved
+
+
+def _init_worker():
+    # Spawned (not forked) workers start without Django configured
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _store(saved):
+    """Point the payslips of ``saved`` [(payroll id, file name)] at their new files"""
+    ops = connection.ops
+    table = ops.quote_name(Payslip._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {table} SET pdf_file = %s WHERE payroll_id = %s',
+            [(name, payroll_id) for payroll_id, name in saved]
+        )
+
+
+def generate_payslips(payrolls, user=None, workers=None, progress=None):
+    """Render the PDF payslips of ``payrolls`` (a Payroll queryset) in bulk.
+
+    Payslip rows are created where missing, one bulk insert. Rows for the
+    PDFs are read with one joined query and rendered in chunks across a
+    process pool (``workers`` processes, default one per CPU). Each worker
+    writes its files straight to storage. The file names go back to the
+    database with one executemany per chunk. ``progress(done, total)`` is
+    called after each chunk.
+
+    Returns (count, seconds, workers).
+    """
+    from django.core.files.storage import default_storage
+
+    started = time.perf_counter()
+    payrolls = payrolls.order_by('pk')
+    Payslip.objects.bulk_create(
+        [Payslip(payroll_id=pk, generated_by=user)
+         for pk in payrolls.filter(payslip__isnull=True).values_list('pk', flat=True)],
+        batch_size=500
+    )
+    old_files = dict(
+        Payslip.objects.filter(payroll__in=payrolls).exclude(pdf_file='').values_list('payroll_id', 'pdf_file')
+    )
+    rows = list(payrolls.values(*PAYSLIP_FIELDS))
+    if not rows:
+        return 0, time.perf_counter() - started, 0
+
+    field = Payslip._meta.get_field('pdf_file')
+    names = [field.generate_filename(None, payslip_filename(row['payroll_number'])) for row in rows]
+    chunks = [
+        (rows[start:start + CHUNK_SIZE], names[start:start + CHUNK_SIZE])
+        for start in range(0, len(rows), CHUNK_SIZE)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+
+    done = 0
+
+    def finish(saved):
+        nonlocal done
+        _store(saved)
+        for payroll_id, name in saved:
+            old = old_files.get(payroll_id)
+            if old and old != name:
+                default_storage.delete(old)
+        done += len(saved)
+        if progress:
+            progress(done, len(rows))
+
+    if workers <= 1:
+        for chunk_rows, chunk_names in chunks:
+            finish(_render_chunk(chunk_rows, chunk_names))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for saved in pool.map(_render_chunk, *zip(*chunks)):
+                finish(saved)
+    return len(rows), time.perf_counter() - started, workers
+
+
+class _ZipStream:
+    """Write-only file object that hands zipfile's output over in pieces"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_payslip_zip(payrolls):
+    """Yield a ZIP of the stored payslip PDFs of ``payrolls``, one file at a time.
+
+    Only the file being added is held in memory, so the archive for a whole
+    month streams out without building it on disk first. PDFs are already
+    compressed, so they are stored rather than deflated.
+    """
+    from django.core.files.storage import default_storage
+
+    files = Payslip.objects.filter(payroll__in=payrolls).exclude(pdf_file='').order_by('payroll_id').values_list(
+        'payroll__payroll_number', 'pdf_file'
+    )
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for payroll_number, name in files.iterator(chunk_size=2000):
+            with default_storage.open(name, 'rb') as source, \
+                    archive.open(payslip_filename(payroll_number), 'w') as target:
+                while True:
+                    block = source.read(64 * 1024)
+                    if not block:
+                        break
+                    target.write(block)
+            yield stream.drain()
+    yield stream.drain()
+
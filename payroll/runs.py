@@ -0,0 +1,206 @@
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from core.sequences import next_document_numbers
+from hr.models import Employee
+from .attendance import NO_ATTENDANCE, period_attendance
+from .batch import SalaryBatch
+from .calculation import calculate_attendance
+from .models import Payroll, PayrollItem, PayrollRun, Payslip, SalaryAdvance
+from .summary import invalidate_payroll_summary
+
+BATCH_SIZE = 500
+PROCESS_TASK = 'payroll.process_run'
+
+
+def run_employees(run):
+    """Employees a payroll run covers"""
+    employees = Employee.objects.filter(employment_status='active', salary_structure__is_active=True)
+    if run.run_type == 'department' and run.department:
+        employees = employees.filter(department=run.department)
+    # company, branch and custom runs cover every active employee for now
+    return employees
+
+
+def active_task(run):
+    """The queued or running task processing ``run``, if any"""
+    from core.models import BackgroundTask
+    return BackgroundTask.objects.filter(
+        name=PROCESS_TASK, payload__run_id=run.pk, status__in=['queued', 'running']
+    ).first()
+
+
+def start_payroll_run(run):
+    """Queue a saved run for the background worker, or return the task already queued for it.
+
+    The queue never retries the task itself: a failed run is resumed on
+    request (resume_payroll_run), after its last committed chunk.
+    """
+    from core.tasks import enqueue
+    return active_task(run) or enqueue(PROCESS_TASK, {'run_id': run.pk}, max_attempts=1)
+
+
+def resume_payroll_run(run):
+    """Queue a failed run again; returns the task, or None if the run cannot be resumed.
+
+    A run left 'processing' by a worker that died (its task is no longer
+    queued or running) counts as failed.
+    """
+    if active_task(run):
+        return None
+    PayrollRun.objects.filter(pk=run.pk, status='processing').update(status='failed', updated_at=timezone.now())
+    if not PayrollRun.objects.filter(pk=run.pk, status='failed').exists():
+        return None
+    return start_payroll_run(run)
+
+
+def _new_payroll(run, employee, attendance):
+    payroll = Payroll(
+        employee=employee,
+        payroll_period=run.payroll_period,
+        salary_structure=employee.salary_structure,
+        created_by=run.started_by
+    )
+    calculate_attendance(payroll, attendance.get(employee.pk, NO_ATTENDANCE))
+    return payroll
+
+
+def _calculate_each(run, payrolls, attendance):
+    """Calculate ``payrolls`` one employee at a time, after their batch failed.
+
+    Each payroll is rebuilt from scratch, since the failed batch may have
+    filled it half way. Returns (payrolls, items, advances, error lines)
+    for the employees that could be calculated.
+    """
+    calculated, items, advances, errors = [], [], [], []
+    for payroll in payrolls:
+        employee = payroll.employee
+        try:
+            payroll = _new_payroll(run, employee, attendance)
+            payroll_items, payroll_advances = SalaryBatch(run.payroll_period, [payroll]).calculate()
+        except Exception as e:
+            errors.append(f"Error processing {employee.employee_id}: {e}")
+            continue
+        calculated.append(payroll)
+        items += payroll_items
+        advances += payroll_advances
+    return calculated, items, advances, errors
+
+
+def _process_chunk(run, employees, attendance):
+    """Calculate and bulk insert payrolls, items and payslips for one chunk of employees.
+
+    ``attendance`` is the period_attendance() mapping for the run.
+
+    Returns (processed, failed, net total, error lines).
+    """
+    period = run.payroll_period
+    existing = set(Payroll.objects.filter(
+        payroll_period=period, employee_id__in=[e.pk for e in employees]
+    ).values_list('employee_id', flat=True))
+
+    payrolls, errors = [], []
+    for employee in employees:
+        if employee.pk in existing:
+            errors.append(f"Payroll already exists for {employee.employee_id}")
+            continue
+        try:
+            payrolls.append(_new_payroll(run, employee, attendance))
+        except Exception as e:
+            errors.append(f"Error processing {employee.employee_id}: {e}")
+
+    if payrolls:
+        try:
+            items, advances = SalaryBatch(period, payrolls).calculate()
+        except Exception:
+            # Someone's data breaks the calculation: find out who, and only they fail
+            payrolls, items, advances, failures = _calculate_each(run, payrolls, attendance)
+            errors += failures
+
+    if payrolls:
+        now = timezone.now()
+        numbers = next_document_numbers(
+            'PR', len(payrolls), year=now.year, month=now.month,
+            seed_from=(Payroll, 'payroll_number')
+        )
+        for number, payroll in zip(numbers, payrolls):
+            payroll.payroll_number = number
+        Payroll.objects.bulk_create(payrolls, batch_size=BATCH_SIZE)
+        PayrollItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+        Payslip.objects.bulk_create(
+            [Payslip(payroll=payroll, generated_by=run.started_by) for payroll in payrolls],
+            batch_size=BATCH_SIZE
+        )
+        SalaryAdvance.objects.bulk_update(advances, ['remaining_amount', 'status'], batch_size=BATCH_SIZE)
+
+    total = sum((payroll.net_salary for payroll in payrolls), Decimal('0'))
+    return len(payrolls), len(errors), total, errors
+
+
+def process_payroll_run(run_id, heartbeat=None):
+    """Work through a payroll run in chunks of ``run.chunk_size`` employees.
+
+    Each chunk is one transaction that writes its payrolls, items and
+    payslips and moves the run's progress counters and resume point
+    (``last_employee_id``). A crash therefore loses at most the chunk in
+    flight, and running this again carries on after the last committed
+    chunk.
+
+    The run is claimed with a conditional UPDATE first, so only one worker
+    processes it; anyone else finds it processing (or completed) and
+    returns without touching it.
+    """
+    claimed = PayrollRun.objects.filter(pk=run_id, status__in=['pending', 'failed']).update(
+        status='processing', updated_at=timezone.now()
+    )
+    run = PayrollRun.objects.select_related('payroll_period', 'started_by').get(pk=run_id)
+    if not claimed:
+        return run
+    employees = run_employees(run).select_related('salary_structure').order_by('pk')
+
+    if not run.last_employee_id:
+        run.total_employees = employees.count()
+        run.save(update_fields=['total_employees', 'updated_at'])
+    # Attendance for the whole run in one grouped query
+    attendance = period_attendance(run.payroll_period, run_employees(run))
+
+    try:
+        while True:
+            with transaction.atomic():
+                chunk = list(employees.filter(pk__gt=run.last_employee_id)[:run.chunk_size])
+                if not chunk:
+                    break
+                processed, failed, total, errors = _process_chunk(run, chunk, attendance)
+                run.processed_employees += processed
+                run.failed_employees += failed
+                run.total_amount += total
+                run.last_employee_id = chunk[-1].pk
+                if errors:
+                    run.error_log += ''.join(f"\n{line}" for line in errors)
+                run.save(update_fields=[
+                    'processed_employees', 'failed_employees', 'total_amount',
+                    'last_employee_id', 'error_log', 'updated_at'
+                ])
+            if heartbeat:
+                heartbeat()
+    except Exception as e:
+        run.refresh_from_db()
+        run.status = 'failed'
+        run.error_log += f"\nRun failed: {e}"
+        run.save(update_fields=['status', 'error_log', 'updated_at'])
+        raise
+
+    with transaction.atomic():
+        run.status = 'completed'
+        run.completed_by = run.started_by
+        run.completed_at = timezone.now()
+        run.save(update_fields=['status', 'completed_by', 'completed_at', 'updated_at'])
+
+        period = run.payroll_period
+        period.is_processed = True
+        period.processed_by = run.started_by
+        period.processed_date = timezone.now()
+        period.save()
+    # Payrolls went in through bulk_create, which sends no signals
+    invalidate_payroll_summary(period.start_date.year)
+    return run
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from .models import Payroll
+from .summary import invalidate_payroll_summary
+
+
+def payroll_changed(sender, instance, **kwargs):
+    year = instance.payroll_period.start_date.year
+    # After commit, so a concurrent request can't re-cache the old figures
+    transaction.on_commit(lambda: invalidate_payroll_summary(year))
+
+
+post_save.connect(payroll_changed, sender=Payroll, dispatch_uid='payroll_summary_save')
+post_delete.connect(payroll_changed, sender=Payroll, dispatch_uid='payroll_summary_delete')
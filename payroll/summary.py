@@ -0,0 +1,81 @@
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from .models import Payroll
+
+PAYROLL_SUMMARY_KEY = 'payroll:summary:{year}'
+PAYROLL_TOTALS_KEY = 'payroll:summary:totals'
+
+
+def build_year_summary(year):
+    """Monthly and department figures for paid payrolls of ``year``, from one grouped query"""
+    rows = Payroll.objects.filter(
+        payroll_period__start_date__year=year, status='paid'
+    ).values(
+        'payroll_period__start_date__month', 'employee__department_id', 'employee__department__name'
+    ).annotate(total=Sum('net_salary'), count=Count('pk')).order_by()
+
+    months = {month: [0, 0] for month in range(1, 13)}
+    departments = {}
+    for row in rows:
+        total = row['total'] or 0
+        month = months[row['payroll_period__start_date__month']]
+        month[0] += total
+        month[1] += row['count']
+        department = departments.setdefault(
+            row['employee__department_id'], [row['employee__department__name'], 0, 0]
+        )
+        department[1] += total
+        department[2] += row['count']
+
+    return {
+        'monthly_summary': [
+            {'month': datetime(year, month, 1).strftime('%b'), 'amount': float(amount), 'count': count}
+            for month, (amount, count) in months.items()
+        ],
+        'department_summary': [
+            {'department': name, 'amount': float(amount), 'count': count}
+            for _, (name, amount, count) in sorted(departments.items())
+        ],
+    }
+
+
+def build_totals():
+    """All-time paid total and draft count, in one query"""
+    totals = Payroll.objects.aggregate(
+        total_paid=Sum('net_salary', filter=Q(status='paid')),
+        pending_payrolls=Count('pk', filter=Q(status='draft')),
+    )
+    return {
+        'total_paid': float(totals['total_paid'] or 0),
+        'pending_payrolls': totals['pending_payrolls'],
+    }
+
+
+def get_payroll_summary(year):
+    """Payroll summary for the dashboard, computed only on a cache miss.
+
+    Years before the current one no longer change in normal use, so they
+    are cached without expiry. The current year and the all-time totals
+    expire after PAYROLL_SUMMARY_TIMEOUT. Payroll writes invalidate the
+    affected year and the totals straight away (see signals.py).
+    """
+    key = PAYROLL_SUMMARY_KEY.format(year=year)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_year_summary(year)
+        closed = year < timezone.localdate().year
+        cache.set(key, summary, None if closed else getattr(settings, 'PAYROLL_SUMMARY_TIMEOUT', 300))
+
+    totals = cache.get(PAYROLL_TOTALS_KEY)
+    if totals is None:
+        totals = build_totals()
+        cache.set(PAYROLL_TOTALS_KEY, totals, getattr(settings, 'PAYROLL_SUMMARY_TIMEOUT', 300))
+    return {**summary, **totals}
+
+
+def invalidate_payroll_summary(*years):
+    """Drop the cached summaries of ``years`` and the all-time totals"""
+    cache.delete_many([PAYROLL_SUMMARY_KEY.format(year=year) for year in years] + [PAYROLL_TOTALS_KEY])
@@ -0,0 +1,21 @@
+from core.tasks import heartbeat, register
+from .payslips import generate_payslips, period_payrolls, run_payrolls
+from .runs import PROCESS_TASK, process_payroll_run
+
+
+@register(PROCESS_TASK)
+def process_run(task):
+    process_payroll_run(task.payload['run_id'], heartbeat=lambda: heartbeat(task))
+
+
+@register('payroll.generate_payslips')
+def generate_run_payslips(task):
+    from django.contrib.auth.models import User
+    from .models import PayrollPeriod, PayrollRun
+    payload = task.payload
+    if payload.get('run_id'):
+        payrolls = run_payrolls(PayrollRun.objects.select_related('payroll_period').get(pk=payload['run_id']))
+    else:
+        payrolls = period_payrolls(PayrollPeriod.objects.get(pk=payload['period_id']))
+    user = User.objects.filter(pk=payload.get('user_id')).first()
+    generate_payslips(payrolls, user=user, progress=lambda done, total: heartbeat(task))
@@ -1,3 +1,392 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from core.models import Department
+from hr.models import Attendance, Employee
+from .attendance import NO_ATTENDANCE, period_attendance
+from .batch import SalaryBatch
+from .calculation import calculate_attendance, calculate_salary
+from .forms import PayrollComponentForm
+from .formulas import ZERO, Formula, FormulaError, compile_formula
+from .loans import create_schedules, prepay
+from .payslips import generate_payslips, payslip_filename, period_payrolls, stream_payslip_zip
+from .models import (
+    EmployeeSalaryStructure, Loan, LoanInstallment, Payroll, PayrollComponent,
+    PayrollPeriod, PayrollRun, Payslip, SalaryAdvance, SalaryComponentValue
+)
+from .runs import process_payroll_run, resume_payroll_run, start_payroll_run
 
-# Create your tests here.
+PAYROLL_FIELDS = [
+    'total_working_days', 'present_days', 'absent_days', 'leave_days', 'holiday_days',
+    'basic_salary', 'house_rent_allowance', 'conveyance_allowance', 'medical_allowance',
+    'special_allowance', 'overtime_amount', 'bonus', 'other_earnings', 'total_earnings',
+    'provident_fund', 'professional_tax', 'income_tax', 'loan_deduction', 'advance_deduction',
+    'other_deductions', 'total_deductions', 'gross_salary', 'net_salary', 'status',
+]
+
+
+class SalaryBatchTest(TestCase):
+    """SalaryBatch must match the per-payroll calculation field for field"""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='Assembly', code='ASM')
+        cls.period = PayrollPeriod.objects.create(
+            name='March', start_date=date(2025, 3, 1), end_date=date(2025, 3, 31),
+            payment_date=date(2025, 4, 1), notes=''
+        )
+        components = [
+            PayrollComponent.objects.create(name='HRA', code='HRA', component_type='earning', calculation_type='percentage'),
+            PayrollComponent.objects.create(name='Conveyance', code='CA', component_type='earning', calculation_type='fixed'),
+            PayrollComponent.objects.create(name='Shift', code='SHIFT', component_type='earning', calculation_type='attendance'),
+            PayrollComponent.objects.create(name='PF', code='PF', component_type='deduction', calculation_type='percentage'),
+            PayrollComponent.objects.create(name='Canteen', code='CAN', component_type='deduction', calculation_type='fixed'),
+            PayrollComponent.objects.create(name='Gratuity', code='GRT', component_type='employer_contribution', calculation_type='fixed'),
+        ]
+        formulas = [
+            PayrollComponent.objects.create(
+                name='Overtime Premium', code='OT-P', component_type='earning', calculation_type='formula', priority=5,
+                formula='ROUND(OT_HOURS * STRUCTURE_BASIC / 176 * 0.5, 2)'
+            ),
+            PayrollComponent.objects.create(
+                name='Welfare', code='WEL', component_type='deduction', calculation_type='formula', priority=9,
+                formula='MIN(HRA * 0.0075 + BASIC * 0.01, 450) if present_days > 10 else OT_P / 3'
+            ),
+        ]
+        statuses = ['present', 'present', 'absent', 'leave', 'holiday', 'half_day', 'present']
+        cls.employees = []
+        for n in range(12):
+            user = User.objects.create(username=f'emp{n}')
+            employee = Employee.objects.create(
+                user=user, employee_id=f'EMP{n:03d}', department=department, designation='Operator',
+                employee_type='permanent', date_of_joining=date(2020, 1, 1), date_of_birth=date(1990, 1, 1),
+                gender='female', phone='1', address='-'
+            )
+            structure = EmployeeSalaryStructure.objects.create(
+                employee=employee, effective_from=date(2024, 1, 1), basic_salary=Decimal(23457 + n * 3011)
+            )
+            for index, component in enumerate(components[:3 + n % 4]):
+                SalaryComponentValue.objects.create(
+                    salary_structure=structure, component=component,
+                    amount=Decimal('1250.50') + index, percentage=Decimal('12.75') + n
+                )
+            for component in formulas:
+                SalaryComponentValue.objects.create(
+                    salary_structure=structure, component=component, amount=Decimal('75'),
+                    # A structure-level formula overrides the component's; a blank one falls back to it
+                    formula='FLOOR(PRESENT_DAYS / WORKING_DAYS * 1000)' if n % 5 == 2 else ''
+                )
+            # Employee 0 has no attendance at all
+            for day in range(n and 31):
+                if (day + n) % 5:
+                    Attendance.objects.create(
+                        employee=employee, date=cls.period.start_date + timedelta(days=day),
+                        status=statuses[(day * n) % len(statuses)], overtime_hours=Decimal('1.25') * (day % 3)
+                    )
+            if n % 3 == 0:
+                loan = Loan.objects.create(
+                    employee=employee, loan_type='personal', loan_amount=10000, interest_rate=9,
+                    tenure_months=10, emi_amount=1040, start_date=date(2025, 1, 1), end_date=date(2025, 10, 31),
+                    status='active', principal_balance=10000, interest_balance=400
+                )
+                for number in (3, 4):
+                    LoanInstallment.objects.create(
+                        loan=loan, installment_number=number, due_date=date(2025, 3, number * 5),
+                        principal_amount=1000, interest_amount=40 + number, total_amount=1040 + number
+                    )
+            if n % 4 == 1:
+                for remaining in ('700.00', '2400.00'):
+                    SalaryAdvance.objects.create(
+                        employee=employee, advance_amount=3000, requested_date=date(2025, 1, 1),
+                        monthly_deduction=Decimal('1000.00'), status='disbursed', remaining_amount=Decimal(remaining)
+                    )
+            cls.employees.append(employee)
+
+    def _payroll(self, employee):
+        return Payroll(
+            employee=employee, payroll_period=self.period,
+            salary_structure=EmployeeSalaryStructure.objects.get(employee=employee)
+        )
+
+    def test_matches_per_payroll_calculation(self):
+        expected = {}
+        for employee in self.employees:
+            payroll = self._payroll(employee)
+            calculate_attendance(payroll)
+            items, advances = calculate_salary(payroll)
+            expected[employee.pk] = (
+                payroll,
+                sorted((i.component.code, i.amount, i.calculation_note) for i in items),
+                sorted((a.pk, a.remaining_amount, a.status) for a in advances),
+            )
+
+        attendance = period_attendance(self.period)
+        payrolls = [self._payroll(employee) for employee in self.employees]
+        for payroll in payrolls:
+            calculate_attendance(payroll, attendance.get(payroll.employee_id, NO_ATTENDANCE))
+        with self.assertNumQueries(4):
+            batch = SalaryBatch(self.period, payrolls)
+        items, advances = batch.calculate()
+
+        for payroll in payrolls:
+            reference, reference_items, reference_advances = expected[payroll.employee_id]
+            for field in PAYROLL_FIELDS:
+                self.assertEqual(getattr(payroll, field), getattr(reference, field), field)
+            self.assertEqual(
+                sorted((i.component.code, i.amount, i.calculation_note) for i in items if i.payroll is payroll),
+                reference_items
+            )
+            self.assertEqual(
+                sorted((a.pk, a.remaining_amount, a.status) for a in advances if a.employee_id == payroll.employee_id),
+                reference_advances
+            )
+
+
+class FormulaTest(TestCase):
+
+    def test_evaluates_with_decimals(self):
+        formula = compile_formula('MAX(basic * 0.12, 100) + ROUND(OT_HOURS / 3, 2)')
+        self.assertEqual(formula.names, ['BASIC', 'OT_HOURS'])
+        self.assertEqual(formula.evaluate({'BASIC': Decimal('1000'), 'OT_HOURS': Decimal('1')}), Decimal('120.33'))
+        self.assertEqual(
+            formula.evaluate_many({'BASIC': [Decimal('10'), Decimal('2000')], 'OT_HOURS': [ZERO, ZERO]}, 2),
+            [Decimal('100'), Decimal('240.00')]
+        )
+
+    def test_rejects_unsafe_expressions(self):
+        for text in [
+            '__import__("os").system("true")', 'BASIC.__class__', '(lambda: 1)()', '[1][0]',
+            '_c0', 'open("x")', 'BASIC ** 99999', '"text"', 'MIN(x=1)',
+        ]:
+            with self.assertRaises(FormulaError, msg=text):
+                Formula(text)
+
+    def test_unknown_names_are_errors(self):
+        with self.assertRaises(FormulaError):
+            compile_formula('BASCI * 0.1').evaluate({'BASIC': Decimal('1000')})
+
+    def test_validation_allows_variables_and_earlier_components(self):
+        user = User.objects.create(username='hr')
+        PayrollComponent.objects.create(name='HRA', code='HRA', component_type='earning', priority=1)
+        PayrollComponent.objects.create(name='Bonus', code='BON', component_type='earning', priority=5)
+        form = PayrollComponentForm(data={
+            'name': 'Welfare', 'code': 'WEL', 'component_type': 'deduction', 'calculation_type': 'formula',
+            'value': 0, 'priority': 3, 'formula': 'HRA * 0.01 + BASIC * 0.02',
+            'created_by': user.pk, 'updated_by': user.pk,
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        for formula in ['BASCI * 0.02', 'BON * 0.1']:
+            form = PayrollComponentForm(data=dict(form.data, formula=formula))
+            self.assertFalse(form.is_valid())
+            self.assertIn('formula', form.errors)
+
+    def test_reports_the_failing_row(self):
+        formula = compile_formula('BASIC / PRESENT_DAYS')
+        with self.assertRaises(FormulaError) as context:
+            formula.evaluate_many({'BASIC': [Decimal(1), Decimal(1)], 'PRESENT_DAYS': [Decimal(1), ZERO]}, 2)
+        self.assertEqual(context.exception.args[1], 1)
+
+
+class LoanScheduleTest(TestCase):
+
+    def setUp(self):
+        employee = Employee.objects.create(
+            user=User.objects.create(username='borrower'), employee_id='EMP900',
+            department=Department.objects.create(name='Stores', code='STR'), designation='Clerk',
+            employee_type='permanent', date_of_joining=date(2020, 1, 1), date_of_birth=date(1990, 1, 1),
+            gender='male', phone='1', address='-'
+        )
+        self.loan = Loan.objects.create(
+            employee=employee, loan_type='personal', loan_amount=Decimal('100000'), interest_rate=Decimal('12'),
+            tenure_months=12, emi_amount=0, start_date=date(2025, 1, 31), end_date=date(2025, 1, 31),
+            status='active', principal_balance=0, interest_balance=0
+        )
+
+    def test_schedule_repays_the_principal(self):
+        self.assertEqual(create_schedules([self.loan]), 12)
+        self.loan.refresh_from_db()
+        installments = list(self.loan.installments.all())
+        self.assertEqual(self.loan.emi_amount, Decimal('8884.88'))
+        self.assertEqual(self.loan.end_date, date(2025, 12, 31))
+        self.assertEqual(installments[1].due_date, date(2025, 2, 28))
+        self.assertEqual(installments[0].interest_amount, Decimal('1000.00'))
+        self.assertEqual(sum(i.principal_amount for i in installments), Decimal('100000'))
+        self.assertEqual(self.loan.interest_balance, sum(i.interest_amount for i in installments))
+
+    def test_prepayment_recomputes_the_unpaid_schedule(self):
+        create_schedules([self.loan])
+        LoanInstallment.objects.filter(loan=self.loan, installment_number__lte=2).update(status='paid')
+        outstanding = sum(i.principal_amount for i in self.loan.installments.filter(installment_number__gt=2))
+
+        loan = prepay(self.loan, Decimal('20000'))
+        installments = list(loan.installments.filter(installment_number__gt=2))
+        self.assertEqual(loan.emi_amount, Decimal('8884.88'))
+        self.assertLess(len(installments), 10)
+        self.assertEqual(sum(i.principal_amount for i in installments), outstanding - 20000)
+
+        loan = prepay(loan, Decimal('5000'), reduce='emi')
+        self.assertEqual(loan.installments.filter(installment_number__gt=2).count(), len(installments))
+        self.assertLess(loan.emi_amount, Decimal('8884.88'))
+
+
+class PayrollRunTest(TestCase):
+
+    def setUp(self):
+        department = Department.objects.create(name='Packing', code='PCK')
+        self.user = User.objects.create(username='payroll-admin')
+        period = PayrollPeriod.objects.create(
+            name='April', start_date=date(2025, 4, 1), end_date=date(2025, 4, 30), payment_date=date(2025, 5, 1)
+        )
+        # Nobody has absences, so this formula divides by zero for whoever has it
+        broken = PayrollComponent.objects.create(
+            name='Broken', code='BRK', component_type='earning', calculation_type='formula',
+            formula='BASIC / ABSENT_DAYS'
+        )
+        for n in range(5):
+            employee = Employee.objects.create(
+                user=User.objects.create(username=f'packer{n}'), employee_id=f'PCK{n:03d}', department=department,
+                designation='Packer', employee_type='permanent', date_of_joining=date(2020, 1, 1),
+                date_of_birth=date(1990, 1, 1), gender='male', phone='1', address='-'
+            )
+            structure = EmployeeSalaryStructure.objects.create(
+                employee=employee, effective_from=date(2024, 1, 1), basic_salary=Decimal('30000')
+            )
+            Attendance.objects.create(employee=employee, date=date(2025, 4, 1), status='present')
+            SalaryAdvance.objects.create(
+                employee=employee, advance_amount=3000, requested_date=date(2025, 1, 1),
+                monthly_deduction=Decimal('1000.00'), status='disbursed', remaining_amount=Decimal('2400.00')
+            )
+            if n == 2:
+                SalaryComponentValue.objects.create(salary_structure=structure, component=broken, amount=0)
+        self.run = PayrollRun.objects.create(
+            run_type='all', payroll_period=period, started_by=self.user, chunk_size=2
+        )
+
+    def test_one_bad_employee_does_not_fail_the_run(self):
+        run = process_payroll_run(self.run.pk)
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual((run.total_employees, run.processed_employees, run.failed_employees), (5, 4, 1))
+        self.assertIn('Error processing PCK002', run.error_log)
+        self.assertFalse(Payroll.objects.filter(employee__employee_id='PCK002').exists())
+        # The chunk that failed as a batch deducted its advances once, not twice
+        self.assertEqual(
+            sorted(SalaryAdvance.objects.values_list('employee__employee_id', 'remaining_amount')),
+            [('PCK000', Decimal('1400.00')), ('PCK001', Decimal('1400.00')), ('PCK002', Decimal('2400.00')),
+             ('PCK003', Decimal('1400.00')), ('PCK004', Decimal('1400.00'))]
+        )
+
+    def test_a_run_is_processed_by_one_worker_only(self):
+        PayrollRun.objects.filter(pk=self.run.pk).update(status='processing')
+        # Another worker holds the run: a second task leaves it alone
+        run = process_payroll_run(self.run.pk)
+        self.assertEqual((run.status, run.processed_employees), ('processing', 0))
+        self.assertFalse(Payroll.objects.exists())
+
+    def test_resume_queues_one_task(self):
+        task = start_payroll_run(self.run)
+        self.assertEqual(task.max_attempts, 1)
+        self.assertEqual(start_payroll_run(self.run), task)
+        PayrollRun.objects.filter(pk=self.run.pk).update(status='failed')
+        self.assertIsNone(resume_payroll_run(self.run))
+
+        # The worker died: its task failed, the run is still marked processing
+        task.status = 'failed'
+        task.save()
+        PayrollRun.objects.filter(pk=self.run.pk).update(status='processing')
+        self.assertIsNotNone(resume_payroll_run(self.run))
+        self.run.refresh_from_db()
+        self.assertEqual(self.run.status, 'failed')
+
+
+class PayrollSummaryViewTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create(username='payroll-viewer'))
+
+    def test_year_must_be_a_valid_date_year(self):
+        url = reverse('payroll:payroll_summary')
+        self.assertEqual(self.client.get(url, {'year': '2025'}).status_code, 200)
+        for year in ('abc', '0', '-5', '9999', '100000'):
+            self.assertEqual(self.client.get(url, {'year': year}).status_code, 400, year)
+
+
+class PayslipTest(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create(username='payslip-admin')
+        department = Department.objects.create(name='Stores', code='STR')
+        self.period = PayrollPeriod.objects.create(
+            name='May', start_date=date(2025, 5, 1), end_date=date(2025, 5, 31), payment_date=date(2025, 6, 1)
+        )
+        for n in range(5):
+            employee = Employee.objects.create(
+                user=User.objects.create(username=f'storekeeper{n}', first_name='Store', last_name=str(n)),
+                employee_id=f'STR{n:03d}', department=department, designation='Storekeeper',
+                employee_type='permanent', date_of_joining=date(2020, 1, 1), date_of_birth=date(1990, 1, 1),
+                gender='female', phone='1', address='-'
+            )
+            structure = EmployeeSalaryStructure.objects.create(
+                employee=employee, effective_from=date(2024, 1, 1), basic_salary=Decimal('20000')
+            )
+            Payroll.objects.create(
+                payroll_number=f'PAY-MAY-{n}', employee=employee, payroll_period=self.period,
+                salary_structure=structure, basic_salary=Decimal('20000'), net_salary=Decimal('20000')
+            )
+
+    def unzip(self, payrolls):
+        return zipfile.ZipFile(BytesIO(b''.join(stream_payslip_zip(payrolls))))
+
+    def test_generate_and_stream_zip(self):
+        progress = []
+        count, _, workers = generate_payslips(
+            period_payrolls(self.period), user=self.user, progress=lambda done, total: progress.append((done, total))
+        )
+        self.assertEqual((count, workers, progress), (5, 1, [(5, 5)]))
+        self.assertEqual(Payslip.objects.filter(generated_by=self.user).exclude(pdf_file='').count(), 5)
+
+        archive = self.unzip(period_payrolls(self.period))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), [payslip_filename(f'PAY-MAY-{n}') for n in range(5)])
+        for info in archive.infolist():
+            self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+            self.assertTrue(archive.read(info).startswith(b'%PDF'))
+
+    def test_process_pool_writes_every_chunk(self):
+        with mock.patch('payroll.payslips.CHUNK_SIZE', 2):
+            count, _, workers = generate_payslips(period_payrolls(self.period), workers=2)
+        self.assertEqual((count, workers), (5, 2))
+        archive = self.unzip(period_payrolls(self.period))
+        self.assertEqual(len(archive.namelist()), 5)
+
+        # Regenerating replaces the stored files instead of piling up copies
+        old = set(Payslip.objects.values_list('pdf_file', flat=True))
+        generate_payslips(period_payrolls(self.period))
+        self.assertEqual(Payslip.objects.count(), 5)
+        replaced = old - set(Payslip.objects.values_list('pdf_file', flat=True))
+        self.assertEqual(len(replaced), 5)
+        for name in replaced:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_zip_skips_payrolls_without_a_pdf(self):
+        generate_payslips(period_payrolls(self.period).filter(payroll_number='PAY-MAY-3'))
+        self.assertEqual(self.unzip(period_payrolls(self.period)).namelist(), [payslip_filename('PAY-MAY-3')])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('payroll:period_payslips_zip', args=[self.period.pk]))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="payslips_may.zip"')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), [payslip_filename('PAY-MAY-3')])
@@ -21,6 +21,8 @@ urlpatterns = [
     # Payroll Periods
     path('periods/', views.PayrollPeriodListView.as_view(), name='period_list'),
     path('periods/create/', views.PayrollPeriodCreateView.as_view(), name='period_create'),
+    path('periods/<int:pk>/payslips/generate/', views.GeneratePayslipsView.as_view(scope='period'), name='period_generate_payslips'),
+    path('periods/<int:pk>/payslips.zip', views.DownloadPayslipsView.as_view(scope='period'), name='period_payslips_zip'),
     
     # Payroll
     path('payrolls/', views.PayrollListView.as_view(), name='payroll_list'),
@@ -34,11 +36,16 @@ urlpatterns = [
     path('runs/', views.PayrollRunListView.as_view(), name='payroll_run_list'),
     path('runs/create/', views.PayrollRunCreateView.as_view(), name='payroll_run_create'),
     path('runs/<int:pk>/', views.PayrollRunDetailView.as_view(), name='payroll_run_detail'),
+    path('runs/<int:pk>/status/', views.PayrollRunStatusView.as_view(), name='payroll_run_status'),
+    path('runs/<int:pk>/resume/', views.ResumePayrollRunView.as_view(), name='payroll_run_resume'),
+    path('runs/<int:pk>/payslips/generate/', views.GeneratePayslipsView.as_view(), name='payroll_run_generate_payslips'),
+    path('runs/<int:pk>/payslips.zip', views.DownloadPayslipsView.as_view(), name='payroll_run_payslips_zip'),
     
     # Loans
     path('loans/', views.LoanListView.as_view(), name='loan_list'),
     path('loans/create/', views.LoanCreateView.as_view(), name='loan_create'),
     path('loans/<int:pk>/', views.LoanDetailView.as_view(), name='loan_detail'),
+    path('loans/<int:pk>/prepay/', views.LoanPrepaymentView.as_view(), name='loan_prepay'),
     
     # Salary Advances
     path('advances/', views.SalaryAdvanceListView.as_view(), name='advance_list'),
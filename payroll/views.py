@@ -4,18 +4,21 @@ from django.views import View  # Add this import
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Q, Sum, Count
 from django.utils import timezone
+from django.utils.text import slugify
+from django.core.files.base import ContentFile
 from django.template.loader import get_template
-from datetime import datetime, date, timedelta
+from datetime import MAXYEAR, MINYEAR, datetime, date, timedelta
 import json
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 from .models import (
     PayrollComponent, EmployeeSalaryStructure, SalaryComponentValue,
     PayrollPeriod, Payroll, PayrollRun, PayrollItem, Loan, 
-    SalaryAdvance, Payslip
+    LoanInstallment, SalaryAdvance, Payslip
 )
 from .forms import (
     PayrollComponentForm, EmployeeSalaryStructureForm, SalaryComponentValueFormSet,
@@ -23,6 +26,16 @@ from .forms import (
 )
 from hr.models import Employee, Department, Attendance
 from core.models import Company
+from core.pagination import KeysetPaginationMixin
+from .calculation import calculate_attendance, calculate_salary, save_calculated
+from .formulas import FormulaError
+from .loans import loan_installments, prepare_loans, prepay, settle_installments
+from .payslips import (
+    PAYSLIP_FIELDS, payslip_filename, period_payrolls, render_payslip, run_payrolls, stream_payslip_zip
+)
+from .runs import active_task, resume_payroll_run, start_payroll_run
+from .summary import get_payroll_summary
+from core.tasks import enqueue
 
 class PayrollDashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'payroll/dashboard.html'
@@ -224,7 +237,7 @@ class PayrollPeriodCreateView(LoginRequiredMixin, CreateView):
         messages.success(self.request, 'Payroll period created successfully!')
         return super().form_valid(form)
 
-class PayrollListView(LoginRequiredMixin, ListView):
+class PayrollListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Payroll
     template_name = 'payroll/payroll_list.html'
     context_object_name = 'payrolls'
@@ -260,170 +273,17 @@ class PayrollCreateView(LoginRequiredMixin, CreateView):
         self.object = form.save(commit=False)
         self.object.created_by = self.request.user
         
-        # Calculate attendance
-        self.calculate_attendance()
-        
-        # Calculate salary based on structure
-        self.calculate_salary()
-        
-        self.object.save()
+        # Attendance for the period, then salary from the structure
+        calculate_attendance(self.object)
+        try:
+            items, advances = calculate_salary(self.object)
+        except FormulaError as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
+        save_calculated(self.object, items, advances)
         
         messages.success(self.request, f'Payroll {self.object.payroll_number} created successfully!')
         return redirect('payroll:payroll_detail', pk=self.object.pk)
-    
-    def calculate_attendance(self):
-        """Calculate attendance for the payroll period"""
-        period = self.object.payroll_period
-        employee = self.object.employee
-        
-        # Get attendance records for the period
-        attendance_records = Attendance.objects.filter(
-            employee=employee,
-            date__range=[period.start_date, period.end_date]
-        )
-        
-        # Count days
-        self.object.total_working_days = (period.end_date - period.start_date).days + 1
-        self.object.present_days = attendance_records.filter(status='present').count()
-        self.object.absent_days = attendance_records.filter(status='absent').count()
-        self.object.leave_days = attendance_records.filter(status='leave').count()
-        self.object.holiday_days = attendance_records.filter(status='holiday').count()
-        
-        # Calculate overtime
-        overtime_hours = attendance_records.aggregate(
-            total_overtime=Sum('overtime_hours')
-        )['total_overtime'] or 0
-        # Assuming overtime rate is 1.5x hourly rate
-        hourly_rate = self.object.salary_structure.basic_salary / (22 * 8)  # 22 working days, 8 hours/day
-        self.object.overtime_amount = Decimal(str(overtime_hours)) * hourly_rate * Decimal('1.5')
-    
-    def calculate_salary(self):
-        """Calculate salary based on structure and attendance"""
-        structure = self.object.salary_structure
-        
-        # Basic salary (prorated based on attendance)
-        daily_rate = structure.basic_salary / self.object.total_working_days
-        payable_days = self.object.present_days + self.object.holiday_days + (self.object.leave_days * 0.5)  # Half pay for leaves
-        
-        self.object.basic_salary = daily_rate * payable_days
-        
-        # Calculate other components from salary structure
-        for component_value in structure.components.all():
-            component = component_value.component
-            
-            if component.component_type == 'earning':
-                if component.calculation_type == 'fixed':
-                    amount = component_value.amount
-                elif component.calculation_type == 'percentage':
-                    amount = self.object.basic_salary * (component_value.percentage / 100)
-                else:
-                    amount = component_value.amount  # Default
-                
-                # Map to appropriate field based on component code
-                if component.code == 'HRA':
-                    self.object.house_rent_allowance = amount
-                elif component.code == 'CA':
-                    self.object.conveyance_allowance = amount
-                elif component.code == 'MA':
-                    self.object.medical_allowance = amount
-                elif component.code == 'SA':
-                    self.object.special_allowance = amount
-                else:
-                    self.object.other_earnings += amount
-                
-                # Create payroll item
-                PayrollItem.objects.create(
-                    payroll=self.object,
-                    component=component,
-                    amount=amount,
-                    calculation_note=f"{component.calculation_type} calculation"
-                )
-            
-            elif component.component_type == 'deduction':
-                if component.calculation_type == 'fixed':
-                    amount = component_value.amount
-                elif component.calculation_type == 'percentage':
-                    amount = self.object.basic_salary * (component_value.percentage / 100)
-                else:
-                    amount = component_value.amount
-                
-                # Map to appropriate field
-                if component.code == 'PF':
-                    self.object.provident_fund = amount
-                elif component.code == 'PT':
-                    self.object.professional_tax = amount
-                elif component.code == 'IT':
-                    self.object.income_tax = amount
-                else:
-                    self.object.other_deductions += amount
-                
-                # Create payroll item
-                PayrollItem.objects.create(
-                    payroll=self.object,
-                    component=component,
-                    amount=amount,
-                    calculation_note=f"{component.calculation_type} calculation"
-                )
-        
-        # Calculate loan deductions
-        active_loans = Loan.objects.filter(
-            employee=self.object.employee,
-            status='active'
-        )
-        for loan in active_loans:
-            installment = loan.installments.filter(
-                due_date__range=[self.object.payroll_period.start_date, self.object.payroll_period.end_date],
-                status__in=['pending', 'due']
-            ).first()
-            
-            if installment:
-                self.object.loan_deduction += installment.total_amount
-                PayrollItem.objects.create(
-                    payroll=self.object,
-                    component=PayrollComponent.objects.get_or_create(
-                        code=f'LOAN-{loan.loan_number}',
-                        defaults={
-                            'name': f'Loan Deduction - {loan.loan_number}',
-                            'component_type': 'deduction',
-                            'calculation_type': 'fixed',
-                            'is_taxable': False
-                        }
-                    )[0],
-                    amount=installment.total_amount,
-                    calculation_note=f"Loan installment #{installment.installment_number}"
-                )
-        
-        # Calculate advance deductions
-        active_advances = SalaryAdvance.objects.filter(
-            employee=self.object.employee,
-            status='disbursed',
-            remaining_amount__gt=0
-        )
-        for advance in active_advances:
-            deduction_amount = min(advance.monthly_deduction, advance.remaining_amount)
-            self.object.advance_deduction += deduction_amount
-            advance.remaining_amount -= deduction_amount
-            if advance.remaining_amount <= 0:
-                advance.status = 'repaid'
-            advance.save()
-            
-            PayrollItem.objects.create(
-                payroll=self.object,
-                component=PayrollComponent.objects.get_or_create(
-                    code=f'ADV-{advance.advance_number}',
-                    defaults={
-                        'name': f'Advance Deduction - {advance.advance_number}',
-                        'component_type': 'deduction',
-                        'calculation_type': 'fixed',
-                        'is_taxable': False
-                    }
-                )[0],
-                amount=deduction_amount,
-                calculation_note=f"Salary advance repayment"
-            )
-        
-        # Recalculate totals
-        self.object.calculate_totals()
 
 class PayrollDetailView(LoginRequiredMixin, DetailView):
     model = Payroll
@@ -446,122 +306,11 @@ class PayrollRunCreateView(LoginRequiredMixin, CreateView):
         self.object.status = 'pending'
         self.object.save()
         
-        # Start batch processing in background (you might want to use Celery for this)
-        self.process_payroll_run()
+        # Processed in chunks by the background worker (manage.py run_worker)
+        start_payroll_run(self.object)
         
-        messages.success(self.request, f'Payroll run {self.object.run_number} started successfully!')
+        messages.success(self.request, f'Payroll run {self.object.run_number} queued for processing.')
         return redirect('payroll:payroll_run_detail', pk=self.object.pk)
-    
-    def process_payroll_run(self):
-        """Process payroll for multiple employees based on run type"""
-        from django.db import transaction
-        
-        try:
-            self.object.status = 'processing'
-            self.object.save()
-            
-            # Get employees based on run type
-            if self.object.run_type == 'department' and self.object.department:
-                employees = Employee.objects.filter(
-                    department=self.object.department,
-                    employment_status='active',
-                    salary_structure__is_active=True
-                )
-            elif self.object.run_type == 'all':
-                employees = Employee.objects.filter(
-                    employment_status='active',
-                    salary_structure__is_active=True
-                )
-            else:
-                # Handle other run types (company, branch, custom)
-                employees = Employee.objects.filter(
-                    employment_status='active',
-                    salary_structure__is_active=True
-                )
-            
-            self.object.total_employees = employees.count()
-            self.object.save()
-            
-            processed_count = 0
-            failed_count = 0
-            total_amount = Decimal('0')
-            
-            for employee in employees:
-                try:
-                    with transaction.atomic():
-                        # Check if payroll already exists for this period
-                        existing_payroll = Payroll.objects.filter(
-                            employee=employee,
-                            payroll_period=self.object.payroll_period
-                        ).exists()
-                        
-                        if not existing_payroll:
-                            # Create payroll
-                            payroll = Payroll(
-                                employee=employee,
-                                payroll_period=self.object.payroll_period,
-                                salary_structure=employee.salary_structure,
-                                created_by=self.request.user
-                            )
-                            
-                            # Calculate attendance
-                            self.calculate_attendance_for_payroll(payroll)
-                            
-                            # Calculate salary
-                            self.calculate_salary_for_payroll(payroll)
-                            
-                            payroll.save()
-                            
-                            # Generate payslip
-                            self.generate_payslip(payroll)
-                            
-                            total_amount += payroll.net_salary
-                            processed_count += 1
-                        else:
-                            failed_count += 1
-                            self.object.error_log += f"\nPayroll already exists for {employee.employee_id}"
-                
-                except Exception as e:
-                    failed_count += 1
-                    self.object.error_log += f"\nError processing {employee.employee_id}: {str(e)}"
-                    continue
-            
-            # Update run results
-            self.object.processed_employees = processed_count
-            self.object.failed_employees = failed_count
-            self.object.total_amount = total_amount
-            self.object.status = 'completed'
-            self.object.completed_by = self.request.user
-            self.object.completed_at = timezone.now()
-            self.object.save()
-            
-            # Mark payroll period as processed
-            self.object.payroll_period.is_processed = True
-            self.object.payroll_period.processed_by = self.request.user
-            self.object.payroll_period.processed_date = timezone.now()
-            self.object.payroll_period.save()
-            
-        except Exception as e:
-            self.object.status = 'failed'
-            self.object.error_log += f"\nRun failed: {str(e)}"
-            self.object.save()
-    
-    def calculate_attendance_for_payroll(self, payroll):
-        """Calculate attendance for a payroll"""
-        # Similar to calculate_attendance method in PayrollCreateView
-        pass
-    
-    def calculate_salary_for_payroll(self, payroll):
-        """Calculate salary for a payroll"""
-        # Similar to calculate_salary method in PayrollCreateView
-        pass
-    
-    def generate_payslip(self, payroll):
-        """Generate payslip for payroll"""
-        Payslip.objects.create(
-            payroll=payroll,
-            generated_by=self.request.user
-        )
 
 class PayrollRunListView(LoginRequiredMixin, ListView):
     """List all payroll runs"""
@@ -625,6 +374,41 @@ class PayrollRunDetailView(LoginRequiredMixin, DetailView):
     model = PayrollRun
     template_name = 'payroll/payroll_run_detail.html'
     context_object_name = 'payroll_run'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Failed, or left processing by a worker that died
+        context['can_resume'] = self.object.status in ('failed', 'processing') and not active_task(self.object)
+        return context
+
+class PayrollRunStatusView(LoginRequiredMixin, View):
+    """Progress of a payroll run, polled by the run detail page"""
+    
+    def get(self, request, pk):
+        run = get_object_or_404(PayrollRun, pk=pk)
+        return JsonResponse({
+            'run_number': run.run_number,
+            'status': run.status,
+            'total_employees': run.total_employees,
+            'processed_employees': run.processed_employees,
+            'failed_employees': run.failed_employees,
+            'progress': run.progress,
+            'total_amount': str(run.total_amount),
+            'completed_at': run.completed_at.isoformat() if run.completed_at else None,
+        })
+
+class ResumePayrollRunView(LoginRequiredMixin, View):
+    """Queue a failed run again; it carries on after its last committed chunk"""
+    
+    def post(self, request, pk):
+        run = get_object_or_404(PayrollRun, pk=pk)
+        
+        if resume_payroll_run(run):
+            messages.success(request, f'Payroll run {run.run_number} queued to resume.')
+        else:
+            messages.error(request, 'Only failed payroll runs can be resumed.')
+        
+        return redirect('payroll:payroll_run_detail', pk=run.pk)
 
 class GeneratePayslipView(LoginRequiredMixin, View):
     """Generate PDF payslip"""
@@ -638,46 +422,42 @@ class GeneratePayslipView(LoginRequiredMixin, View):
             defaults={'generated_by': request.user}
         )
         
-        # Generate PDF (you'll need to install reportlab or use xhtml2pdf)
-        # This is a simplified example
-        
-        from io import BytesIO
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import letter
-        
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        
-        # Add content to PDF
-        p.drawString(100, 750, f"PAYSLIP - {payroll.payroll_number}")
-        p.drawString(100, 730, f"Employee: {payroll.employee.user.get_full_name()}")
-        p.drawString(100, 710, f"Employee ID: {payroll.employee.employee_id}")
-        p.drawString(100, 690, f"Period: {payroll.payroll_period.name}")
-        
-        # Earnings
-        p.drawString(100, 650, "EARNINGS")
-        p.drawString(100, 630, f"Basic Salary: ${payroll.basic_salary}")
-        p.drawString(100, 610, f"Allowances: ${payroll.total_earnings - payroll.basic_salary}")
-        
-        # Deductions
-        p.drawString(100, 570, "DEDUCTIONS")
-        p.drawString(100, 550, f"Total Deductions: ${payroll.total_deductions}")
-        
-        # Net Salary
-        p.drawString(100, 500, f"NET SALARY: ${payroll.net_salary}")
-        
-        p.showPage()
-        p.save()
-        
-        buffer.seek(0)
+        pdf = render_payslip(Payroll.objects.filter(pk=payroll.pk).values(*PAYSLIP_FIELDS).get())
         
         # Update payslip
-        payslip.pdf_file.save(f'payslip_{payroll.payroll_number}.pdf', buffer)
+        payslip.pdf_file.save(payslip_filename(payroll.payroll_number), ContentFile(pdf))
         payslip.save()
         
         # Return PDF
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="payslip_{payroll.payroll_number}.pdf"'
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{payslip_filename(payroll.payroll_number)}"'
+        return response
+
+class GeneratePayslipsView(LoginRequiredMixin, View):
+    """Queue PDF payslips for every payroll of a run or period"""
+    scope = 'run'
+    
+    def post(self, request, pk):
+        payload = {f'{self.scope}_id': pk, 'user_id': request.user.pk}
+        enqueue('payroll.generate_payslips', payload)
+        messages.success(request, 'Payslip PDFs are being generated in the background.')
+        if self.scope == 'run':
+            return redirect('payroll:payroll_run_detail', pk=pk)
+        return redirect('payroll:period_list')
+
+class DownloadPayslipsView(LoginRequiredMixin, View):
+    """All generated payslip PDFs of a run or period as one streamed ZIP"""
+    scope = 'run'
+    
+    def get(self, request, pk):
+        if self.scope == 'run':
+            run = get_object_or_404(PayrollRun.objects.select_related('payroll_period', 'department'), pk=pk)
+            payrolls, name = run_payrolls(run), run.run_number
+        else:
+            period = get_object_or_404(PayrollPeriod, pk=pk)
+            payrolls, name = period_payrolls(period), slugify(period.name)
+        response = StreamingHttpResponse(stream_payslip_zip(payrolls), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="payslips_{name}.zip"'
         return response
 
 class ApprovePayrollView(LoginRequiredMixin, View):
@@ -710,7 +490,9 @@ class ProcessPaymentView(LoginRequiredMixin, View):
             payroll.processed_date = timezone.now()
             if not payroll.payment_date:
                 payroll.payment_date = date.today()
-            payroll.save()
+            with transaction.atomic():
+                payroll.save()
+                settle_installments(payroll)
             
             messages.success(request, f'Payment processed for {payroll.payroll_number}!')
         else:
@@ -731,11 +513,41 @@ class LoanCreateView(LoginRequiredMixin, CreateView):
     template_name = 'payroll/loan_form.html'
     success_url = reverse_lazy('payroll:loan_list')
 
+    def form_valid(self, form):
+        loan = form.instance
+        # EMI, balances and end date come from the amortization schedule
+        schedule = prepare_loans([loan])[0]
+        with transaction.atomic():
+            self.object = form.save()
+            LoanInstallment.objects.bulk_create(loan_installments(loan, schedule))
+        messages.success(self.request, f'Loan {loan.loan_number} created with {len(schedule)} installments!')
+        return redirect(self.get_success_url())
+
 class LoanDetailView(LoginRequiredMixin, DetailView):
     model = Loan
     template_name = 'payroll/loan_detail.html'
     context_object_name = 'loan'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['installments'] = self.object.installments.all()
+        return context
+
+class LoanPrepaymentView(LoginRequiredMixin, View):
+    """Part-prepay a loan and recompute its remaining schedule"""
+
+    def post(self, request, pk):
+        loan = get_object_or_404(Loan, pk=pk)
+        reduce = 'emi' if request.POST.get('reduce') == 'emi' else 'tenure'
+        try:
+            amount = Decimal(request.POST.get('amount', ''))
+            prepay(loan, amount, reduce=reduce)
+        except (InvalidOperation, ValueError) as e:
+            messages.error(request, f'Prepayment failed: {e}')
+        else:
+            messages.success(request, f'Prepayment of {amount} applied to {loan.loan_number}.')
+        return redirect('payroll:loan_detail', pk=loan.pk)
+
 # Salary Advance Views
 class SalaryAdvanceListView(LoginRequiredMixin, ListView):
     model = SalaryAdvance
@@ -791,47 +603,12 @@ class GetPayrollSummaryView(LoginRequiredMixin, View):
     """Get payroll summary for dashboard"""
     
     def get(self, request):
-        today = date.today()
-        year = request.GET.get('year', today.year)
-        
-        # Monthly payroll summary
-        monthly_data = []
-        for month in range(1, 13):
-            payrolls = Payroll.objects.filter(
-                payroll_period__start_date__year=year,
-                payroll_period__start_date__month=month,
-                status='paid'
-            )
-            total_amount = payrolls.aggregate(total=Sum('net_salary'))['total'] or 0
-            monthly_data.append({
-                'month': datetime(year, month, 1).strftime('%b'),
-                'amount': float(total_amount),
-                'count': payrolls.count()
-            })
-        
-        # Department summary
-        department_summary = []
-        for dept in Department.objects.all():
-            payrolls = Payroll.objects.filter(
-                employee__department=dept,
-                payroll_period__start_date__year=year,
-                status='paid'
-            )
-            if payrolls.exists():
-                total = payrolls.aggregate(total=Sum('net_salary'))['total'] or 0
-                department_summary.append({
-                    'department': dept.name,
-                    'amount': float(total),
-                    'count': payrolls.count()
-                })
-        
-        data = {
-            'monthly_summary': monthly_data,
-            'department_summary': department_summary,
-            'total_paid': float(Payroll.objects.filter(status='paid').aggregate(total=Sum('net_salary'))['total'] or 0),
-            'pending_payrolls': Payroll.objects.filter(status='draft').count()
-        }
-        
-        return JsonResponse(data)
+        try:
+            year = int(request.GET.get('year') or date.today().year)
+        except ValueError:
+            return JsonResponse({'error': 'year must be a number'}, status=400)
+        if not MINYEAR <= year < MAXYEAR:
+            return JsonResponse({'error': f'year must be between {MINYEAR} and {MAXYEAR - 1}'}, status=400)
+        return JsonResponse(get_payroll_summary(year))
     
 
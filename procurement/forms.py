@@ -1,6 +1,7 @@
 from django import forms
 from .models import PurchaseOrder, PurchaseOrderItem, Supplier, GoodsReceipt
 from django.forms import inlineformset_factory
+from inventory.widgets import ProductPickerWidget
 
 class SupplierForm(forms.ModelForm):
     class Meta:
@@ -29,6 +30,7 @@ class PurchaseOrderItemForm(forms.ModelForm):
         model = PurchaseOrderItem
         fields = ['product', 'quantity', 'unit_price', 'tax_rate', 'warehouse']
         widgets = {
+            'product': ProductPickerWidget(),
             'quantity': forms.NumberInput(attrs={'step': '0.001'}),
             'unit_price': forms.NumberInput(attrs={'step': '0.01'}),
             'tax_rate': forms.NumberInput(attrs={'step': '0.01'}),
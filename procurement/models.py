@@ -1,5 +1,6 @@
 from django.db import models
 from core.models import TimeStampedModel, Company
+from core.sequences import next_document_number
 from inventory.models import Product, Warehouse
 
 class Supplier(TimeStampedModel):
@@ -51,12 +52,7 @@ class PurchaseOrder(TimeStampedModel):
     
     def save(self, *args, **kwargs):
         if not self.po_number:
-            last_po = PurchaseOrder.objects.all().order_by('id').last()
-            if last_po:
-                last_number = int(last_po.po_number.split('-')[-1])
-                self.po_number = f"PO-{timezone.now().year}-{last_number + 1:05d}"
-            else:
-                self.po_number = f"PO-{timezone.now().year}-00001"
+            self.po_number = next_document_number('PO', seed_from=(PurchaseOrder, 'po_number'))
         super().save(*args, **kwargs)
     
     def __str__(self):
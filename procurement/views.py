@@ -8,6 +8,7 @@ from django.utils import timezone
 from django.http import JsonResponse
 from .models import Supplier, PurchaseOrder, PurchaseOrderItem, GoodsReceipt, GoodsReceiptItem
 from .forms import SupplierForm, PurchaseOrderForm, PurchaseOrderItemFormSet, GoodsReceiptForm
+from core.pagination import KeysetPaginationMixin
 
 class SupplierListView(LoginRequiredMixin, ListView):
     model = Supplier
@@ -67,11 +68,12 @@ class SupplierDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(request, 'Supplier deleted successfully!')
         return super().delete(request, *args, **kwargs)
 
-class PurchaseOrderListView(LoginRequiredMixin, ListView):
+class PurchaseOrderListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = PurchaseOrder
     template_name = 'procurement/purchase_order_list.html'
     context_object_name = 'purchase_orders'
     paginate_by = 20
+    estimate_count = True
     
     def get_queryset(self):
         queryset = PurchaseOrder.objects.select_related('supplier').all()
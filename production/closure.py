@@ -0,0 +1,102 @@
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from .models import BillOfMaterials, BOMExplosion
+from .mrp import BOMGraph
+
+BATCH_SIZE = 500
+QUANTITY = Decimal('0.000001')
+
+
+def _flatten(graph, bom_id, memo, path=()):
+    """{component_id: [quantity per unit, shortest level, is_leaf]} for every descendant"""
+    if bom_id in memo:
+        return memo[bom_id]
+    if bom_id in path:
+        raise ValidationError(f'BOM cycle detected at BOM #{bom_id}.')
+    rows = {}
+    for component_id, per_unit in graph.lines(bom_id):
+        child = graph.current_bom.get(component_id)
+        entry = rows.setdefault(component_id, [Decimal('0'), 1, child is None])
+        entry[0] += per_unit
+        entry[1] = 1
+        if child is None:
+            continue
+        for descendant_id, (quantity, level, is_leaf) in _flatten(graph, child, memo, path + (bom_id,)).items():
+            entry = rows.setdefault(descendant_id, [Decimal('0'), level + 1, is_leaf])
+            entry[0] += per_unit * quantity
+            entry[1] = min(entry[1], level + 1)
+    memo[bom_id] = rows
+    return rows
+
+
+def _write(graph, product_ids):
+    """Replace the closure rows of ``product_ids`` from ``graph``.
+
+    Rows go in through executemany: a deep BOM set flattens to hundreds of
+    thousands of rows, where building model instances for bulk_create
+    costs far more than the inserts themselves.
+    """
+    ops = connection.ops
+    memo = {}
+    product_ids = list(product_ids)
+    rows = []
+    for product_id in product_ids:
+        bom_id = graph.current_bom.get(product_id)
+        if bom_id is None:
+            continue
+        for component_id, (quantity, level, is_leaf) in _flatten(graph, bom_id, memo).items():
+            rows.append((
+                product_id, bom_id, component_id,
+                ops.adapt_decimalfield_value(quantity.quantize(QUANTITY), 18, 6), level, is_leaf
+            ))
+
+    table = ops.quote_name(BOMExplosion._meta.db_table)
+    insert = (
+        f"INSERT INTO {table} (product_id, bom_id, component_id, quantity, level, is_leaf) "
+        f"VALUES (%s, %s, %s, %s, %s, %s)"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(product_ids), BATCH_SIZE):
+            BOMExplosion.objects.filter(product_id__in=product_ids[start:start + BATCH_SIZE]).delete()
+        for start in range(0, len(rows), 10000):
+            cursor.executemany(insert, rows[start:start + 10000])
+    return len(rows)
+
+
+def rebuild_bom_closure(as_of=None):
+    """Recompute the whole flattened BOM table; returns the number of rows written"""
+    graph = BOMGraph(as_of)
+    with transaction.atomic():
+        BOMExplosion.objects.all().delete()
+        return _write(graph, graph.current_bom)
+
+
+def refresh_bom_closure(product_ids):
+    """Recompute the rows affected by a change to the BOMs of ``product_ids``.
+
+    Only these products and their ancestors (everything that uses them,
+    found with one where-used lookup) are touched. Their BOM trees are
+    reloaded level by level, not the whole BOM table.
+    """
+    product_ids = {pk for pk in product_ids if pk}
+    if not product_ids:
+        return 0
+    affected = set(product_ids)
+    affected.update(
+        BOMExplosion.objects.filter(component_id__in=product_ids)
+        .values_list('product_id', flat=True).distinct()
+    )
+    roots = BillOfMaterials.objects.filter(finished_product_id__in=affected).values_list('pk', flat=True)
+    graph = BOMGraph(root_bom_ids=list(roots))
+    return _write(graph, affected)
+
+
+def explode(product):
+    """Leaf components and quantities per unit of ``product``, from the flattened table"""
+    return BOMExplosion.objects.filter(product=product, is_leaf=True).select_related('component')
+
+
+def where_used(component):
+    """Every product that needs ``component`` at any level, with the quantity per unit"""
+    return BOMExplosion.objects.filter(component=component).select_related('product')
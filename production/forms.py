@@ -1,6 +1,7 @@
 from django import forms
 from .models import BillOfMaterials, BOMLine, ProductionOrder, WorkCenter, Operation
 from django.forms import inlineformset_factory
+from inventory.widgets import ProductPickerWidget
 
 class BOMForm(forms.ModelForm):
     class Meta:
@@ -26,6 +27,7 @@ class BOMLineForm(forms.ModelForm):
         model = BOMLine
         fields = ['component', 'quantity', 'unit_of_measure', 'scrap_percentage', 'operation']
         widgets = {
+            'component': ProductPickerWidget(attrs={'class': 'form-control product-select'}),
             'quantity': forms.NumberInput(attrs={'step': '0.001'}),
             'scrap_percentage': forms.NumberInput(attrs={'step': '0.01'}),
         }
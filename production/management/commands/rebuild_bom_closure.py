@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from production.closure import rebuild_bom_closure
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the flattened BOM table (run daily so newly effective BOM versions take over)'
+
+    def handle(self, *args, **options):
+        count = rebuild_bom_closure()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} flattened BOM rows.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from inventory.models import Product
+from production.mrp import run_mrp
+
+
+class Command(BaseCommand):
+    help = 'Run MRP over all open production orders and list the material shortages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50, help='Shortage lines to print')
+
+    def handle(self, *args, **options):
+        result = run_mrp()
+        self.stdout.write(
+            f'{result.order_count} open orders, {len(result.items)} items planned, '
+            f'{len(result.shortages)} shortages.'
+        )
+        shown = result.shortages[:options['limit']]
+        skus = dict(Product.objects.filter(pk__in={s['product_id'] for s in shown}).values_list('pk', 'SKU'))
+        for shortage in shown:
+            self.stdout.write(
+                f"{shortage['start_date']}  {shortage['action']:<4}  "
+                f"{skus.get(shortage['product_id'], shortage['product_id'])}  "
+                f"{shortage['quantity']} (needed {shortage['date']})"
+            )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from production.scheduling import schedule_all
+
+
+class Command(BaseCommand):
+    help = 'Finite-capacity schedule of all released production orders across work centers'
+
+    def handle(self, *args, **options):
+        count = schedule_all()
+        self.stdout.write(self.style.SUCCESS(f'Scheduled {count} operations.'))
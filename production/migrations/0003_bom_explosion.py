@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-17 05:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_product_created_at_index'),
+        ('production', '0002_operation_billofmaterials_notes_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BOMExplosion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('level', models.PositiveSmallIntegerField()),
+                ('is_leaf', models.BooleanField(default=True)),
+                ('bom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='explosion_rows', to='production.billofmaterials')),
+                ('component', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='used_in_explosions', to='inventory.product')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='bom_explosion', to='inventory.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bomexplosion',
+            index=models.Index(fields=['component', 'product'], name='production__compone_9cc86c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bomexplosion',
+            unique_together={('product', 'component')},
+        ),
+    ]
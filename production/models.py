@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from core.models import TimeStampedModel
+from core.sequences import next_document_number
 
 class WorkCenter(models.Model):
     code = models.CharField(max_length=20, unique=True)
@@ -52,6 +53,30 @@ class BOMLine(models.Model):
     def __str__(self):
         return f"{self.bom.code} - {self.component.name}"
 
+class BOMExplosion(models.Model):
+    """Flattened BOM: every component a product needs, through all levels.
+
+    One row per (product, component) with the cumulative quantity per unit
+    of the product, scrap included. Maintained by production.closure.
+    """
+    # product and component are covered by the two composite indexes below
+    product = models.ForeignKey('inventory.Product', on_delete=models.CASCADE,
+                                related_name='bom_explosion', db_index=False)
+    bom = models.ForeignKey(BillOfMaterials, on_delete=models.CASCADE,
+                            related_name='explosion_rows')
+    component = models.ForeignKey('inventory.Product', on_delete=models.CASCADE,
+                                  related_name='used_in_explosions', db_index=False)
+    quantity = models.DecimalField(max_digits=18, decimal_places=6)
+    level = models.PositiveSmallIntegerField()  # shortest path from the product
+    is_leaf = models.BooleanField(default=True)  # component has no BOM of its own
+    
+    class Meta:
+        unique_together = ['product', 'component']
+        indexes = [models.Index(fields=['component', 'product'])]
+    
+    def __str__(self):
+        return f"{self.product_id} -> {self.component_id}: {self.quantity}"
+
 class Operation(models.Model):
     code = models.CharField(max_length=20, unique=True)
     name = models.CharField(max_length=100)
@@ -99,12 +124,9 @@ class ProductionOrder(TimeStampedModel):
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            last_po = ProductionOrder.objects.all().order_by('id').last()
-            if last_po:
-                last_number = int(last_po.order_number.split('-')[-1])
-                self.order_number = f"PROD-{timezone.now().year}-{last_number + 1:05d}"
-            else:
-                self.order_number = f"PROD-{timezone.now().year}-00001"
+            self.order_number = next_document_number(
+                'PROD', seed_from=(ProductionOrder, 'order_number')
+            )
         
         # Calculate production time
         if self.bom and self.quantity:
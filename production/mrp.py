@@ -0,0 +1,311 @@
+import math
+from collections import defaultdict, deque
+from datetime import timedelta
+from operator import itemgetter
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import BillOfMaterials, BOMLine, ProductionOrder
+
+# Production orders that still consume material / will still deliver output
+OPEN_ORDER_EXCLUDE = ['completed', 'cancelled']
+# Purchase orders whose outstanding quantity counts as a scheduled receipt
+OPEN_PO_STATUSES = ['sent', 'confirmed', 'partial']
+
+ZERO = Decimal('0')
+HUNDRED = Decimal('100')
+QUANTITY = Decimal('0.001')
+
+
+class BOMGraph:
+    """All BOMs and BOM lines loaded once, with per-unit quantities precomputed.
+
+    ``lines(bom_id)`` gives (component_id, quantity per unit of output) with
+    the line's scrap_percentage and the BOM's scrap_rate applied.
+    ``current_bom`` maps a product to the BOM used to make it: the active BOM
+    with the latest effective date on or before ``as_of``.
+    """
+
+    def __init__(self, as_of=None, root_bom_ids=None):
+        self.as_of = as_of or timezone.localdate()
+        self.boms = {}
+        self.current_bom = {}
+        self._candidates = {}
+        self._lines = defaultdict(list)
+        self._explosions = {}
+        if root_bom_ids is None:
+            self._load_all()
+        else:
+            self._load_tree(root_bom_ids)
+
+    def _add_boms(self, rows):
+        for bom_id, product_id, is_active, effective_date, production_time, scrap_rate in rows:
+            self.boms[bom_id] = (product_id, production_time or ZERO, 1 + (scrap_rate or ZERO) / HUNDRED)
+            if not is_active or effective_date > self.as_of:
+                continue
+            candidate = (effective_date, bom_id)
+            current = self._candidates.get(product_id)
+            if current is None or candidate > current:
+                self._candidates[product_id] = candidate
+
+    def _add_lines(self, rows):
+        for bom_id, component_id, quantity, scrap_percentage in rows:
+            bom = self.boms.get(bom_id)
+            if bom is None:
+                continue
+            per_unit = quantity * (1 + (scrap_percentage or ZERO) / HUNDRED) * bom[2]
+            self._lines[bom_id].append((component_id, per_unit))
+
+    def _bom_rows(self, queryset):
+        return queryset.values_list(
+            'id', 'finished_product_id', 'is_active', 'effective_date', 'production_time', 'scrap_rate'
+        )
+
+    def _line_rows(self, queryset):
+        return queryset.values_list('bom_id', 'component_id', 'quantity', 'scrap_percentage')
+
+    def _load_all(self):
+        self._add_boms(self._bom_rows(BillOfMaterials.objects.all()))
+        self._add_lines(self._line_rows(BOMLine.objects.all()))
+        self._finish()
+
+    def _load_tree(self, root_bom_ids):
+        # One round trip per BOM level, for callers that only need a few trees
+        self._add_boms(self._bom_rows(BillOfMaterials.objects.filter(pk__in=list(root_bom_ids))))
+        pending = set(self.boms)
+        seen_products = set()
+        while pending:
+            rows = list(self._line_rows(BOMLine.objects.filter(bom_id__in=pending)))
+            self._add_lines(rows)
+            components = {component_id for _, component_id, _, _ in rows} - seen_products
+            seen_products |= components
+            known = set(self.boms)
+            if components:
+                self._add_boms(self._bom_rows(BillOfMaterials.objects.filter(finished_product_id__in=components)))
+            pending = set(self.boms) - known
+        self._finish()
+
+    def _finish(self):
+        self.current_bom = {product_id: bom_id for product_id, (_, bom_id) in self._candidates.items()}
+
+    def lines(self, bom_id):
+        return self._lines.get(bom_id, ())
+
+    def production_time(self, bom_id):
+        return self.boms[bom_id][1]
+
+    def explode(self, bom_id):
+        """Leaf component quantities for one unit of the BOM's output, through all levels.
+
+        Sub-assemblies (components with a current BOM of their own) are
+        exploded once and the result is reused wherever they appear. Used
+        for an order's material list; run_mrp does not flatten, since stock
+        of a sub-assembly has to be netted before its components are needed.
+        """
+        return self._explode(bom_id, set())
+
+    def _explode(self, bom_id, path):
+        if bom_id in self._explosions:
+            return self._explosions[bom_id]
+        if bom_id in path:
+            raise ValidationError(f'BOM cycle detected at BOM #{bom_id}.')
+        path.add(bom_id)
+        totals = defaultdict(Decimal)
+        for component_id, per_unit in self.lines(bom_id):
+            child = self.current_bom.get(component_id)
+            if child is None:
+                totals[component_id] += per_unit
+            else:
+                for leaf_id, leaf_quantity in self._explode(child, path).items():
+                    totals[leaf_id] += per_unit * leaf_quantity
+        path.discard(bom_id)
+        self._explosions[bom_id] = dict(totals)
+        return self._explosions[bom_id]
+
+    def low_level_order(self, product_ids):
+        """Products reachable from ``product_ids`` with every parent before its components"""
+        children = {}
+        indegree = defaultdict(int)
+        queue = deque(product_ids)
+        reached = set(product_ids)
+        while queue:
+            product_id = queue.popleft()
+            bom_id = self.current_bom.get(product_id)
+            kids = {component_id for component_id, _ in self.lines(bom_id)} if bom_id else set()
+            children[product_id] = kids
+            for kid in kids:
+                indegree[kid] += 1
+                if kid not in reached:
+                    reached.add(kid)
+                    queue.append(kid)
+
+        ready = deque(p for p in reached if not indegree[p])
+        ordered = []
+        while ready:
+            product_id = ready.popleft()
+            ordered.append(product_id)
+            for kid in children[product_id]:
+                indegree[kid] -= 1
+                if not indegree[kid]:
+                    ready.append(kid)
+        if len(ordered) != len(reached):
+            raise ValidationError('BOM cycle detected; check the BOMs of the components being planned.')
+        return ordered
+
+
+class MRPResult:
+    """Outcome of an MRP run.
+
+    ``shortages`` holds one dict per item and need date that stock and
+    scheduled receipts cannot cover: product_id, date, quantity, action
+    ('make' for items with a BOM, 'buy' otherwise), bom_id and start_date.
+    ``items`` summarises gross requirement, on-hand, scheduled receipts and
+    total shortage per product.
+    """
+
+    def __init__(self):
+        self.shortages = []
+        self.items = {}
+        self.order_count = 0
+
+    def shortages_for(self, product_id):
+        return [s for s in self.shortages if s['product_id'] == product_id]
+
+
+def _on_hand():
+    from inventory.models import Stock
+    rows = Stock.objects.values('product_id').annotate(
+        available=Sum(F('quantity') - F('reserved_quantity'))
+    ).values_list('product_id', 'available')
+    return {product_id: available or ZERO for product_id, available in rows}
+
+
+def _purchase_receipts(receipts):
+    from procurement.models import PurchaseOrderItem
+    rows = PurchaseOrderItem.objects.filter(
+        purchase_order__status__in=OPEN_PO_STATUSES, quantity__gt=F('received_quantity')
+    ).values_list('product_id', 'purchase_order__expected_delivery', 'quantity', 'received_quantity')
+    for product_id, due, quantity, received in rows:
+        receipts[product_id][due] += quantity - received
+
+
+def _start_date(due, bom_time, quantity):
+    """Latest start date for making ``quantity`` by ``due`` (production_time is hours per unit)"""
+    hours = bom_time * quantity
+    if hours <= 0:
+        return due
+    return due - timedelta(days=math.ceil(hours / 24))
+
+
+def run_mrp(as_of=None):
+    """Net material requirements for all open production orders in one pass.
+
+    Every BOM and BOM line is read in two queries, stock and open purchase
+    order lines in one each. Open production orders create gross
+    requirements for their BOM components on their planned start date and
+    a scheduled receipt of their product on their planned end date.
+
+    Items are then processed in low-level-code order, so each item's gross
+    requirements from every parent are known before it is netted. Need
+    dates are walked in order against stock on hand plus receipts due by
+    then. Any uncovered quantity becomes a shortage. For items with a BOM,
+    that shortage is planned as a make order, and its components are
+    required at its start date. Requirements are summed per item and date
+    before exploding, so a sub-assembly used by thousands of orders is
+    exploded once per date.
+    """
+    graph = BOMGraph(as_of)
+    result = MRPResult()
+
+    gross = defaultdict(lambda: defaultdict(Decimal))
+    receipts = defaultdict(lambda: defaultdict(Decimal))
+
+    demand = defaultdict(Decimal)  # (bom_id, need date) -> units still to make
+    orders = ProductionOrder.objects.exclude(status__in=OPEN_ORDER_EXCLUDE).values_list(
+        'bom_id', 'product_id', 'quantity', 'completed_quantity', 'planned_start', 'planned_end'
+    )
+    for bom_id, product_id, quantity, completed, planned_start, planned_end in orders.iterator(chunk_size=2000):
+        remaining = quantity - (completed or ZERO)
+        if remaining <= 0:
+            continue
+        result.order_count += 1
+        demand[(bom_id, timezone.localdate(planned_start))] += remaining
+        receipts[product_id][timezone.localdate(planned_end)] += remaining
+
+    for (bom_id, need_date), remaining in demand.items():
+        for component_id, per_unit in graph.lines(bom_id):
+            gross[component_id][need_date] += per_unit * remaining
+
+    _purchase_receipts(receipts)
+    on_hand = _on_hand()
+
+    for product_id in graph.low_level_order(list(gross)):
+        requirements = gross.get(product_id)
+        if not requirements:
+            continue
+        available = on_hand.get(product_id, ZERO)
+        scheduled = receipts.get(product_id, {})
+        arrivals = sorted(scheduled.items())
+        bom_id = graph.current_bom.get(product_id)
+        item = {
+            'gross': sum(requirements.values(), ZERO),
+            'on_hand': available,
+            'scheduled_receipts': sum(scheduled.values(), ZERO),
+            'shortage': ZERO,
+        }
+
+        position = 0
+        for need_date, quantity in sorted(requirements.items()):
+            while position < len(arrivals) and arrivals[position][0] <= need_date:
+                available += arrivals[position][1]
+                position += 1
+            if available >= quantity:
+                available -= quantity
+                continue
+            short = quantity - max(available, ZERO)
+            available = ZERO
+            item['shortage'] += short
+
+            shortage = {
+                'product_id': product_id,
+                'date': need_date,
+                'quantity': short.quantize(QUANTITY),
+                'action': 'make' if bom_id else 'buy',
+                'bom_id': bom_id,
+                'start_date': need_date,
+            }
+            if bom_id:
+                start = _start_date(need_date, graph.production_time(bom_id), short)
+                shortage['start_date'] = start
+                for component_id, per_unit in graph.lines(bom_id):
+                    gross[component_id][start] += per_unit * short
+            result.shortages.append(shortage)
+
+        result.items[product_id] = item
+
+    result.shortages.sort(key=itemgetter('start_date', 'product_id'))
+    return result
+
+
+def order_requirements(order):
+    """Leaf material needed to finish a production order, through every BOM level.
+
+    Returns a list of (component_id, quantity) for the order's remaining
+    quantity, using each sub-assembly's current BOM. Read from the
+    flattened BOM table when it covers the order's BOM.
+    """
+    from .models import BOMExplosion
+
+    remaining = order.quantity - (order.completed_quantity or ZERO)
+    if remaining <= 0:
+        return []
+    # The flattened table has rows for each product's current BOM only
+    flattened = BOMExplosion.objects.filter(bom_id=order.bom_id, is_leaf=True).values_list('component_id', 'quantity')
+    if flattened:
+        return [(component_id, (per_unit * remaining).quantize(QUANTITY)) for component_id, per_unit in flattened]
+    graph = BOMGraph(root_bom_ids=[order.bom_id])
+    return [
+        (component_id, (per_unit * remaining).quantize(QUANTITY))
+        for component_id, per_unit in graph.explode(order.bom_id).items()
+    ]
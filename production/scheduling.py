@@ -0,0 +1,252 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import BOMLine, Operation, ProductionOperation, ProductionOrder, WorkCenter
+
+# Orders whose remaining operations hold work center capacity
+SCHEDULED_STATUSES = ['released', 'in_progress', 'partially_completed']
+
+BATCH_SIZE = 500
+
+
+class Timeline:
+    """Busy intervals on one work center, as sorted, non-overlapping (start, end) seconds"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def reserve(self, start, end):
+        index = bisect_right(self.starts, start)
+        # Merge with any interval it touches, so ends stay sorted too
+        if index and self.ends[index - 1] >= start:
+            index -= 1
+            start = self.starts[index]
+            end = max(end, self.ends[index])
+            del self.starts[index], self.ends[index]
+        while index < len(self.starts) and self.starts[index] <= end:
+            end = max(end, self.ends[index])
+            del self.starts[index], self.ends[index]
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+
+    def earliest(self, ready, duration):
+        """First start at or after ``ready`` with ``duration`` seconds free"""
+        if not self.ends or ready >= self.ends[-1]:
+            return ready
+        start = ready
+        # Intervals ending at or before ``ready`` cannot get in the way
+        for index in range(bisect_right(self.ends, ready), len(self.starts)):
+            if self.starts[index] - start >= duration:
+                return start
+            start = max(start, self.ends[index])
+        return start
+
+
+def _seconds(value):
+    return value.timestamp()
+
+
+def _datetime(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def _run_seconds(setup, cycle, capacity, quantity):
+    """Setup plus run time in seconds: cycle_time per unit, else the work center's rate"""
+    if cycle:
+        hours = setup + cycle * quantity
+    elif capacity:
+        hours = setup + quantity / capacity
+    else:
+        hours = setup
+    return hours * 3600
+
+
+class Scheduler:
+    """Finite-capacity forward scheduler for production order operations.
+
+    Orders are taken by priority (1 first), then planned start. Each
+    operation in an order starts no earlier than the previous operation
+    ends, the order's planned start, or now. It goes into the first gap on
+    its work center that is long enough. Work centers run one operation
+    at a time, around the clock. Lower-priority orders therefore fill the
+    gaps that higher-priority ones leave.
+
+    In-progress operations keep their slot and are never moved. Completed
+    and cancelled operations are ignored.
+    """
+
+    def __init__(self, now=None):
+        self.now = _seconds(now or timezone.now())
+        self.timelines = defaultdict(Timeline)
+        self._operations = {
+            pk: (float(setup or 0), float(cycle or 0), work_center_id)
+            for pk, setup, cycle, work_center_id in Operation.objects.values_list(
+                'pk', 'setup_time', 'cycle_time', 'work_center_id'
+            )
+        }
+        self._capacity = {
+            pk: float(capacity or 0)
+            for pk, capacity in WorkCenter.objects.values_list('pk', 'capacity_per_hour')
+        }
+        self._routings = None
+
+    def _routing(self, bom_id):
+        """Operations in the order they first appear on the BOM's lines"""
+        if self._routings is None:
+            self._routings = defaultdict(list)
+            rows = BOMLine.objects.filter(operation__isnull=False).order_by('bom_id', 'pk')
+            for line_bom_id, operation_id in rows.values_list('bom_id', 'operation_id'):
+                if operation_id not in self._routings[line_bom_id]:
+                    self._routings[line_bom_id].append(operation_id)
+        return self._routings.get(bom_id, [])
+
+    def _duration(self, step, order):
+        setup, cycle, work_center_id = self._operations[step['operation_id']]
+        remaining = float(order['quantity'] - (order['completed_quantity'] or 0))
+        return _run_seconds(setup, cycle, self._capacity.get(work_center_id), remaining)
+
+    def block(self, work_center_id, start, end):
+        """Mark time on a work center as taken (datetimes)"""
+        self.timelines[work_center_id].reserve(_seconds(start), _seconds(end))
+
+    def plan(self, orders, operations):
+        """Schedule ``orders`` (value dicts) and return the operations to write.
+
+        ``operations`` maps order id to that order's existing
+        ProductionOperation value dicts. Orders with none get a routing
+        from their BOM lines. Returns (new operations, updated windows,
+        order end times).
+        """
+        created, updated, order_ends = [], [], {}
+        orders = sorted(orders, key=lambda o: (o['priority'], o['planned_start'], o['id']))
+        routes = {}
+        running = {}
+        for order in orders:
+            steps = operations.get(order['id']) or [
+                {'id': None, 'operation_id': operation_id, 'sequence': (index + 1) * 10,
+                 'status': 'pending', 'actual_start': None, 'planned_end': None}
+                for index, operation_id in enumerate(self._routing(order['bom_id']))
+            ]
+            routes[order['id']] = sorted(
+                (s for s in steps if s['status'] not in ('completed', 'cancelled')),
+                key=lambda s: s['sequence']
+            )
+            # Running operations hold their slot before anything else is placed
+            for step in routes[order['id']]:
+                if step['status'] == 'in_progress':
+                    start = _seconds(step['actual_start']) if step['actual_start'] else self.now
+                    end = max(start + self._duration(step, order), _seconds(step['planned_end']) if step['planned_end'] else 0)
+                    self.timelines[self._operations[step['operation_id']][2]].reserve(start, end)
+                    # By row: a routing may use the same operation more than once
+                    running[step['id']] = end
+
+        for order in orders:
+            ready = max(self.now, _seconds(order['planned_start']))
+            end = None
+            for step in routes[order['id']]:
+                if step['status'] == 'in_progress':
+                    end = running[step['id']]
+                    ready = max(ready, end)
+                    continue
+
+                duration = self._duration(step, order)
+                timeline = self.timelines[self._operations[step['operation_id']][2]]
+                start = timeline.earliest(ready, duration)
+                end = start + duration
+                if duration:
+                    timeline.reserve(start, end)
+                ready = end
+
+                window = (_datetime(start), _datetime(end))
+                if step['id'] is None:
+                    created.append(ProductionOperation(
+                        production_order_id=order['id'], operation_id=step['operation_id'],
+                        sequence=step['sequence'], planned_start=window[0], planned_end=window[1]
+                    ))
+                else:
+                    updated.append((step['id'],) + window)
+            if end is not None:
+                order_ends[order['id']] = _datetime(end)
+        return created, updated, order_ends
+
+
+def _order_rows(queryset):
+    return queryset.values(
+        'id', 'bom_id', 'quantity', 'completed_quantity', 'priority', 'planned_start'
+    )
+
+
+def _operation_rows(queryset):
+    operations = defaultdict(list)
+    for row in queryset.values(
+        'id', 'production_order_id', 'operation_id', 'sequence', 'status', 'actual_start', 'planned_end'
+    ):
+        operations[row['production_order_id']].append(row)
+    return operations
+
+
+def _write(created, updated, order_ends):
+    """Store the planned windows: bulk inserts, and executemany for the updates"""
+    ops = connection.ops
+    operation_table = ops.quote_name(ProductionOperation._meta.db_table)
+    order_table = ops.quote_name(ProductionOrder._meta.db_table)
+    with transaction.atomic():
+        ProductionOperation.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        with connection.cursor() as cursor:
+            if updated:
+                cursor.executemany(
+                    f'UPDATE {operation_table} SET planned_start = %s, planned_end = %s WHERE id = %s',
+                    [(ops.adapt_datetimefield_value(start), ops.adapt_datetimefield_value(end), pk)
+                     for pk, start, end in updated]
+                )
+            if order_ends:
+                cursor.executemany(
+                    f'UPDATE {order_table} SET planned_end = %s WHERE id = %s',
+                    [(ops.adapt_datetimefield_value(end), pk) for pk, end in order_ends.items()]
+                )
+
+
+def schedule_all(now=None):
+    """Reschedule every released or running order from scratch.
+
+    Returns the number of operations written.
+    """
+    scheduler = Scheduler(now)
+    orders = list(_order_rows(ProductionOrder.objects.filter(status__in=SCHEDULED_STATUSES)))
+    operations = _operation_rows(
+        ProductionOperation.objects.filter(production_order__status__in=SCHEDULED_STATUSES)
+    )
+    created, updated, order_ends = scheduler.plan(orders, operations)
+    _write(created, updated, order_ends)
+    return len(created) + len(updated)
+
+
+def reschedule_order(order, now=None):
+    """Re-plan a single order around the windows every other order already holds.
+
+    Other orders are not moved, so this is cheap enough to run on every
+    order edit. A full schedule_all() pass re-optimises the whole load.
+    """
+    if order.status not in SCHEDULED_STATUSES:
+        return 0
+    scheduler = Scheduler(now)
+    operations = _operation_rows(ProductionOperation.objects.filter(production_order=order))
+    routing = operations.get(order.pk) or [{'operation_id': pk} for pk in scheduler._routing(order.bom_id)]
+    work_centers = {scheduler._operations[step['operation_id']][2] for step in routing}
+
+    # Existing load on those work centers, from every other scheduled order
+    busy = ProductionOperation.objects.filter(
+        operation__work_center_id__in=work_centers,
+        production_order__status__in=SCHEDULED_STATUSES,
+        status__in=['pending', 'in_progress'],
+    ).exclude(production_order=order).values_list('operation__work_center_id', 'planned_start', 'planned_end')
+    for work_center_id, start, end in busy:
+        if end > start:
+            scheduler.block(work_center_id, start, end)
+
+    created, updated, order_ends = scheduler.plan(list(_order_rows(ProductionOrder.objects.filter(pk=order.pk))), operations)
+    _write(created, updated, order_ends)
+    return len(created) + len(updated)
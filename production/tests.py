@@ -1,3 +1,292 @@
+from datetime import date, datetime
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from inventory.models import Product, UnitOfMeasure, Warehouse
+from inventory.posting import post_movement
+from procurement.models import PurchaseOrder, PurchaseOrderItem, Supplier
+from .closure import explode, rebuild_bom_closure, refresh_bom_closure, where_used
+from .forms import BOMLineFormSet
+from .models import (
+    BillOfMaterials, BOMExplosion, BOMLine, Operation, ProductionOperation, ProductionOrder, WorkCenter
+)
+from .mrp import BOMGraph, order_requirements, run_mrp
+from .scheduling import schedule_all
 
-# Create your tests here.
+
+def at(day, hour=8):
+    return timezone.make_aware(datetime(2025, 3, day, hour))
+
+
+class ProductionTestCase(TestCase):
+    """A finished good made of two sub-assemblies and a part also used inside them:
+
+    FG  = 2 x SA + 1 x RM1
+    SA  = 3 x RM2 (10% line scrap) + 1 x RM1, 2 hours per unit
+    """
+
+    def setUp(self):
+        self.uom = UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        self.warehouse = Warehouse.objects.create(name='Main', code='MAIN', location='-')
+        self.fg = self.make_product('FG', 'finished')
+        self.sa = self.make_product('SA', 'semi')
+        self.rm1 = self.make_product('RM1')
+        self.rm2 = self.make_product('RM2')
+        self.fg_bom = self.make_bom(self.fg, [(self.sa, 2), (self.rm1, 1)])
+        self.sa_bom = self.make_bom(self.sa, [(self.rm2, 3, 10), (self.rm1, 1)], production_time=2)
+
+    def make_product(self, sku, product_type='raw'):
+        return Product.objects.create(SKU=sku, name=sku, product_type=product_type, unit_of_measure=self.uom)
+
+    def make_bom(self, product, lines, code=None, **fields):
+        fields.setdefault('effective_date', date(2025, 1, 1))
+        bom = BillOfMaterials.objects.create(code=code or f'BOM-{product.SKU}', finished_product=product, **fields)
+        for component, quantity, *scrap in lines:
+            BOMLine.objects.create(bom=bom, component=component, quantity=quantity, unit_of_measure=self.uom,
+                                   scrap_percentage=scrap[0] if scrap else 0)
+        return bom
+
+    def make_order(self, quantity, start, end, bom=None, **fields):
+        bom = bom or self.fg_bom
+        return ProductionOrder.objects.create(
+            bom=bom, product=bom.finished_product, quantity=quantity, uom=self.uom,
+            planned_start=start, planned_end=end, **fields
+        )
+
+
+class MRPTest(ProductionTestCase):
+
+    def test_explosion_through_every_level(self):
+        graph = BOMGraph()
+        explosion = graph.explode(self.fg_bom.pk)
+        self.assertEqual(explosion, {self.rm2.pk: Decimal('6.6'), self.rm1.pk: Decimal('3')})
+        # Memoized: the sub-assembly is flattened once
+        self.assertIs(graph.explode(self.sa_bom.pk), graph.explode(self.sa_bom.pk))
+
+        # Trees loaded level by level give the same answer
+        self.assertEqual(BOMGraph(root_bom_ids=[self.fg_bom.pk]).explode(self.fg_bom.pk), explosion)
+
+    def test_current_bom_version(self):
+        self.make_bom(self.sa, [(self.rm2, 1)], code='SA-FUTURE', effective_date=date(2099, 1, 1))
+        self.make_bom(self.sa, [(self.rm2, 9)], code='SA-OLD', effective_date=date(2024, 1, 1))
+        self.make_bom(self.sa, [(self.rm2, 7)], code='SA-INACTIVE', effective_date=date(2025, 2, 1),
+                      is_active=False)
+        self.assertEqual(BOMGraph(as_of=date(2025, 6, 1)).current_bom[self.sa.pk], self.sa_bom.pk)
+        self.assertEqual(BOMGraph(as_of=date(2099, 6, 1)).explode(self.fg_bom.pk)[self.rm2.pk], Decimal('2'))
+
+    def test_low_level_order_puts_parents_first(self):
+        order = BOMGraph().low_level_order([self.fg.pk])
+        self.assertEqual(order[0], self.fg.pk)
+        # RM1 is used directly by FG, but also by SA one level further down
+        self.assertLess(order.index(self.sa.pk), order.index(self.rm1.pk))
+        self.assertLess(order.index(self.sa.pk), order.index(self.rm2.pk))
+
+    def test_cycles_are_rejected(self):
+        BOMLine.objects.create(bom=self.sa_bom, component=self.fg, quantity=1, unit_of_measure=self.uom)
+        graph = BOMGraph()
+        with self.assertRaises(ValidationError):
+            graph.explode(self.fg_bom.pk)
+        with self.assertRaises(ValidationError):
+            graph.low_level_order([self.fg.pk])
+
+    def test_netting_against_stock_and_receipts(self):
+        post_movement('IN', self.sa, self.warehouse, 5)
+        post_movement('IN', self.rm1, self.warehouse, 20)
+        supplier = Supplier.objects.create(code='S1', name='Supplier', contact_person='-',
+                                           email='s@example.com', phone='-', address='-')
+        for due, quantity in ((date(2025, 3, 7), 40), (date(2025, 3, 20), 100)):
+            purchase_order = PurchaseOrder.objects.create(
+                supplier=supplier, order_date=date(2025, 3, 1), expected_delivery=due,
+                status='confirmed', delivery_address='-'
+            )
+            PurchaseOrderItem.objects.create(purchase_order=purchase_order, product=self.rm2, quantity=quantity,
+                                             unit_price=1, warehouse=self.warehouse)
+        self.make_order(10, at(10), at(12))
+        self.make_order(99, at(10), at(12), status='completed')
+
+        result = run_mrp(as_of=date(2025, 3, 1))
+        self.assertEqual(result.order_count, 1)
+        shortages = {(s['product_id'], s['date']): s for s in result.shortages}
+
+        # 20 SA needed on the 10th, 5 in stock: make 15, which takes 30 hours
+        sa = shortages[(self.sa.pk, date(2025, 3, 10))]
+        self.assertEqual((sa['quantity'], sa['action'], sa['start_date']), (Decimal('15'), 'make', date(2025, 3, 8)))
+        # 15 SA need 49.5 RM2 on the 8th; only the receipt due on the 7th counts
+        rm2 = shortages[(self.rm2.pk, date(2025, 3, 8))]
+        self.assertEqual((rm2['quantity'], rm2['action']), (Decimal('9.5'), 'buy'))
+        # RM1: 15 for the SA order on the 8th come out of stock first, 10 for FG on the 10th fall 5 short
+        self.assertEqual(shortages[(self.rm1.pk, date(2025, 3, 10))]['quantity'], Decimal('5'))
+        self.assertEqual(len(result.shortages), 3)
+        self.assertEqual(result.items[self.rm1.pk]['gross'], Decimal('25'))
+        self.assertEqual(result.items[self.rm2.pk]['scheduled_receipts'], Decimal('140'))
+
+    def test_finished_output_is_a_receipt_for_parents(self):
+        # An open SA order finishing before the FG order starts covers its demand
+        self.make_order(20, at(1), at(5), bom=self.sa_bom)
+        self.make_order(10, at(10), at(12))
+        result = run_mrp(as_of=date(2025, 3, 1))
+        self.assertEqual(result.shortages_for(self.sa.pk), [])
+        self.assertEqual(result.items[self.sa.pk]['scheduled_receipts'], Decimal('20'))
+
+    def test_material_issue_lists_leaf_materials(self):
+        order = self.make_order(10, at(10), at(12), completed_quantity=4)
+        self.assertEqual(order_requirements(order), [(self.rm2.pk, Decimal('39.600')), (self.rm1.pk, Decimal('18.000'))])
+        post_movement('IN', self.rm1, self.warehouse, 20)
+
+        self.client.force_login(User.objects.create(username='planner'))
+        response = self.client.get(reverse('production:material_issue', args=[order.pk]))
+        self.assertEqual(
+            [(r['product'], r['quantity'], r['shortage']) for r in response.context['requirements']],
+            [(self.rm2, Decimal('39.600'), Decimal('39.600')), (self.rm1, Decimal('18.000'), 0)]
+        )
+        self.assertContains(response, 'RM2')
+
+
+class BOMClosureTest(ProductionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rebuild_bom_closure()
+
+    def rows(self):
+        return set(BOMExplosion.objects.values_list('product_id', 'component_id', 'quantity', 'level', 'is_leaf'))
+
+    def test_rebuild_flattens_every_level(self):
+        self.assertEqual(
+            {(r.component, r.quantity) for r in explode(self.fg)},
+            {(self.rm2, Decimal('6.6')), (self.rm1, Decimal('3'))}
+        )
+        # The sub-assembly itself is kept, but not as a leaf
+        row = BOMExplosion.objects.get(product=self.fg, component=self.sa)
+        self.assertEqual((row.quantity, row.level, row.is_leaf), (Decimal('2'), 1, False))
+        # RM2 only comes in through SA
+        self.assertEqual(BOMExplosion.objects.get(product=self.fg, component=self.rm2).level, 2)
+
+    def test_where_used(self):
+        self.assertEqual(
+            {(r.product, r.quantity) for r in where_used(self.rm1)},
+            {(self.fg, Decimal('3')), (self.sa, Decimal('1'))}
+        )
+        self.assertEqual([r.product for r in where_used(self.sa)], [self.fg])
+        self.assertFalse(where_used(self.fg).exists())
+
+    def test_refresh_matches_rebuild(self):
+        line = self.sa_bom.lines.get(component=self.rm2)
+        line.quantity = 5
+        line.save()
+        refresh_bom_closure([self.sa.pk])
+        self.assertEqual(BOMExplosion.objects.get(product=self.fg, component=self.rm2).quantity, Decimal('11'))
+        refreshed = self.rows()
+        rebuild_bom_closure()
+        self.assertEqual(self.rows(), refreshed)
+
+    def test_cycle_is_rejected_and_nothing_is_written(self):
+        BOMLine.objects.create(bom=self.sa_bom, component=self.fg, quantity=1, unit_of_measure=self.uom)
+        before = self.rows()
+        with self.assertRaises(ValidationError):
+            refresh_bom_closure([self.sa.pk])
+        self.assertEqual(self.rows(), before)
+
+
+class BOMViewTest(ProductionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rebuild_bom_closure()
+        self.client.force_login(User.objects.create(username='engineer'))
+
+    def post_data(self, bom, lines):
+        prefix = BOMLineFormSet(instance=bom).prefix
+        data = {
+            'code': bom.code, 'finished_product': bom.finished_product_id, 'version': bom.version,
+            'effective_date': '2025-01-01', 'production_time': bom.production_time,
+            'scrap_rate': bom.scrap_rate, 'notes': '', 'is_active': 'on',
+            f'{prefix}-TOTAL_FORMS': len(lines), f'{prefix}-INITIAL_FORMS': 0,
+            f'{prefix}-MIN_NUM_FORMS': 0, f'{prefix}-MAX_NUM_FORMS': 1000,
+        }
+        for index, (component, quantity) in enumerate(lines):
+            data.update({
+                f'{prefix}-{index}-component': component.pk, f'{prefix}-{index}-quantity': quantity,
+                f'{prefix}-{index}-unit_of_measure': self.uom.pk, f'{prefix}-{index}-scrap_percentage': 0,
+            })
+        return data
+
+    def test_create_refreshes_closure_and_detail_renders(self):
+        top = self.make_product('TOP', 'finished')
+        bom = BillOfMaterials(code='BOM-TOP', finished_product=top)
+        response = self.client.post(reverse('production:bom_create'), self.post_data(bom, [(self.fg, 1)]))
+        bom = BillOfMaterials.objects.get(code='BOM-TOP')
+        self.assertRedirects(response, reverse('production:bom_detail', args=[bom.pk]))
+        self.assertEqual(BOMExplosion.objects.get(product=top, component=self.rm2).quantity, Decimal('6.6'))
+
+        response = self.client.get(reverse('production:bom_detail', args=[bom.pk]))
+        self.assertEqual({r.component for r in response.context['explosion']}, {self.rm1, self.rm2})
+        self.assertContains(response, 'RM2')
+        response = self.client.get(reverse('production:bom_detail', args=[self.sa_bom.pk]))
+        self.assertEqual({r.product for r in response.context['where_used']}, {self.fg, top})
+
+    def test_cycle_is_a_form_error_and_rolled_back(self):
+        before = set(BOMExplosion.objects.values_list('product_id', 'component_id', 'quantity'))
+        response = self.client.post(
+            reverse('production:bom_update', args=[self.sa_bom.pk]),
+            self.post_data(self.sa_bom, [(self.fg, 1)])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('cycle', str(response.context['form'].non_field_errors()))
+        self.assertFalse(self.sa_bom.lines.filter(component=self.fg).exists())
+        self.assertEqual(set(BOMExplosion.objects.values_list('product_id', 'component_id', 'quantity')), before)
+
+
+class SchedulerTest(ProductionTestCase):
+    """Cutting and welding take one hour per unit, each on its own work center"""
+
+    def setUp(self):
+        super().setUp()
+        self.saw = WorkCenter.objects.create(code='SAW', name='Saw')
+        self.welder = WorkCenter.objects.create(code='WELD', name='Welder')
+        self.cut = Operation.objects.create(code='CUT', name='Cut', work_center=self.saw, cycle_time=1)
+        self.weld = Operation.objects.create(code='WELD', name='Weld', work_center=self.welder, cycle_time=1)
+        self.fg_bom.lines.update(operation=self.cut)
+
+    def release(self, quantity, start, **fields):
+        fields.setdefault('status', 'released')
+        return self.make_order(quantity, start, start, **fields)
+
+    def window(self, order, sequence=10):
+        operation = ProductionOperation.objects.get(production_order=order, sequence=sequence)
+        return operation.planned_start, operation.planned_end
+
+    def test_capacity_conflicts_queue_by_priority(self):
+        low = self.release(2, at(1), priority=5)
+        high = self.release(2, at(1), priority=1)
+        schedule_all(now=at(1))
+        self.assertEqual(self.window(high), (at(1, 8), at(1, 10)))
+        self.assertEqual(self.window(low), (at(1, 10), at(1, 12)))
+        low.refresh_from_db()
+        self.assertEqual(low.planned_end, at(1, 12))
+
+    def test_lower_priority_orders_fill_gaps(self):
+        first = self.release(2, at(1, 10), priority=1)
+        short = self.release(1, at(1))
+        long = self.release(3, at(1))
+        schedule_all(now=at(1))
+        self.assertEqual(self.window(first), (at(1, 10), at(1, 12)))
+        # One hour fits before the priority order; three do not
+        self.assertEqual(self.window(short), (at(1, 8), at(1, 9)))
+        self.assertEqual(self.window(long), (at(1, 12), at(1, 15)))
+
+    def test_operation_used_twice_in_a_routing(self):
+        order = self.release(1, at(1), status='in_progress')
+        for sequence, operation, status, end in ((10, self.cut, 'in_progress', at(1, 9)),
+                                                  (20, self.weld, 'pending', at(1, 9)),
+                                                  (30, self.cut, 'in_progress', at(1, 14))):
+            ProductionOperation.objects.create(
+                production_order=order, operation=operation, sequence=sequence, status=status,
+                planned_start=at(1), planned_end=end, actual_start=at(1) if status == 'in_progress' else None
+            )
+        schedule_all(now=at(1))
+        # Welding follows the first cut, not the second one
+        self.assertEqual(self.window(order, 20), (at(1, 9), at(1, 10)))
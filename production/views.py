@@ -3,10 +3,14 @@ from django.views.generic import ListView, CreateView, UpdateView, DetailView, D
 from django.urls import reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.db.models import Q, Sum, Count
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q, Sum, Count, F
 from django.utils import timezone
 from .models import BillOfMaterials, ProductionOrder, WorkCenter, Operation, BOMLine
 from .forms import BOMForm, BOMLineFormSet, ProductionOrderForm, WorkCenterForm, OperationForm
+from .closure import explode, refresh_bom_closure, where_used
+from .scheduling import reschedule_order
 
 class BOMListView(LoginRequiredMixin, ListView):
     model = BillOfMaterials
@@ -43,10 +47,8 @@ class BOMCreateView(CreateView):
             context['bom_lines_formset'] = BOMLineFormSet()
         
         # Add additional context
-        from inventory.models import Product
         from production.models import Operation
         
-        context['raw_materials'] = Product.objects.filter(product_type='raw', is_active=True)
         context['operations'] = Operation.objects.filter(is_active=True)
         
         return context
@@ -56,13 +58,21 @@ class BOMCreateView(CreateView):
         bom_lines_formset = context['bom_lines_formset']
         
         if bom_lines_formset.is_valid():
-            # Save the BOM first
-            self.object = form.save()
-            # Save the formset with the BOM instance
-            bom_lines_formset.instance = self.object
-            bom_lines_formset.save()
+            try:
+                with transaction.atomic():
+                    # Save the BOM first
+                    self.object = form.save()
+                    # Save the formset with the BOM instance
+                    bom_lines_formset.instance = self.object
+                    bom_lines_formset.save()
+                    refresh_bom_closure([self.object.finished_product_id])
+            except ValidationError as e:
+                # A BOM cycle: nothing was saved
+                self.object = None
+                form.add_error(None, e)
+                return self.render_to_response(self.get_context_data(form=form))
             
-            return redirect('bom_detail', pk=self.object.pk)
+            return redirect('production:bom_detail', pk=self.object.pk)
         else:
             return self.render_to_response(self.get_context_data(form=form))
 
@@ -79,10 +89,8 @@ class BOMUpdateView(UpdateView):
             context['bom_lines_formset'] = BOMLineFormSet(instance=self.object)
         
         # Add additional context
-        from inventory.models import Product
         from production.models import Operation
         
-        context['raw_materials'] = Product.objects.filter(product_type='raw', is_active=True)
         context['operations'] = Operation.objects.filter(is_active=True)
         
         return context
@@ -92,10 +100,19 @@ class BOMUpdateView(UpdateView):
         bom_lines_formset = context['bom_lines_formset']
         
         if bom_lines_formset.is_valid():
-            self.object = form.save()
-            bom_lines_formset.instance = self.object
-            bom_lines_formset.save()
-            return redirect('bom_detail', pk=self.object.pk)
+            previous_product = form.initial.get('finished_product')
+            try:
+                with transaction.atomic():
+                    self.object = form.save()
+                    bom_lines_formset.instance = self.object
+                    bom_lines_formset.save()
+                    # Only this product and the assemblies that use it are recomputed
+                    refresh_bom_closure([self.object.finished_product_id, previous_product])
+            except ValidationError as e:
+                # A BOM cycle: the edit is rolled back
+                form.add_error(None, e)
+                return self.render_to_response(self.get_context_data(form=form))
+            return redirect('production:bom_detail', pk=self.object.pk)
         else:
             return self.render_to_response(self.get_context_data(form=form))
 
@@ -103,6 +120,13 @@ class BOMDetailView(LoginRequiredMixin, DetailView):
     model = BillOfMaterials
     template_name = 'production/bom_detail.html'
     context_object_name = 'bom'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Flattened explosion (empty unless this is the product's current BOM)
+        context['explosion'] = explode(self.object.finished_product).filter(bom=self.object)
+        context['where_used'] = where_used(self.object.finished_product)
+        return context
 
 
 class BOMDeleteView(LoginRequiredMixin, DeleteView):
@@ -113,6 +137,12 @@ class BOMDeleteView(LoginRequiredMixin, DeleteView):
     def delete(self, request, *args, **kwargs):
         messages.success(request, 'BOM deleted successfully!')
         return super().delete(request, *args, **kwargs)
+    
+    def form_valid(self, form):
+        product_id = self.object.finished_product_id
+        response = super().form_valid(form)
+        refresh_bom_closure([product_id])
+        return response
 
 class ProductionOrderListView(LoginRequiredMixin, ListView):
     model = ProductionOrder
@@ -158,7 +188,10 @@ class ProductionOrderUpdateView(LoginRequiredMixin, UpdateView):
     def form_valid(self, form):
         form.instance.updated_by = self.request.user
         messages.success(self.request, 'Production order updated successfully!')
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        # Re-plan this order's operations around the current work center load
+        reschedule_order(self.object)
+        return response
 
 class ProductionOrderDeleteView(LoginRequiredMixin, DeleteView):
     model = ProductionOrder
@@ -253,13 +286,34 @@ def production_dashboard(request):
 
 def material_issue_view(request, order_id):
     """View for issuing materials for production order"""
+    from inventory.models import Product, Stock
+    from .mrp import order_requirements
+
     order = get_object_or_404(ProductionOrder, pk=order_id)
     bom_lines = order.bom.lines.select_related('component').all()
-    
-    # For demo, we'll just show the materials needed
+
+    # Leaf materials through every sub-assembly level, with scrap applied
+    needed = order_requirements(order)
+    products = Product.objects.in_bulk([component_id for component_id, _ in needed])
+    available = dict(
+        Stock.objects.filter(product_id__in=products).values('product_id')
+        .annotate(available=Sum(F('quantity') - F('reserved_quantity')))
+        .values_list('product_id', 'available')
+    )
+    requirements = [
+        {
+            'product': products[component_id],
+            'quantity': quantity,
+            'available': available.get(component_id, 0),
+            'shortage': max(quantity - available.get(component_id, 0), 0),
+        }
+        for component_id, quantity in needed if component_id in products
+    ]
+
     context = {
         'order': order,
         'bom_lines': bom_lines,
+        'requirements': requirements,
     }
     return render(request, 'production/material_issue.html', context)
 
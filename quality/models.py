@@ -1,5 +1,6 @@
 from django.db import models
 from core.models import TimeStampedModel
+from core.sequences import next_document_number
 from production.models import ProductionOrder
 from procurement.models import GoodsReceiptItem
 
@@ -37,12 +38,7 @@ class QualityCheck(TimeStampedModel):
     
     def save(self, *args, **kwargs):
         if not self.qc_number:
-            last_qc = QualityCheck.objects.all().order_by('id').last()
-            if last_qc:
-                last_number = int(last_qc.qc_number.split('-')[-1])
-                self.qc_number = f"QC-{timezone.now().year}-{last_number + 1:05d}"
-            else:
-                self.qc_number = f"QC-{timezone.now().year}-00001"
+            self.qc_number = next_document_number('QC', seed_from=(QualityCheck, 'qc_number'))
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+REPORT_RESULT_KEY = 'reports:result:{name}:{params}:{versions}'
+MODEL_VERSION_KEY = 'reports:version:{model}'
+REPORT_STATS_KEY = 'reports:stats:{name}:{outcome}'
+
+# Cached report -> models (app_label.model) its figures are computed from.
+# A save or delete on any of them bumps that model's version, which is part
+# of every cache key of the report, so stale results are never looked up.
+REPORT_SOURCES = {
+    'production': ['production.productionorder'],
+    'rejection': ['production.productionorder'],
+    'quality': ['quality.qualitycheck'],
+    'quality_trends': ['quality.qualitycheck'],
+    'defect_analysis': ['quality.nonconformancereport'],
+    'overtime': ['hr.attendance'],
+    'purchase': ['procurement.purchaseorder'],
+}
+
+
+def _fresh_version():
+    # A version key that was evicted restarts above anything handed out before
+    return time.time_ns()
+
+
+def _incr(key, initial):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, initial, None):
+            return initial
+        return cache.incr(key)
+
+
+def model_versions(models):
+    """Current version of each of ``models``, as a key fragment"""
+    keys = [MODEL_VERSION_KEY.format(model=model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump_model_version(model):
+    """Invalidate every cached report reading ``model`` (a label or model class)"""
+    label = model if isinstance(model, str) else model._meta.label_lower
+    _incr(MODEL_VERSION_KEY.format(model=label), _fresh_version())
+
+
+def normalize_parameters(params):
+    """Stable fragment for ``params``: sorted, stringified, empty values dropped"""
+    cleaned = {key: str(value).strip() for key, value in params.items() if value is not None and str(value).strip()}
+    return hashlib.sha1(json.dumps(cleaned, sort_keys=True).encode()).hexdigest()
+
+
+def cached_report(name, params, build):
+    """Result of ``build()`` for report ``name`` and ``params``, from the cache when current.
+
+    The key is the report name, the normalized parameters and the versions
+    of the report's REPORT_SOURCES. Results also expire after
+    REPORT_CACHE_TIMEOUT as a backstop for writes that bypass model signals.
+    """
+    key = REPORT_RESULT_KEY.format(
+        name=name, params=normalize_parameters(params), versions=model_versions(REPORT_SOURCES[name])
+    )
+    result = cache.get(key)
+    if result is None:
+        _incr(REPORT_STATS_KEY.format(name=name, outcome='misses'), 1)
+        result = build()
+        cache.set(key, result, getattr(settings, 'REPORT_CACHE_TIMEOUT', 600))
+    else:
+        _incr(REPORT_STATS_KEY.format(name=name, outcome='hits'), 1)
+    return result
+
+
+def report_cache_stats():
+    """{report: {'hits', 'misses', 'hit_rate'}} since the counters were last reset"""
+    keys = {
+        REPORT_STATS_KEY.format(name=name, outcome=outcome): (name, outcome)
+        for name in REPORT_SOURCES for outcome in ('hits', 'misses')
+    }
+    counts = cache.get_many(keys)
+    stats = {name: {'hits': 0, 'misses': 0} for name in REPORT_SOURCES}
+    for key, value in counts.items():
+        name, outcome = keys[key]
+        stats[name][outcome] = value
+    for figures in stats.values():
+        total = figures['hits'] + figures['misses']
+        figures['hit_rate'] = figures['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_report_cache_stats():
+    cache.delete_many([
+        REPORT_STATS_KEY.format(name=name, outcome=outcome)
+        for name in REPORT_SOURCES for outcome in ('hits', 'misses')
+    ])
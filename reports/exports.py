@@ -0,0 +1,161 @@
+import csv
+import re
+import tempfile
+from datetime import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+
+CHUNK_SIZE = 2000
+STREAM_FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+HEADER_STYLE = 'report_header'
+
+
+class _Echo:
+    """File-like object csv.writer writes to; hands each line straight back"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, columns):
+    """Row tuples for ``columns``, read with values_list in chunks of CHUNK_SIZE.
+
+    ``columns`` is a list of (heading, source). A string source is a
+    values_list path; a callable gets a dict of the string sources of
+    the row and returns a derived value. No model instances are built
+    and the queryset keeps no result cache, so memory does not grow
+    with the number of rows.
+    """
+    fields = [source for _, source in columns if isinstance(source, str)]
+    rows = queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+    if len(fields) == len(columns):
+        yield from rows
+        return
+    for row in rows:
+        record = dict(zip(fields, row))
+        yield tuple(source(record) if callable(source) else record[source] for _, source in columns)
+
+
+def _batches(lines):
+    """Join generated lines into chunks, so the server writes in blocks rather than per row"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= CHUNK_SIZE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([heading for heading, _ in columns])
+    yield from _batches(writer.writerow(row) for row in rows)
+
+
+def stream_json(columns, rows):
+    """A JSON array of objects keyed by the column headings in snake_case"""
+    keys = [slugify(heading).replace('-', '_') for heading, _ in columns]
+    encode = DjangoJSONEncoder().encode
+    yield '['
+    yield from _batches(
+        (',' if index else '') + encode(dict(zip(keys, row))) for index, row in enumerate(rows)
+    )
+    yield ']'
+
+
+def export_response(format, filename, columns, queryset):
+    """Stream ``queryset`` as a CSV or JSON download named ``filename`` (without extension)"""
+    stream = stream_csv if format == 'csv' else stream_json
+    response = StreamingHttpResponse(
+        stream(columns, export_rows(queryset, columns)), content_type=STREAM_FORMATS[format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{format}"'
+    return response
+
+
+def _sheet_title(title, used):
+    """A valid, unique worksheet name: at most 31 characters, none of []:*?/\\"""
+    base = re.sub(r'[\[\]:*?/\\]', ' ', str(title)).strip()[:31] or 'Sheet'
+    name, number = base, 1
+    while name.lower() in used:
+        number += 1
+        name = f'{base[:31 - len(str(number)) - 1]} {number}'
+    used.add(name.lower())
+    return name
+
+
+def _excel_row(row):
+    # Excel has no time zones; aware datetimes go in as local wall-clock time
+    return [
+        timezone.localtime(value).replace(tzinfo=None)
+        if value.__class__ is datetime and value.tzinfo is not None else value
+        for value in row
+    ]
+
+
+def with_progress(rows, progress, every=CHUNK_SIZE * 10):
+    """Pass ``rows`` through, calling ``progress(count)`` every ``every`` rows"""
+    for count, row in enumerate(rows, 1):
+        if count % every == 0:
+            progress(count)
+        yield row
+
+
+def write_workbook(target, sheets, progress=None):
+    """Write ``sheets`` [(title, columns, queryset)] to ``target`` as an xlsx file.
+
+    The workbook is write-only: each row is serialized as soon as it is
+    appended, so memory stays flat however many rows the querysets hold.
+    Rows come from export_rows, and the header cells share one named
+    style instead of a style object per cell. ``progress(rows)`` is
+    called now and then for long sheets.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, NamedStyle, PatternFill
+
+    workbook = Workbook(write_only=True)
+    workbook.add_named_style(NamedStyle(
+        name=HEADER_STYLE, font=Font(bold=True), fill=PatternFill('solid', fgColor='D9E1F2')
+    ))
+    used = set()
+    for title, columns, queryset in sheets:
+        sheet = workbook.create_sheet(_sheet_title(title, used))
+        sheet.freeze_panes = 'A2'
+        header = []
+        for heading, _ in columns:
+            cell = WriteOnlyCell(sheet, value=heading)
+            cell.style = HEADER_STYLE
+            header.append(cell)
+        sheet.append(header)
+        rows = export_rows(queryset, columns)
+        for row in with_progress(rows, progress) if progress else rows:
+            sheet.append(_excel_row(row))
+    if not used:
+        workbook.create_sheet('Sheet')
+    workbook.save(target)
+
+
+def excel_response(filename, sheets):
+    """Build the workbook in a temporary file and stream it as ``filename``.xlsx.
+
+    An xlsx is a zip archive that is only complete once closed, so it is
+    spooled to disk rather than memory; FileResponse then sends it in
+    blocks and closes (and so deletes) the file when done.
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        write_workbook(spool, sheets)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return FileResponse(spool, as_attachment=True, filename=f'{filename}.xlsx', content_type=EXCEL_CONTENT_TYPE)
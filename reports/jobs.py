@@ -0,0 +1,135 @@
+import hashlib
+import io
+import json
+import tempfile
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+from core.tasks import enqueue
+from .exports import export_rows, stream_csv, with_progress, write_workbook
+from .models import SavedReport
+
+# Template output format -> file extension of the generated report
+FORMATS = {
+    'csv': 'csv',
+    'excel': 'xlsx',
+}
+ACTIVE = ['queued', 'running']
+# Request fields that are not report parameters
+IGNORED_PARAMETERS = {'csrfmiddlewaretoken', 'template', 'report_name', 'format'}
+
+
+def report_sources():
+    """ReportTemplate.report_type -> (export columns, queryset from parameters)"""
+    from . import views
+    return {
+        'inventory': (views.INVENTORY_COLUMNS, views.inventory_stocks),
+        'production': (views.PRODUCTION_COLUMNS, views.production_orders),
+        'quality': (views.QUALITY_COLUMNS, views.quality_checks),
+        'attendance': (views.ATTENDANCE_COLUMNS, views.monthly_attendance),
+        'financial': (views.PURCHASE_COLUMNS, views.purchase_orders),
+    }
+
+
+def normalize_parameters(template, params):
+    """The template's default parameters overlaid with ``params``, as sorted non-empty strings"""
+    merged = dict(template.parameters or {})
+    merged.update((key, params.get(key)) for key in params if key not in IGNORED_PARAMETERS)
+    return {key: str(value).strip() for key, value in sorted(merged.items()) if str(value or '').strip()}
+
+
+def report_hash(template, parameters):
+    """Identity of a report result: the template and its normalized parameters"""
+    key = json.dumps([template.pk, template.output_format, parameters], sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _fail_orphans(digest):
+    """Mark failed the queued or running reports of ``digest`` whose task is no longer alive.
+
+    That happens when a worker dies mid-job: reclaim_stale fails its task
+    (reports get one attempt), but nothing else would ever finish the
+    report, and every later submit would join it.
+    """
+    SavedReport.objects.filter(params_hash=digest, status__in=ACTIVE).exclude(task__status__in=ACTIVE).update(
+        status='failed', error='Worker stopped responding', completed_at=timezone.now()
+    )
+
+
+def submit_report(template, params, user, report_name=''):
+    """Queue a report job, or join an identical one. Returns (report, created).
+
+    A job with the same hash that is still queued or running is reused, as
+    is a finished one younger than REPORT_JOB_REUSE_SECONDS. Two requests
+    racing past that check are stopped by the one-active-job-per-hash
+    constraint; the loser returns the winner's report.
+    """
+    if template.report_type not in report_sources():
+        raise ValueError(f'{template.get_report_type_display()} cannot be generated as a job.')
+    if template.output_format not in FORMATS:
+        raise ValueError(f'{template.get_output_format_display()} output is not supported for report jobs.')
+
+    parameters = normalize_parameters(template, params)
+    digest = report_hash(template, parameters)
+    _fail_orphans(digest)
+    reuse_after = timezone.now() - timedelta(seconds=getattr(settings, 'REPORT_JOB_REUSE_SECONDS', 300))
+    matching = SavedReport.objects.filter(params_hash=digest).filter(
+        Q(status__in=ACTIVE) | Q(status='done', completed_at__gte=reuse_after)
+    ).order_by('-pk')
+    existing = matching.first()
+    if existing:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            report = SavedReport.objects.create(
+                template=template, report_name=report_name or template.name, parameters=parameters,
+                generated_by=user, status='queued', params_hash=digest
+            )
+            # One attempt: a failure is recorded on the report and a new submit retries it
+            report.task = enqueue('reports.generate', {'report_id': report.pk}, max_attempts=1)
+            report.save(update_fields=['task'])
+    except IntegrityError:
+        return matching.first(), False
+    return report, True
+
+
+def generate_report(report_id, heartbeat=None):
+    """Run a queued report job and store its file on the SavedReport"""
+    report = SavedReport.objects.select_related('template').get(pk=report_id)
+    if not SavedReport.objects.filter(pk=report.pk, status='queued').update(status='running'):
+        # Already given up on (see _fail_orphans) or handled
+        return report
+    progress = (lambda rows: heartbeat()) if heartbeat else None
+    try:
+        columns, queryset_for = report_sources()[report.template.report_type]
+        queryset = queryset_for(report.parameters)
+        extension = FORMATS[report.template.output_format]
+        with tempfile.TemporaryFile() as spool:
+            if extension == 'xlsx':
+                write_workbook(spool, [(report.report_name, columns, queryset)], progress=progress)
+            else:
+                text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+                rows = export_rows(queryset, columns)
+                text.writelines(stream_csv(columns, with_progress(rows, progress) if progress else rows))
+                text.flush()
+                text.detach()
+            spool.seek(0)
+            name = f"{slugify(report.report_name) or 'report'}-{report.pk}.{extension}"
+            report.report_file.save(name, File(spool), save=False)
+    except Exception:
+        SavedReport.objects.filter(pk=report.pk).update(
+            status='failed', error=traceback.format_exc(), completed_at=timezone.now()
+        )
+        raise
+    report.file_size = report.report_file.size
+    report.status = 'done'
+    report.error = ''
+    report.completed_at = timezone.now()
+    report.save(update_fields=['report_file', 'file_size', 'status', 'error', 'completed_at', 'updated_at'])
+    return report
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def _in_memory(path):
+    """The previous export: a regular Workbook holding every cell until it is saved"""
+    from openpyxl import Workbook
+    from inventory.models import Stock
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Inventory Report'
+    sheet.append(['SKU', 'Product Name', 'Warehouse', 'Quantity', 'Min Stock', 'Max Stock', 'Status'])
+    rows = 0
+    for stock in Stock.objects.select_related('product', 'warehouse'):
+        sheet.append([
+            stock.product.SKU, stock.product.name, stock.warehouse.name, float(stock.quantity),
+            float(stock.product.min_stock), float(stock.product.max_stock),
+            'Low' if stock.quantity < stock.product.min_stock else 'OK',
+        ])
+        rows += 1
+    workbook.save(path)
+    return rows
+
+
+def _write_only(path):
+    from inventory.models import Stock
+    from reports.exports import write_workbook
+    from reports.views import INVENTORY_COLUMNS
+
+    stocks = Stock.objects.all()
+    write_workbook(path, [('Inventory Report', INVENTORY_COLUMNS, stocks)])
+    return stocks.count()
+
+
+def _measure(export, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.NamedTemporaryFile(suffix='.xlsx') as target:
+        started = time.perf_counter()
+        rows = export(target.name)
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(target.name)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((rows, seconds, peak, peak - before, size))
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec and peak RSS of the in-memory and write-only inventory Excel exports'
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('Needs the fork start method to measure each export in its own process.')
+        context = multiprocessing.get_context('fork')
+        for label, export in (('in-memory Workbook', _in_memory), ('write-only pipeline', _write_only)):
+            # Each export runs in a fresh child, so one's peak memory can't hide the other's
+            connections.close_all()
+            queue = context.Queue()
+            process = context.Process(target=_measure, args=(export, queue))
+            process.start()
+            rows, seconds, peak, growth, size = queue.get()
+            process.join()
+            self.stdout.write(
+                f'{label:<20} {rows} rows in {seconds:.1f}s ({rows / seconds:.0f} rows/s), '
+                f'peak RSS {peak / 1024:.0f} MB (+{growth / 1024:.0f} MB), file {size / 1024 / 1024:.1f} MB'
+            )
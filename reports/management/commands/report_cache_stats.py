@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from reports.cache import report_cache_stats, reset_report_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the report result cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them')
+
+    def handle(self, *args, **options):
+        for name, figures in sorted(report_cache_stats().items()):
+            self.stdout.write(
+                f"{name:<16} hits {figures['hits']:>8}  misses {figures['misses']:>8}  "
+                f"hit rate {figures['hit_rate']:.0%}"
+            )
+        if options['reset']:
+            reset_report_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
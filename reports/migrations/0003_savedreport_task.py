@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-17 06:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_background_task'),
+        ('reports', '0002_savedreport_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedreport',
+            name='task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.backgroundtask'),
+        ),
+    ]
@@ -31,6 +31,13 @@ class ReportTemplate(TimeStampedModel):
         return self.name
 
 class SavedReport(TimeStampedModel):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
     template = models.ForeignKey(ReportTemplate, on_delete=models.CASCADE)
     report_name = models.CharField(max_length=200)
     parameters = models.JSONField(default=dict)
@@ -39,5 +46,22 @@ class SavedReport(TimeStampedModel):
     report_file = models.FileField(upload_to='saved_reports/', null=True, blank=True)
     file_size = models.IntegerField(default=0)
     
+    # Report job: SHA-256 of template and normalized parameters, so identical requests share one run
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='done')
+    params_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    error = models.TextField(blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # The worker task generating the report; a report only counts as in flight while it is alive
+    task = models.ForeignKey('core.BackgroundTask', on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            # At most one job in flight per hash; a second submitter joins the first
+            models.UniqueConstraint(
+                fields=['params_hash'], condition=models.Q(status__in=['queued', 'running']),
+                name='reports_one_active_job_per_hash'
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.report_name} - {self.generated_date}"
\ No newline at end of file
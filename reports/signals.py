@@ -0,0 +1,15 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from .cache import REPORT_SOURCES, bump_model_version
+
+
+def report_source_changed(sender, **kwargs):
+    # After commit, so a concurrent report hit can't cache pre-write figures under the new version
+    transaction.on_commit(lambda: bump_model_version(sender))
+
+
+for label in sorted({label for labels in REPORT_SOURCES.values() for label in labels}):
+    model = apps.get_model(label)
+    post_save.connect(report_source_changed, sender=model, dispatch_uid=f'report_cache_save_{label}')
+    post_delete.connect(report_source_changed, sender=model, dispatch_uid=f'report_cache_delete_{label}')
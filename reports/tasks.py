@@ -0,0 +1,7 @@
+from core.tasks import heartbeat, register
+from .jobs import generate_report
+
+
+@register('reports.generate')
+def generate(task):
+    generate_report(task.payload['report_id'], heartbeat=lambda: heartbeat(task))
@@ -1,3 +1,282 @@
-from django.test import TestCase
+import csv
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from core.models import BackgroundTask
+from core.tasks import claim, reclaim_stale
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from inventory.models import Product, Stock, StockTransaction, UnitOfMeasure, Warehouse
+from inventory.posting import post_movement
+from procurement.models import PurchaseOrder, Supplier
+from .cache import cached_report, report_cache_stats, reset_report_cache_stats
+from .exports import HEADER_STYLE, export_rows, stream_csv, stream_json, write_workbook
+from .jobs import generate_report, normalize_parameters, report_hash, submit_report
+from .models import ReportTemplate, SavedReport
+from .views import INVENTORY_COLUMNS, STOCK_MOVEMENT_COLUMNS, inventory_stocks
 
-# Create your tests here.
+
+class ReportTestCase(TestCase):
+    """Three products stocked across two warehouses; BOLT is below its minimum"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='analyst')
+        self.client.force_login(self.user)
+        uom = UnitOfMeasure.objects.create(name='Piece', symbol='pc')
+        self.main = Warehouse.objects.create(name='Main', code='MAIN', location='-')
+        self.annex = Warehouse.objects.create(name='Annex', code='ANX', location='-')
+        for sku, warehouse, quantity, min_stock in (('BOLT', self.main, 5, 10), ('NUT', self.main, 40, 10),
+                                                    ('WASHER', self.annex, 12, 0)):
+            product = Product.objects.create(SKU=sku, name=sku.title(), product_type='raw',
+                                             unit_of_measure=uom, min_stock=min_stock)
+            Stock.objects.create(product=product, warehouse=warehouse, quantity=quantity)
+
+    def stocks(self):
+        return inventory_stocks({}).order_by('product__SKU')
+
+
+class ExportTest(ReportTestCase):
+
+    def test_csv_stream_in_batches(self):
+        with mock.patch('reports.exports.CHUNK_SIZE', 2):
+            chunks = list(stream_csv(INVENTORY_COLUMNS, export_rows(self.stocks(), INVENTORY_COLUMNS)))
+        # Header, then the three rows in blocks of two
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.reader(StringIO(''.join(chunks))))
+        self.assertEqual(rows[0], [heading for heading, _ in INVENTORY_COLUMNS])
+        self.assertEqual(rows[1], ['BOLT', 'Bolt', 'Main', '5.000', '10.00', '0.00', 'Low'])
+        self.assertEqual([row[0] for row in rows[1:]], ['BOLT', 'NUT', 'WASHER'])
+
+    def test_json_stream(self):
+        with mock.patch('reports.exports.CHUNK_SIZE', 2):
+            data = json.loads(''.join(stream_json(INVENTORY_COLUMNS, export_rows(self.stocks(), INVENTORY_COLUMNS))))
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0], {
+            'sku': 'BOLT', 'product_name': 'Bolt', 'warehouse': 'Main', 'quantity': '5.000',
+            'min_stock': '10.00', 'max_stock': '0.00', 'status': 'Low',
+        })
+        self.assertEqual(json.loads(''.join(stream_json(INVENTORY_COLUMNS, iter(())))), [])
+
+    def test_download(self):
+        response = self.client.get(reverse('reports:inventory_report'), {'format': 'csv', 'low_stock': 'true'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="inventory_report.csv"')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row[0] for row in rows[1:]], ['BOLT'])
+
+        response = self.client.get(reverse('reports:inventory_report'), {'format': 'json'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="inventory_report.json"')
+        self.assertEqual(
+            sorted(row['sku'] for row in json.loads(b''.join(response.streaming_content))),
+            ['BOLT', 'NUT', 'WASHER']
+        )
+
+
+class WorkbookTest(ReportTestCase):
+
+    def load(self, sheets):
+        target = BytesIO()
+        write_workbook(target, sheets)
+        target.seek(0)
+        return load_workbook(target)
+
+    def values(self, sheet):
+        return [list(row) for row in sheet.iter_rows(values_only=True)]
+
+    def test_one_sheet_per_queryset(self):
+        stocks = self.stocks()
+        workbook = self.load([
+            ('Main: stock [all]', INVENTORY_COLUMNS, stocks.filter(warehouse=self.main)),
+            ('main  stock  all ', INVENTORY_COLUMNS, stocks.filter(warehouse=self.annex)),
+            ('A title far longer than Excel allows for a sheet', INVENTORY_COLUMNS, stocks.none()),
+        ])
+        # Invalid characters replaced, clashing and long names made unique within 31 characters
+        self.assertEqual(workbook.sheetnames, ['Main  stock  all', 'main  stock  all 2',
+                                               'A title far longer than Excel a'])
+        first = workbook['Main  stock  all']
+        self.assertEqual(first.freeze_panes, 'A2')
+        self.assertEqual(first['A1'].style, HEADER_STYLE)
+        self.assertEqual(self.values(first), [
+            [heading for heading, _ in INVENTORY_COLUMNS],
+            ['BOLT', 'Bolt', 'Main', 5, 10, 0, 'Low'],
+            ['NUT', 'Nut', 'Main', 40, 10, 0, 'OK'],
+        ])
+        self.assertEqual(self.values(workbook.worksheets[1])[1][0], 'WASHER')
+        self.assertEqual(len(self.values(workbook.worksheets[2])), 1)
+
+    def test_datetimes_are_local_wall_clock(self):
+        post_movement('IN', Product.objects.get(SKU='NUT'), self.main, 1)
+        created = StockTransaction.objects.get().created_at
+        workbook = self.load([('Movements', STOCK_MOVEMENT_COLUMNS, StockTransaction.objects.all())])
+        value = self.values(workbook.active)[1][0]
+        self.assertIsInstance(value, datetime)
+        self.assertAlmostEqual(value, timezone.localtime(created).replace(tzinfo=None), delta=timedelta(seconds=1))
+
+    def test_empty_workbook_still_has_a_sheet(self):
+        self.assertEqual(self.load([]).sheetnames, ['Sheet'])
+
+    def test_excel_download_per_warehouse(self):
+        response = self.client.get(reverse('reports:inventory_report'), {'format': 'excel', 'sheets': 'warehouse'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="inventory_report.xlsx"')
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['Annex', 'Main'])
+        self.assertEqual(sorted(row[0] for row in self.values(workbook['Main'])[1:]), ['BOLT', 'NUT'])
+
+
+class ReportJobTest(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.template = ReportTemplate.objects.create(
+            name='Stock', report_type='inventory', output_format='csv', parameters={'low_stock': 'false'}
+        )
+
+    def submit(self, **params):
+        return submit_report(self.template, params, self.user)
+
+    def test_equivalent_parameters_share_a_hash(self):
+        parameters = normalize_parameters(self.template, {'warehouse': f' {self.main.pk} ', 'category': '',
+                                                          'format': 'csv', 'csrfmiddlewaretoken': 'x'})
+        self.assertEqual(parameters, {'low_stock': 'false', 'warehouse': str(self.main.pk)})
+        self.assertEqual(report_hash(self.template, parameters),
+                         report_hash(self.template, normalize_parameters(self.template, {'warehouse': self.main.pk})))
+        self.assertNotEqual(report_hash(self.template, parameters),
+                            report_hash(self.template, normalize_parameters(self.template, {'warehouse': self.annex.pk})))
+
+    def test_identical_request_joins_the_active_job(self):
+        report, created = self.submit(warehouse=self.main.pk)
+        self.assertTrue(created)
+        self.assertEqual(self.submit(warehouse=str(self.main.pk)), (report, False))
+        self.assertTrue(self.submit(warehouse=self.annex.pk)[1])
+        self.assertEqual(BackgroundTask.objects.filter(name='reports.generate').count(), 2)
+
+        # A finished report is reused for a while, then generated afresh
+        generate_report(report.pk)
+        self.assertEqual(self.submit(warehouse=self.main.pk), (report, False))
+        SavedReport.objects.filter(pk=report.pk).update(completed_at=timezone.now() - timedelta(hours=1))
+        self.assertTrue(self.submit(warehouse=self.main.pk)[1])
+
+    def test_losing_a_race_returns_the_winner(self):
+        winner, _ = self.submit()
+        first = QuerySet.first
+        calls = []
+
+        def racing_first(queryset):
+            # The first lookup runs before the winner's insert is visible
+            calls.append(queryset)
+            return None if len(calls) == 1 else first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', racing_first):
+            self.assertEqual(self.submit(), (winner, False))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(SavedReport.objects.count(), 1)
+
+    def test_report_of_a_dead_worker_is_not_joined(self):
+        report, _ = self.submit()
+        self.assertTrue(claim(report.task_id, 'crashed-worker'))
+        BackgroundTask.objects.filter(pk=report.task_id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        reclaim_stale()
+
+        retry, created = self.submit()
+        self.assertTrue(created)
+        report.refresh_from_db()
+        self.assertEqual((report.status, report.error), ('failed', 'Worker stopped responding'))
+        # The dead job is no longer picked up either
+        self.assertEqual(generate_report(report.pk).status, 'failed')
+        self.assertEqual(generate_report(retry.pk).status, 'done')
+
+    def test_generate_report_stores_the_file(self):
+        report = generate_report(self.submit(low_stock='true')[0].pk)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'done')
+        self.assertTrue(report.report_file.name.startswith('saved_reports/stock-'))
+        self.assertEqual(report.file_size, report.report_file.size)
+        with report.report_file.open('rb') as f:
+            rows = list(csv.reader(StringIO(f.read().decode())))
+        self.assertEqual([row[0] for row in rows], ['SKU', 'BOLT'])
+
+        self.template.output_format = 'excel'
+        self.template.save()
+        report = generate_report(self.submit()[0].pk)
+        self.assertTrue(report.report_file.name.endswith('.xlsx'))
+        self.assertGreater(report.file_size, 0)
+        self.assertEqual(report.file_size, report.report_file.size)
+
+
+class ReportCacheTest(ReportTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.builds = 0
+        self.supplier = Supplier.objects.create(code='S1', name='Supplier', contact_person='-',
+                                                email='s@example.com', phone='-', address='-')
+
+    def build(self):
+        self.builds += 1
+        return {'orders': PurchaseOrder.objects.count()}
+
+    def purchase_report(self, **params):
+        return cached_report('purchase', params, self.build)
+
+    def test_source_writes_invalidate(self):
+        self.assertEqual(self.purchase_report(), {'orders': 0})
+        self.assertEqual(self.purchase_report(), {'orders': 0})
+        self.assertEqual(self.builds, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = PurchaseOrder.objects.create(
+                supplier=self.supplier, order_date='2025-03-01', expected_delivery='2025-03-10',
+                delivery_address='-'
+            )
+        self.assertEqual(self.purchase_report(), {'orders': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.purchase_report()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(self.purchase_report(), {'orders': 0})
+        self.assertEqual(self.builds, 4)
+
+        # Models the report does not read leave it cached
+        with self.captureOnCommitCallbacks(execute=True):
+            post_movement('IN', Product.objects.get(SKU='NUT'), self.main, 1)
+        self.purchase_report()
+        self.assertEqual(self.builds, 4)
+
+    def test_equivalent_parameters_share_an_entry(self):
+        self.purchase_report(start_date='2025-01-01', end_date=None)
+        self.purchase_report(start_date=' 2025-01-01 ', end_date='')
+        self.assertEqual(self.builds, 1)
+        self.purchase_report(start_date='2025-02-01')
+        self.assertEqual(self.builds, 2)
+
+    def test_stats_count_hits_and_misses(self):
+        reset_report_cache_stats()
+        self.purchase_report()
+        self.purchase_report()
+        self.purchase_report()
+        stats = report_cache_stats()
+        self.assertEqual(stats['purchase'], {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+        self.assertEqual(stats['quality'], {'hits': 0, 'misses': 0, 'hit_rate': 0.0})
+
+        url = reverse('reports:report_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(self.client.get(url).json()['purchase']['misses'], 1)
+        reset_report_cache_stats()
+        self.assertEqual(report_cache_stats()['purchase']['hits'], 0)
@@ -35,6 +35,11 @@ urlpatterns = [
     # Custom Reports
     path('custom/create/', views.create_custom_report, name='create_custom_report'),
     path('custom/saved/', views.saved_reports_list, name='saved_reports'),
+    path('custom/submit/', views.submit_report, name='submit_report'),
+    path('custom/<int:pk>/status/', views.saved_report_status, name='saved_report_status'),
     path('custom/<int:pk>/', views.view_saved_report, name='view_saved_report'),
     path('custom/<int:pk>/download/', views.download_saved_report, name='download_saved_report'),
+    
+    # Operations
+    path('cache-stats/', views.report_cache_stats, name='report_cache_stats'),
 ]
\ No newline at end of file
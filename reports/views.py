@@ -1,14 +1,122 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Count, Avg, Q
+from django.db.models import Sum, Count, Avg, Q, F
 from django.utils import timezone
 from django.http import HttpResponse, JsonResponse
 import json
 from datetime import datetime, timedelta
-import csv
-import openpyxl
-from openpyxl import Workbook
-from io import BytesIO
+from .cache import cached_report
+from .exports import STREAM_FORMATS, excel_response, export_response
+
+
+def _stock_status(row):
+    return 'Low' if row['quantity'] < row['product__min_stock'] else 'OK'
+
+
+# Export columns per report: (heading, values_list path or function of the row)
+INVENTORY_COLUMNS = [
+    ('SKU', 'product__SKU'), ('Product Name', 'product__name'), ('Warehouse', 'warehouse__name'),
+    ('Quantity', 'quantity'), ('Min Stock', 'product__min_stock'), ('Max Stock', 'product__max_stock'),
+    ('Status', _stock_status),
+]
+LOW_STOCK_COLUMNS = [
+    ('SKU', 'product__SKU'), ('Product Name', 'product__name'), ('Warehouse', 'warehouse__name'),
+    ('Current Stock', 'quantity'), ('Min Stock', 'product__min_stock'),
+    ('Deficit', lambda row: row['product__min_stock'] - row['quantity']),
+]
+STOCK_MOVEMENT_COLUMNS = [
+    ('Date', 'created_at'), ('Type', 'transaction_type'), ('SKU', 'product__SKU'),
+    ('Product Name', 'product__name'), ('Warehouse', 'warehouse__name'), ('Quantity', 'quantity'),
+    ('Reference', 'reference_no'),
+]
+PRODUCTION_COLUMNS = [
+    ('Order Number', 'order_number'), ('SKU', 'product__SKU'), ('Product Name', 'product__name'),
+    ('Quantity', 'quantity'), ('Completed', 'completed_quantity'), ('Rejected', 'rejected_quantity'),
+    ('Status', 'status'), ('Planned Start', 'planned_start'), ('Planned End', 'planned_end'),
+]
+QUALITY_COLUMNS = [
+    ('QC Number', 'qc_number'), ('Type', 'qc_type'), ('Reference', 'reference_type'),
+    ('Production Order', 'production_order__order_number'), ('Inspector', 'inspector__username'),
+    ('Inspection Date', 'inspection_date'), ('Status', 'status'),
+]
+ATTENDANCE_COLUMNS = [
+    ('Employee ID', 'employee__employee_id'), ('First Name', 'employee__user__first_name'),
+    ('Last Name', 'employee__user__last_name'), ('Date', 'date'), ('Status', 'status'),
+    ('Check In', 'check_in'), ('Check Out', 'check_out'), ('Overtime Hours', 'overtime_hours'),
+]
+OVERTIME_COLUMNS = [
+    ('Employee ID', 'employee__employee_id'), ('First Name', 'employee__user__first_name'),
+    ('Last Name', 'employee__user__last_name'), ('Date', 'date'), ('Overtime Hours', 'overtime_hours'),
+]
+PURCHASE_COLUMNS = [
+    ('PO Number', 'po_number'), ('Supplier', 'supplier__name'), ('Order Date', 'order_date'),
+    ('Expected Delivery', 'expected_delivery'), ('Status', 'status'), ('Total Amount', 'total_amount'),
+    ('Tax Amount', 'tax_amount'), ('Grand Total', 'grand_total'),
+]
+
+# Report querysets from request.GET or SavedReport.parameters, shared by the views and report jobs
+def inventory_stocks(params):
+    from inventory.models import Stock
+
+    stocks = Stock.objects.select_related('product', 'warehouse', 'product__category').all()
+    if params.get('warehouse'):
+        stocks = stocks.filter(warehouse_id=params['warehouse'])
+    if params.get('category'):
+        stocks = stocks.filter(product__category_id=params['category'])
+    if params.get('low_stock') == 'true':
+        stocks = stocks.filter(quantity__lt=F('product__min_stock'))
+    return stocks
+
+def production_orders(params):
+    from production.models import ProductionOrder
+
+    orders = ProductionOrder.objects.select_related('product', 'bom').all()
+    if params.get('start_date'):
+        orders = orders.filter(planned_start__date__gte=params['start_date'])
+    if params.get('end_date'):
+        orders = orders.filter(planned_end__date__lte=params['end_date'])
+    if params.get('status'):
+        orders = orders.filter(status=params['status'])
+    return orders
+
+def quality_checks(params):
+    from quality.models import QualityCheck
+
+    checks = QualityCheck.objects.all()
+    if params.get('start_date'):
+        checks = checks.filter(inspection_date__gte=params['start_date'])
+    if params.get('end_date'):
+        checks = checks.filter(inspection_date__lte=params['end_date'])
+    return checks
+
+def report_month(params):
+    """(year, month, 'YYYY-MM') from the month parameter, defaulting to this month"""
+    month = params.get('month') or timezone.now().strftime('%Y-%m')
+    year, month_num = map(int, month.split('-'))
+    return year, month_num, month
+
+def monthly_attendance(params):
+    from hr.models import Attendance
+
+    year, month_num, _ = report_month(params)
+    return Attendance.objects.filter(
+        date__year=year,
+        date__month=month_num
+    ).select_related('employee')
+
+def purchase_orders(params):
+    from procurement.models import PurchaseOrder
+
+    orders = PurchaseOrder.objects.select_related('supplier').all()
+    if params.get('start_date'):
+        orders = orders.filter(order_date__gte=params['start_date'])
+    if params.get('end_date'):
+        orders = orders.filter(order_date__lte=params['end_date'])
+    return orders
+
+def _params(request, *names):
+    """The GET parameters a report reads, for its cache key"""
+    return {name: request.GET.get(name) for name in names}
 
 @login_required
 def report_dashboard(request):
@@ -18,29 +126,16 @@ def report_dashboard(request):
 @login_required
 def inventory_report(request):
     """Inventory report"""
-    from inventory.models import Stock, Product, Warehouse, Category
+    from inventory.models import Warehouse, Category
     
-    stocks = Stock.objects.select_related('product', 'warehouse', 'product__category').all()
-    
-    # Apply filters
-    warehouse_id = request.GET.get('warehouse')
-    if warehouse_id:
-        stocks = stocks.filter(warehouse_id=warehouse_id)
-    
-    category_id = request.GET.get('category')
-    if category_id:
-        stocks = stocks.filter(product__category_id=category_id)
-    
-    low_stock = request.GET.get('low_stock') == 'true'
-    if low_stock:
-        stocks = stocks.filter(quantity__lt=models.F('product__min_stock'))
+    stocks = inventory_stocks(request.GET)
     
     format = request.GET.get('format', 'html')
     
     if format == 'excel':
-        return generate_inventory_excel(stocks)
-    elif format == 'csv':
-        return generate_inventory_csv(stocks)
+        return generate_inventory_excel(stocks, by_warehouse=request.GET.get('sheets') == 'warehouse')
+    elif format in STREAM_FORMATS:
+        return export_response(format, 'inventory_report', INVENTORY_COLUMNS, stocks)
     else:
         context = {
             'stocks': stocks,
@@ -55,13 +150,15 @@ def low_stock_report(request):
     from inventory.models import Stock, Product
     
     low_stock_items = Stock.objects.select_related('product', 'warehouse').filter(
-        quantity__lt=models.F('product__min_stock')
+        quantity__lt=F('product__min_stock')
     )
     
     format = request.GET.get('format', 'html')
     
     if format == 'excel':
         return generate_low_stock_excel(low_stock_items)
+    elif format in STREAM_FORMATS:
+        return export_response(format, 'low_stock_report', LOW_STOCK_COLUMNS, low_stock_items)
     else:
         context = {
             'low_stock_items': low_stock_items,
@@ -81,6 +178,10 @@ def stock_movement_report(request):
         created_at__range=[start_date, end_date]
     ).select_related('product', 'warehouse')
     
+    format = request.GET.get('format', 'html')
+    if format in STREAM_FORMATS:
+        return export_response(format, 'stock_movement_report', STOCK_MOVEMENT_COLUMNS, movements)
+    
     context = {
         'movements': movements,
         'days': days,
@@ -107,34 +208,29 @@ def abc_analysis_report(request):
 @login_required
 def production_report(request):
     """Production report"""
-    from production.models import ProductionOrder
-    
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    status = request.GET.get('status')
-    
-    orders = ProductionOrder.objects.select_related('product', 'bom').all()
+    orders = production_orders(request.GET)
     
-    if start_date:
-        orders = orders.filter(planned_start__date__gte=start_date)
-    if end_date:
-        orders = orders.filter(planned_end__date__lte=end_date)
-    if status:
-        orders = orders.filter(status=status)
-    
-    # Calculate metrics
-    total_orders = orders.count()
-    completed_orders = orders.filter(status='completed').count()
-    total_quantity = orders.aggregate(total=Sum('quantity'))['total'] or 0
-    completed_quantity = orders.filter(status='completed').aggregate(total=Sum('completed_quantity'))['total'] or 0
+    format = request.GET.get('format', 'html')
+    if format in STREAM_FORMATS:
+        return export_response(format, 'production_report', PRODUCTION_COLUMNS, orders)
+    
+    # Calculate metrics, one aggregate query per distinct filter set
+    def metrics():
+        totals = orders.aggregate(
+            total_orders=Count('id'),
+            completed_orders=Count('id', filter=Q(status='completed')),
+            total_quantity=Sum('quantity'),
+            completed_quantity=Sum('completed_quantity', filter=Q(status='completed')),
+        )
+        totals['total_quantity'] = totals['total_quantity'] or 0
+        totals['completed_quantity'] = totals['completed_quantity'] or 0
+        total_orders = totals['total_orders']
+        totals['completion_rate'] = (totals['completed_orders'] / total_orders * 100) if total_orders > 0 else 0
+        return totals
     
     context = {
         'orders': orders,
-        'total_orders': total_orders,
-        'completed_orders': completed_orders,
-        'total_quantity': total_quantity,
-        'completed_quantity': completed_quantity,
-        'completion_rate': (completed_orders / total_orders * 100) if total_orders > 0 else 0,
+        **cached_report('production', _params(request, 'start_date', 'end_date', 'status'), metrics),
     }
     
     return render(request, 'reports/production_report.html', context)
@@ -165,43 +261,43 @@ def rejection_report(request):
     
     orders = ProductionOrder.objects.filter(rejected_quantity__gt=0).select_related('product')
     
-    total_produced = orders.aggregate(total=Sum('completed_quantity'))['total'] or 0
-    total_rejected = orders.aggregate(total=Sum('rejected_quantity'))['total'] or 0
-    rejection_rate = (total_rejected / total_produced * 100) if total_produced > 0 else 0
+    def metrics():
+        totals = orders.aggregate(total_produced=Sum('completed_quantity'), total_rejected=Sum('rejected_quantity'))
+        total_produced = totals['total_produced'] or 0
+        total_rejected = totals['total_rejected'] or 0
+        return {
+            'total_produced': total_produced,
+            'total_rejected': total_rejected,
+            'rejection_rate': (total_rejected / total_produced * 100) if total_produced > 0 else 0,
+        }
     
     context = {
         'orders': orders,
-        'total_produced': total_produced,
-        'total_rejected': total_rejected,
-        'rejection_rate': rejection_rate,
+        **cached_report('rejection', {}, metrics),
     }
     return render(request, 'reports/rejection_report.html', context)
 
 @login_required
 def quality_report(request):
     """Quality report"""
-    from quality.models import QualityCheck
-    
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
+    checks = quality_checks(request.GET)
     
-    checks = QualityCheck.objects.all()
-    
-    if start_date:
-        checks = checks.filter(inspection_date__gte=start_date)
-    if end_date:
-        checks = checks.filter(inspection_date__lte=end_date)
-    
-    passed = checks.filter(status='passed').count()
-    failed = checks.filter(status='failed').count()
-    total = checks.count()
+    format = request.GET.get('format', 'html')
+    if format in STREAM_FORMATS:
+        return export_response(format, 'quality_report', QUALITY_COLUMNS, checks)
+    
+    def metrics():
+        counts = checks.aggregate(
+            passed=Count('id', filter=Q(status='passed')),
+            failed=Count('id', filter=Q(status='failed')),
+            total=Count('id'),
+        )
+        counts['quality_rate'] = (counts['passed'] / counts['total'] * 100) if counts['total'] > 0 else 0
+        return counts
     
     context = {
         'checks': checks,
-        'passed': passed,
-        'failed': failed,
-        'total': total,
-        'quality_rate': (passed / total * 100) if total > 0 else 0,
+        **cached_report('quality', _params(request, 'start_date', 'end_date'), metrics),
     }
     
     return render(request, 'reports/quality_report.html', context)
@@ -214,7 +310,9 @@ def defect_analysis_report(request):
     ncrs = NonConformanceReport.objects.all().select_related('quality_check')
     
     # Group by severity
-    severity_counts = ncrs.values('severity').annotate(count=Count('id')).order_by('-count')
+    severity_counts = cached_report('defect_analysis', {}, lambda: list(
+        ncrs.values('severity').annotate(count=Count('id')).order_by('-count')
+    ))
     
     context = {
         'ncrs': ncrs,
@@ -241,7 +339,8 @@ def quality_trends_report(request):
     ).order_by('inspection_date')
     
     context = {
-        'trends': list(trends),
+        # The window moves with the date, so the date is part of the key
+        'trends': cached_report('quality_trends', {'days': days, 'today': timezone.localdate()}, lambda: list(trends)),
         'days': days,
     }
     
@@ -250,15 +349,12 @@ def quality_trends_report(request):
 @login_required
 def hr_attendance_report(request):
     """HR attendance report"""
-    from hr.models import Attendance, Employee
+    _, _, month = report_month(request.GET)
+    attendances = monthly_attendance(request.GET)
     
-    month = request.GET.get('month', timezone.now().strftime('%Y-%m'))
-    year, month_num = map(int, month.split('-'))
-    
-    attendances = Attendance.objects.filter(
-        date__year=year,
-        date__month=month_num
-    ).select_related('employee')
+    format = request.GET.get('format', 'html')
+    if format in STREAM_FORMATS:
+        return export_response(format, f'attendance_report_{month}', ATTENDANCE_COLUMNS, attendances)
     
     context = {
         'attendances': attendances,
@@ -301,7 +397,13 @@ def hr_overtime_report(request):
         overtime_hours__gt=0
     ).select_related('employee').order_by('-overtime_hours')
     
-    total_overtime = sum(float(item.overtime_hours) for item in overtime_data)
+    format = request.GET.get('format', 'html')
+    if format in STREAM_FORMATS:
+        return export_response(format, f'overtime_report_{month}', OVERTIME_COLUMNS, overtime_data)
+    
+    total_overtime = cached_report('overtime', {'month': month}, lambda: float(
+        overtime_data.aggregate(total=Sum('overtime_hours'))['total'] or 0
+    ))
     
     context = {
         'overtime_data': overtime_data,
@@ -314,19 +416,15 @@ def hr_overtime_report(request):
 @login_required
 def purchase_report(request):
     """Purchase report"""
-    from procurement.models import PurchaseOrder
-    
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    
-    orders = PurchaseOrder.objects.select_related('supplier').all()
+    orders = purchase_orders(request.GET)
     
-    if start_date:
-        orders = orders.filter(order_date__gte=start_date)
-    if end_date:
-        orders = orders.filter(order_date__lte=end_date)
+    format = request.GET.get('format', 'html')
+    if format in STREAM_FORMATS:
+        return export_response(format, 'purchase_report', PURCHASE_COLUMNS, orders)
     
-    total_amount = orders.aggregate(total=Sum('grand_total'))['total'] or 0
+    total_amount = cached_report('purchase', _params(request, 'start_date', 'end_date'), lambda: (
+        orders.aggregate(total=Sum('grand_total'))['total'] or 0
+    ))
     
     context = {
         'orders': orders,
@@ -363,100 +461,103 @@ def create_custom_report(request):
 
 @login_required
 def saved_reports_list(request):
-    """List of saved reports"""
-    # Simplified version
-    return render(request, 'reports/saved_reports_list.html')
+    """List of saved reports, with a form to submit new report jobs"""
+    from django.core.paginator import Paginator
+    from .jobs import FORMATS, report_sources
+    from .models import ReportTemplate, SavedReport
+
+    reports = SavedReport.objects.select_related('template', 'generated_by').order_by('-generated_date', '-pk')
+    context = {
+        'reports': Paginator(reports, 20).get_page(request.GET.get('page')),
+        'templates': ReportTemplate.objects.filter(
+            is_active=True, report_type__in=report_sources(), output_format__in=FORMATS
+        ).order_by('name'),
+    }
+    return render(request, 'reports/saved_reports_list.html', context)
+
+@login_required
+def submit_report(request):
+    """Queue a report job for a template; identical pending requests share one job"""
+    from .jobs import submit_report as submit
+    from .models import ReportTemplate
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    template = get_object_or_404(ReportTemplate, pk=request.POST.get('template'), is_active=True)
+    try:
+        report, created = submit(template, request.POST, request.user, request.POST.get('report_name', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    data = _report_status(report)
+    data['created'] = created
+    return JsonResponse(data, status=202 if report.status in ('queued', 'running') else 200)
+
+@login_required
+def report_cache_stats(request):
+    """Hit/miss counters of the report result cache, for staff"""
+    from django.core.exceptions import PermissionDenied
+    from .cache import report_cache_stats as stats
+
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return JsonResponse(stats())
+
+def _report_status(report):
+    from django.urls import reverse
+    return {
+        'id': report.pk,
+        'status': report.status,
+        'file_size': report.file_size,
+        'error': report.error.strip().splitlines()[-1] if report.error.strip() else '',
+        'status_url': reverse('reports:saved_report_status', args=[report.pk]),
+        'view_url': reverse('reports:view_saved_report', args=[report.pk]),
+        'download_url': reverse('reports:download_saved_report', args=[report.pk]) if report.status == 'done' else None,
+    }
+
+@login_required
+def saved_report_status(request, pk):
+    """Report job status for polling"""
+    from .models import SavedReport
+    return JsonResponse(_report_status(get_object_or_404(SavedReport, pk=pk)))
 
 @login_required
 def view_saved_report(request, pk):
     """View saved report"""
-    # Simplified version
-    return render(request, 'reports/view_saved_report.html')
+    from .models import SavedReport
+
+    report = get_object_or_404(SavedReport.objects.select_related('template', 'generated_by'), pk=pk)
+    return render(request, 'reports/view_saved_report.html', {'report': report})
 
 @login_required
 def download_saved_report(request, pk):
     """Download saved report"""
-    # Simplified version
-    return HttpResponse("Download feature coming soon")
+    import os
+    from django.http import FileResponse, Http404
+    from .models import SavedReport
+
+    report = get_object_or_404(SavedReport, pk=pk)
+    if report.status != 'done' or not report.report_file:
+        raise Http404('Report is not ready')
+    return FileResponse(
+        report.report_file.open('rb'), as_attachment=True, filename=os.path.basename(report.report_file.name)
+    )
 
 # Helper functions for Excel/CSV export
-def generate_inventory_excel(stocks):
-    """Generate Excel file for inventory report"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Inventory Report"
-    
-    # Add headers
-    headers = ['SKU', 'Product Name', 'Warehouse', 'Quantity', 'Min Stock', 'Max Stock', 'Status']
-    ws.append(headers)
-    
-    # Add data
-    for stock in stocks:
-        status = 'Low' if stock.quantity < stock.product.min_stock else 'OK'
-        ws.append([
-            stock.product.SKU,
-            stock.product.name,
-            stock.warehouse.name,
-            float(stock.quantity),
-            float(stock.product.min_stock),
-            float(stock.product.max_stock),
-            status
-        ])
-    
-    # Create response
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=inventory_report.xlsx'
-    
-    wb.save(response)
-    return response
+def generate_inventory_excel(stocks, by_warehouse=False):
+    """Generate Excel file for inventory report, optionally one sheet per warehouse"""
+    from inventory.models import Warehouse
+
+    if by_warehouse:
+        warehouses = Warehouse.objects.filter(pk__in=stocks.values('warehouse_id')).order_by('name')
+        sheets = [(w.name, INVENTORY_COLUMNS, stocks.filter(warehouse=w)) for w in warehouses]
+    else:
+        sheets = [("Inventory Report", INVENTORY_COLUMNS, stocks)]
+    return excel_response('inventory_report', sheets)
 
 def generate_inventory_csv(stocks):
-    """Generate CSV file for inventory report"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename=inventory_report.csv'
-    
-    writer = csv.writer(response)
-    writer.writerow(['SKU', 'Product Name', 'Warehouse', 'Quantity', 'Min Stock', 'Max Stock', 'Status'])
-    
-    for stock in stocks:
-        status = 'Low' if stock.quantity < stock.product.min_stock else 'OK'
-        writer.writerow([
-            stock.product.SKU,
-            stock.product.name,
-            stock.warehouse.name,
-            stock.quantity,
-            stock.product.min_stock,
-            stock.product.max_stock,
-            status
-        ])
-    
-    return response
+    """Stream a CSV file for inventory report"""
+    return export_response('csv', 'inventory_report', INVENTORY_COLUMNS, stocks)
 
 def generate_low_stock_excel(low_stock_items):
     """Generate Excel file for low stock report"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Low Stock Report"
-    
-    # Add headers
-    headers = ['SKU', 'Product Name', 'Warehouse', 'Current Stock', 'Min Stock', 'Deficit']
-    ws.append(headers)
-    
-    # Add data
-    for item in low_stock_items:
-        deficit = item.product.min_stock - item.quantity
-        ws.append([
-            item.product.SKU,
-            item.product.name,
-            item.warehouse.name,
-            float(item.quantity),
-            float(item.product.min_stock),
-            float(deficit)
-        ])
-    
-    # Create response
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=low_stock_report.xlsx'
-    
-    wb.save(response)
-    return response
\ No newline at end of file
+    return excel_response('low_stock_report', [("Low Stock Report", LOW_STOCK_COLUMNS, low_stock_items)])
\ No newline at end of file
@@ -1,5 +1,6 @@
 from django import forms
 from django.utils import timezone
+from inventory.widgets import ProductPickerWidget
 from .models import GatePass, GatePassItem, VisitorLog
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Fieldset, Row, Column, Submit, HTML, Div
@@ -81,6 +82,7 @@ class GatePassItemForm(forms.ModelForm):
         fields = ['product', 'item_description', 'quantity', 'unit_of_measure', 
                   'serial_number', 'batch_number', 'value', 'remarks']
         widgets = {
+            'product': ProductPickerWidget(),
             'remarks': forms.Textarea(attrs={'rows': 2}),
         }
 
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from core.models import TimeStampedModel
+from core.sequences import next_document_number
 from hr.models import Employee
 from inventory.models import Product, Warehouse
 
@@ -70,13 +71,7 @@ class GatePass(TimeStampedModel):
     
     def save(self, *args, **kwargs):
         if not self.pass_number:
-            last_pass = GatePass.objects.all().order_by('id').last()
-            year = timezone.now().year
-            if last_pass:
-                last_number = int(last_pass.pass_number.split('-')[-1])
-                self.pass_number = f"GP-{year}-{last_number + 1:05d}"
-            else:
-                self.pass_number = f"GP-{year}-00001"
+            self.pass_number = next_document_number('GP', seed_from=(GatePass, 'pass_number'))
         super().save(*args, **kwargs)
     
     def __str__(self):
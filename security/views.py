@@ -12,12 +12,14 @@ import json
 
 from .models import GatePass, GatePassItem, VisitorLog, GatePassApproval
 from .forms import GatePassForm, GatePassItemFormSet, SecurityCheckForm, VisitorLogForm
+from core.pagination import KeysetPaginationMixin
 
-class GatePassListView(LoginRequiredMixin, ListView):
+class GatePassListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = GatePass
     template_name = 'security/gatepass_list.html'
     context_object_name = 'gate_passes'
     paginate_by = 20
+    estimate_count = True
     
     def get_queryset(self):
         queryset = super().get_queryset()